@@ -10,8 +10,10 @@ import sys
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.config import AppConfig, RAG_OPTIMIZED_MODELS
+from src.config import AppConfig, RAG_OPTIMIZED_MODELS, format_token_count
+from src.model_router import AUTO_MODEL
 from src.orchestrator import KnowledgeOrchestrator
+from src.ai_client import cached_prompt_tokens
 
 # ============================================================
 # PAGE CONFIG
@@ -560,7 +562,7 @@ def get_rag():
     """Lazy load RAG engine"""
     if st.session_state.rag is None:
         from src.rag_engine import RAGEngine
-        st.session_state.rag = RAGEngine()
+        st.session_state.rag = RAGEngine.from_config(st.session_state.config)
         st.session_state.rag.initialize()
     return st.session_state.rag
 
@@ -580,7 +582,7 @@ def get_client():
     cfg = st.session_state.config
     if cfg.openrouter_api_key:
         from src.ai_client import OpenRouterClient
-        return OpenRouterClient(cfg.openrouter_api_key)
+        return OpenRouterClient.from_config(cfg)
     return None
 
 # ============================================================
@@ -614,7 +616,7 @@ def get_orchestrator():
 # ============================================================
 # CHAT LOGIC
 # ============================================================
-def process_query(query: str, model: str):
+def process_query(query: str, model: str, status=None):
     """
     Process a user query through the Orchestrator (RAG + AI).
     
@@ -622,12 +624,14 @@ def process_query(query: str, model: str):
     the KnowledgeOrchestrator. It:
     1. Adds the user message to chat history
     2. Validates API key configuration
-    3. Delegates to the Orchestrator for RAG search + LLM generation
+    3. Streams the Orchestrator's answer (RAG search + LLM generation),
+       rendering it as the tokens arrive
     4. Stores the result in session state for UI rendering
     
     Args:
         query: The user's question or message
         model: The AI model to use for generation
+        status: Optional st.status container, updated as the steps progress
     """
     cfg = st.session_state.config
     
@@ -656,12 +660,24 @@ def process_query(query: str, model: str):
         })
         return
     
-    # Delegate to orchestrator
-    result = orchestrator.handle_message(
+    # Delegate to orchestrator, rendering the answer while it streams
+    result = None
+    answer = ""
+    placeholder = st.empty()
+    for event in orchestrator.handle_message_stream(
         user_message=query,
         chat_history=st.session_state.messages,
         model=model
-    )
+    ):
+        if event["type"] == "sources":
+            if status is not None:
+                status.update(label=f"🧠 Generating response from {len(event['sources'])} sources...", state="running")
+        elif event["type"] == "delta":
+            answer += event["content"]
+            placeholder.markdown(answer + "▌")
+        elif event["type"] == "done":
+            result = event["result"]
+    placeholder.empty()
     
     # Add assistant message with orchestrator response
     st.session_state.messages.append({
@@ -722,8 +738,10 @@ def render_sidebar():
         # ===== MODEL SELECTION =====
         st.markdown("#### 🤖 AI Model")
         
-        model_options = list(RAG_OPTIMIZED_MODELS.keys())
-        model_names = [f"{RAG_OPTIMIZED_MODELS[m]['name']} ({RAG_OPTIMIZED_MODELS[m].get('tier', 'standard')})" for m in model_options]
+        model_options = [AUTO_MODEL] + list(RAG_OPTIMIZED_MODELS.keys())
+        model_names = ["🧭 Auto (routed per question)"] + [
+            f"{RAG_OPTIMIZED_MODELS[m]['name']} ({RAG_OPTIMIZED_MODELS[m].get('tier', 'standard')})" for m in model_options[1:]
+        ]
         
         current_idx = model_options.index(st.session_state.model) if st.session_state.model in model_options else 0
         
@@ -742,8 +760,11 @@ def render_sidebar():
         
         # Model info
         model_info = RAG_OPTIMIZED_MODELS.get(st.session_state.model, {})
-        if model_info:
-            st.caption(f"📐 Context: {model_info.get('context', 'N/A')} • 💰 {model_info.get('cost_per_1m_tokens', 'N/A')}")
+        if st.session_state.model == AUTO_MODEL:
+            st.caption(f"🧭 {len(cfg.route_candidates)} models • 💰 ≤ ${cfg.route_max_cost_usd:.2f}/request "
+                       f"• ⏱️ p95 ≤ {cfg.route_latency_slo_ms / 1000:g}s")
+        elif model_info:
+            st.caption(f"📐 Context: {format_token_count(model_info['context']) if 'context' in model_info else 'N/A'} • 💰 {model_info.get('cost_per_1m_tokens', 'N/A')}")
         
         st.divider()
         
@@ -782,8 +803,13 @@ def render_sidebar():
             for f in files:
                 (knowledge_dir / f.name).write_bytes(f.getbuffer())
             st.success(f"✅ Added {len(files)} file(s)!")
-            st.session_state.rag = None  # Force rebuild
-            st.session_state.orchestrator = None  # Reset orchestrator with new RAG
+            if st.session_state.rag is not None:
+                # Rebuild alongside the live index; searches keep working meanwhile
+                try:
+                    with st.spinner("Rebuilding index..."):
+                        st.session_state.rag.initialize(force_rebuild=True)
+                except RuntimeError as e:
+                    st.error(f"❌ {e}")
             st.rerun()
         
         st.divider()
@@ -808,10 +834,34 @@ def render_sidebar():
                 help="Maximum length of AI response"
             )
             
+            cfg.rerank_enabled = st.checkbox(
+                "Rerank results (cross-encoder)",
+                value=cfg.rerank_enabled,
+                help="Over-fetch candidates and rescore them with a cross-encoder"
+            )
+            
+            cfg.compression_enabled = st.checkbox(
+                "Compress context (keep relevant sentences)",
+                value=cfg.compression_enabled,
+                help="Drop chunk sentences unrelated to the question before the LLM call"
+            )
+            
+            cfg.answer_cache_enabled = st.checkbox(
+                "Reuse answers to similar questions",
+                value=cfg.answer_cache_enabled,
+                help="Semantic answer cache: near-duplicate questions skip RAG and the LLM call"
+            )
+            
             if st.button("🔄 Rebuild RAG Index", use_container_width=True):
-                st.session_state.rag = None
-                st.session_state.orchestrator = None  # Reset orchestrator with new RAG
-                st.success("Index will rebuild on next query")
+                if st.session_state.rag is None:
+                    st.success("Index will build on next query")
+                else:
+                    try:
+                        with st.spinner("Rebuilding index..."):
+                            st.session_state.rag.initialize(force_rebuild=True)
+                        st.success(f"✅ Index rebuilt (v{st.session_state.rag.index_version})")
+                    except RuntimeError as e:
+                        st.error(f"❌ {e}")
         
         st.divider()
         
@@ -918,9 +968,14 @@ def render_debug_info():
                 
                 # Icon based on step type
                 icon = {
+                    "answer_cache": "💾",
                     "rag_search": "🔍",
+                    "rerank": "🎯",
+                    "compression": "✂️",
+                    "route": "🧭",
                     "context_build": "📝",
-                    "llm_call": "🤖"
+                    "llm_call": "🤖",
+                    "llm_stream": "📡"
                 }.get(step_type, "⚙️")
                 
                 st.markdown(f"{i}. {icon} **{step_type}**: {description} ({duration:.1f}ms)")
@@ -936,6 +991,11 @@ def render_debug_info():
         display_meta = {
             "model": meta.get("model"),
             "usage": meta.get("usage"),
+            "cached_prompt_tokens": cached_prompt_tokens(meta.get("usage") or {}),
+            "time_to_first_token_ms": next(
+                (s["metadata"].get("ttft_total_ms") for s in meta.get("steps", []) if s.get("type") == "llm_stream"),
+                None
+            ),
             "success": meta.get("success", True)
         }
         if meta.get("error"):
@@ -995,8 +1055,7 @@ def main():
             with cols[i % 2]:
                 if st.button(f"{icon} {text}", key=f"suggestion_{i}", use_container_width=True):
                     with st.status("🔎 Searching knowledge base...", expanded=True) as status:
-                        status.update(label="🧠 Generating response...", state="running")
-                        process_query(text, st.session_state.model)
+                        process_query(text, st.session_state.model, status)
                         status.update(label="✅ Complete", state="complete", expanded=False)
                     st.rerun()
     else:
@@ -1018,8 +1077,7 @@ def main():
     # ===== CHAT INPUT =====
     if prompt := st.chat_input("Ask anything about your knowledge base..."):
         with st.status("🔎 Searching knowledge base...", expanded=True) as status:
-            status.update(label="🧠 Generating response...", state="running")
-            process_query(prompt, st.session_state.model)
+            process_query(prompt, st.session_state.model, status)
             status.update(label="✅ Complete", state="complete", expanded=False)
         st.rerun()
 
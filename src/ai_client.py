@@ -3,15 +3,62 @@
 AI Client - OpenRouter API integration
 """
 
+import time
+import socket
 import logging
 import requests
-from typing import Optional, Generator, Dict, List
+from typing import Callable, Optional, Generator, Dict, Iterator, List
 from dataclasses import dataclass
 
+from .rate_limiter import RateLimiter, RateLimitTimeout, reserved_tokens
+from .response_cache import ResponseCache
+from .sse import ChatStreamDecoder
+from .resilience import CircuitBreakers, RetryBudget, RetryPolicy
+
 logger = logging.getLogger(__name__)
 
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
+# Seconds to establish a connection / to wait for response data
+DEFAULT_CONNECT_TIMEOUT_S = 5.0
+DEFAULT_READ_TIMEOUT_S = 60.0
+
+
+def cached_prompt_tokens(usage: Dict) -> int:
+    """Prompt tokens served from the provider's prompt cache, from a usage dict"""
+    details = usage.get("prompt_tokens_details") or {}
+    return int(details.get("cached_tokens") or usage.get("cache_read_input_tokens") or 0)
+
+
+def request_headers(api_key: str) -> Dict[str, str]:
+    """Headers sent with every OpenRouter request"""
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://localhost:8501",
+        "X-Title": "RAG Knowledge Assistant"
+    }
+
+
+def chat_payload(
+    messages: List[Dict],
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    stream: bool
+) -> Dict:
+    """Request body for chat/completions"""
+    return {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": stream,
+        # Detailed usage, including prompt tokens read from the provider cache
+        "usage": {"include": True}
+    }
+
+
 @dataclass
 class AIResponse:
     """AI model response"""
@@ -20,34 +67,202 @@ class AIResponse:
     usage: Dict
     success: bool
     error: Optional[str] = None
+    status_code: Optional[int] = None
+    attempts: int = 1
+    cached: bool = False  # Served from the response cache, not billed
+    queue_wait_ms: float = 0.0  # Time spent waiting for the client-side rate limiter
+
+
+class TransientRequestError(Exception):
+    """Timeout or connection failure; worth retrying"""
+
+
+class ChatStream:
+    """
+    Content deltas of one streamed completion, read from the raw socket.
+    
+    Response bytes are fed to a ChatStreamDecoder as they arrive. After
+    iteration, usage, finish_reason and model hold what the stream
+    reported; error is set when the request or the stream failed.
+    cancel() may be called from any thread: it shuts the connection down
+    at once, which also wakes a reader blocked on the socket. Use as a
+    context manager (or call close()) so the connection is always released.
+    """
+    
+    def __init__(
+        self,
+        response: Optional[requests.Response] = None,
+        model: str = "",
+        error: Optional[str] = None,
+        queue_wait_ms: float = 0.0,
+        on_close: Optional[Callable[[Optional[Dict]], None]] = None
+    ):
+        """
+        Args:
+            response: Streaming 200 response (None when the request failed)
+            model: Requested model, until the stream reports the actual one
+            error: Why the stream could not be opened
+            queue_wait_ms: Time the request waited for the rate limiter
+            on_close: Called once with the reported usage (or None) when the stream closes
+        """
+        self._response = response
+        self.decoder = ChatStreamDecoder()
+        self.requested_model = model
+        self.error = error
+        self.queue_wait_ms = queue_wait_ms
+        self.cancelled = False
+        self._on_close = on_close
+    
+    @property
+    def usage(self) -> Optional[Dict]:
+        return self.decoder.usage
+    
+    @property
+    def finish_reason(self) -> Optional[str]:
+        return self.decoder.finish_reason
+    
+    @property
+    def model(self) -> str:
+        return self.decoder.model or self.requested_model
+    
+    def __enter__(self) -> "ChatStream":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def __iter__(self) -> Iterator[str]:
+        if self._response is None:
+            return
+        try:
+            for data in self._raw_chunks():
+                if self.cancelled:
+                    break
+                yield from self.decoder.feed(data)
+                if self.decoder.done:
+                    break
+            else:
+                yield from self.decoder.flush()
+            if self.decoder.error and not self.cancelled:
+                self.error = self.decoder.error
+        except Exception as e:
+            if not self.cancelled:
+                self.error = str(e) or type(e).__name__
+        finally:
+            self.close()
+    
+    def _raw_chunks(self, size: int = 65536) -> Iterator[bytes]:
+        """Response bytes as soon as the socket has them (not line by line), decompressed"""
+        raw = self._response.raw
+        read1 = getattr(raw, "read1", None)
+        if read1 is None:
+            yield from self._response.iter_content(chunk_size=None)
+            return
+        while True:
+            data = read1(size, decode_content=True)
+            if not data:
+                return
+            yield data
+    
+    def cancel(self) -> None:
+        """Stop the stream and drop its connection immediately"""
+        self.cancelled = True
+        if self._response is None:
+            return
+        sock = getattr(getattr(self._response.raw, "connection", None), "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.close()
+    
+    def close(self) -> None:
+        """Release the connection (it is not reused, since the body may be unread)"""
+        if self._response is not None:
+            self._response.close()
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            on_close(self.usage)
+
 
 class OpenRouterClient:
     """
     OpenRouter API client for AI model access
     """
     
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = OPENROUTER_BASE_URL,
+        connect_timeout_s: float = DEFAULT_CONNECT_TIMEOUT_S,
+        read_timeout_s: float = DEFAULT_READ_TIMEOUT_S,
+        retry_policy: Optional[RetryPolicy] = None,
+        breakers: Optional[CircuitBreakers] = None,
+        response_cache: Optional[ResponseCache] = None,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
         self.api_key = api_key
-        self.base_url = OPENROUTER_BASE_URL
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout_s, read_timeout_s)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breakers = breakers or CircuitBreakers()
         self.session = requests.Session()
-        self.session.headers.update({
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://localhost:8501",
-            "X-Title": "RAG Knowledge Assistant"
-        })
+        self.session.headers.update(request_headers(api_key))
     
-    def _make_request(self, endpoint: str, data: Dict, stream: bool = False) -> requests.Response:
-        """Make API request"""
+    @classmethod
+    def from_config(cls, config) -> "OpenRouterClient":
+        """Client with the API key, timeouts, resilience, cache and rate-limit settings of an AppConfig"""
+        response_cache = None
+        if config.response_cache_enabled:
+            response_cache = ResponseCache(
+                config.response_cache_path,
+                ttl_s=config.response_cache_ttl_s,
+                max_entries=config.response_cache_size,
+                cache_all_temperatures=config.response_cache_all_temperatures
+            )
+        return cls(
+            config.openrouter_api_key,
+            connect_timeout_s=config.llm_connect_timeout_s,
+            read_timeout_s=config.llm_read_timeout_s,
+            retry_policy=RetryPolicy.from_config(config),
+            breakers=CircuitBreakers(config.circuit_failure_threshold, config.circuit_reset_s),
+            response_cache=response_cache,
+            rate_limiter=RateLimiter.from_config(config) if config.rate_limit_enabled else None
+        )
+    
+    def _make_request(
+        self, endpoint: str, data: Dict, stream: bool = False, read_timeout_s: Optional[float] = None
+    ) -> requests.Response:
+        """
+        Make API request
+        
+        Raises:
+            TransientRequestError: On timeouts and connection failures
+        """
         url = f"{self.base_url}/{endpoint}"
+        timeout = self.timeout if read_timeout_s is None else (self.timeout[0], read_timeout_s)
+        # A compressing server may hold back small SSE events to fill its blocks
+        headers = {"Accept-Encoding": "identity"} if stream else None
         
         try:
-            response = self.session.post(url, json=data, stream=stream, timeout=60)
+            response = self.session.post(url, json=data, stream=stream, timeout=timeout, headers=headers)
             return response
         except requests.exceptions.Timeout:
-            raise Exception("Request timed out. Try a faster model or shorter query.")
+            raise TransientRequestError("Request timed out. Try a faster model or shorter query.")
         except requests.exceptions.ConnectionError:
-            raise Exception("Connection error. Check your internet connection.")
+            raise TransientRequestError("Connection error. Check your internet connection.")
+    
+    def _release(self, model: str, reserved: int) -> None:
+        """Return a rate-limiter reservation of a request that got no response (nothing was billed)"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.release(model, reserved)
+    
+    def is_available(self, model: str) -> bool:
+        """False while the model's circuit breaker is open"""
+        return not self.breakers.is_open(model)
     
     def chat_completion(
         self,
@@ -60,6 +275,21 @@ class OpenRouterClient:
         """
         Generate chat completion
         
+        Timeouts, connection failures, 429 and 5xx responses are retried with
+        jittered exponential backoff (honouring Retry-After) until the retry
+        policy's attempts or deadline run out; each read timeout is cut to the
+        time left before the deadline. Retryable failures count towards the
+        model's circuit breaker, and while it is open the call fails at once.
+        
+        With a response cache, cacheable requests (temperature 0 by default)
+        are answered from it when an identical request was stored; such
+        responses report zero billed tokens and the original usage.
+        
+        With a rate limiter, every attempt first waits for its turn; the
+        prompt plus max_tokens is reserved and the unused part returned once
+        the usage is known. Time spent queued does not count against the
+        retry deadline.
+        
         Args:
             messages: List of message dicts with 'role' and 'content'
             model: Model identifier
@@ -70,45 +300,194 @@ class OpenRouterClient:
         Returns:
             AIResponse object
         """
-        data = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-            "stream": stream
-        }
+        data = chat_payload(messages, model, temperature, max_tokens, stream)
         
-        try:
-            response = self._make_request("chat/completions", data, stream=stream)
-            
-            if response.status_code == 200:
-                result = response.json()
+        use_cache = self.response_cache is not None and self.response_cache.cacheable(data)
+        if use_cache:
+            try:
+                cached = self.response_cache.get(data)
+            except Exception as e:
+                logger.warning(f"⚠️ Response cache lookup failed: {e}")
+                cached = None
+            if cached is not None:
                 return AIResponse(
-                    content=result['choices'][0]['message']['content'],
-                    model=result.get('model', model),
-                    usage=result.get('usage', {}),
-                    success=True
+                    content=cached["content"],
+                    model=cached["model"],
+                    usage={
+                        "prompt_tokens": 0,
+                        "completion_tokens": 0,
+                        "total_tokens": 0,
+                        "cached": True,
+                        "original_usage": cached["usage"]
+                    },
+                    success=True,
+                    status_code=200,
+                    attempts=0,
+                    cached=True
                 )
-            else:
-                error_msg = f"API Error {response.status_code}: {response.text}"
-                logger.error(error_msg)
+        
+        retry = RetryBudget(self.retry_policy, self.breakers.get(model))
+        reserved = reserved_tokens(messages, model, max_tokens) if self.rate_limiter else 0
+        held = 0  # Reserved tokens taken from the rate limiter, returned if no response settles them
+        queue_wait_ms = 0.0
+        
+        while True:
+            if not retry.start_attempt():
+                self._release(model, held)
                 return AIResponse(
                     content="",
                     model=model,
                     usage={},
                     success=False,
-                    error=error_msg
+                    error=f"Circuit open for {model}: too many recent failures",
+                    attempts=retry.attempt,
+                    queue_wait_ms=queue_wait_ms
+                )
+            attempt = retry.attempt
+            status_code = None
+            
+            if self.rate_limiter is not None:
+                try:
+                    # Retries are new requests but reuse the first attempt's token reservation
+                    wait_ms = self.rate_limiter.acquire_or_skip(model, reserved if attempt == 1 else 0)
+                except RateLimitTimeout as e:
+                    # The attempt never went out: hand back a half-open breaker's trial
+                    retry.abandon_attempt()
+                    self._release(model, held)
+                    return AIResponse(
+                        content="",
+                        model=model,
+                        usage={},
+                        success=False,
+                        error=str(e),
+                        attempts=retry.attempt,
+                        queue_wait_ms=queue_wait_ms + e.wait_ms
+                    )
+                if wait_ms is None:
+                    # Limiter store failed: sent unlimited, without a reservation of this attempt
+                    wait_ms = 0.0
+                    if attempt == 1:
+                        reserved = 0
+                held = reserved
+                queue_wait_ms += wait_ms
+                retry.extend(wait_ms)
+            
+            try:
+                response = self._make_request(
+                    "chat/completions", data, stream=stream,
+                    read_timeout_s=retry.read_timeout(self.timeout[1])
                 )
+                status_code = response.status_code
+                
+                if response.status_code == 200:
+                    result = response.json()
+                    retry.succeeded()
+                    ai_response = AIResponse(
+                        content=result['choices'][0]['message']['content'],
+                        model=result.get('model', model),
+                        usage=result.get('usage', {}),
+                        success=True,
+                        status_code=status_code,
+                        attempts=attempt,
+                        queue_wait_ms=queue_wait_ms
+                    )
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.settle(model, reserved, ai_response.usage)
+                    if self.response_cache is not None:
+                        self.response_cache.record_billed(ai_response.usage)
+                    if use_cache:
+                        try:
+                            self.response_cache.put(data, ai_response.model, ai_response.content, ai_response.usage)
+                        except Exception as e:
+                            logger.warning(f"⚠️ Response cache store failed: {e}")
+                    return ai_response
                 
+                error_msg = f"API Error {response.status_code}: {response.text}"
+                delay = retry.failed_response(response.status_code, response.headers.get('Retry-After'))
+            except TransientRequestError as e:
+                error_msg = str(e)
+                delay = retry.failed(retryable=True)
+            except Exception as e:
+                error_msg = str(e)
+                delay = retry.failed(retryable=False)
+            
+            logger.error(f"Request failed (attempt {attempt}): {error_msg}")
+            if delay is None:
+                self._release(model, held)
+                return AIResponse(
+                    content="",
+                    model=model,
+                    usage={},
+                    success=False,
+                    error=error_msg,
+                    status_code=status_code,
+                    attempts=attempt,
+                    queue_wait_ms=queue_wait_ms
+                )
+            time.sleep(delay)
+    
+    def open_stream(
+        self,
+        messages: List[Dict],
+        model: str = "anthropic/claude-3.5-sonnet",
+        temperature: float = 0.7,
+        max_tokens: int = 4000
+    ) -> ChatStream:
+        """
+        Start a streamed chat completion
+        
+        Streams are not retried, but whether the request connected and was
+        accepted counts towards the model's circuit breaker as in
+        chat_completion, and while it is open the stream is refused.
+        
+        Returns:
+            ChatStream to iterate for content deltas; its error is set
+            (and it yields nothing) when the request was refused or failed
+        """
+        data = chat_payload(messages, model, temperature, max_tokens, stream=True)
+        retry = RetryBudget(RetryPolicy(max_attempts=1), self.breakers.get(model))
+        if not retry.start_attempt():
+            return ChatStream(model=model, error=f"Circuit open for {model}: too many recent failures")
+        
+        queue_wait_ms = 0.0
+        reserved = 0
+        if self.rate_limiter is not None:
+            reserved = reserved_tokens(messages, model, max_tokens)
+            try:
+                queue_wait_ms = self.rate_limiter.acquire_or_skip(model, reserved)
+            except RateLimitTimeout as e:
+                retry.abandon_attempt()
+                return ChatStream(model=model, error=str(e), queue_wait_ms=e.wait_ms)
+            if queue_wait_ms is None:
+                # Limiter store failed: sent unlimited, nothing reserved
+                queue_wait_ms, reserved = 0.0, 0
+        
+        # Once the stream ends: settle the reservation and count the usage as billed
+        def on_close(usage: Optional[Dict]) -> None:
+            if self.rate_limiter is not None:
+                self.rate_limiter.settle(model, reserved, usage)
+            if usage and self.response_cache is not None:
+                self.response_cache.record_billed(usage)
+        
+        try:
+            response = self._make_request("chat/completions", data, stream=True)
+        except TransientRequestError as e:
+            retry.failed(retryable=True)
+            self._release(model, reserved)
+            return ChatStream(model=model, error=str(e), queue_wait_ms=queue_wait_ms)
         except Exception as e:
-            logger.error(f"Request failed: {e}")
-            return AIResponse(
-                content="",
-                model=model,
-                usage={},
-                success=False,
-                error=str(e)
-            )
+            retry.failed(retryable=False)
+            self._release(model, reserved)
+            return ChatStream(model=model, error=str(e), queue_wait_ms=queue_wait_ms)
+        
+        if response.status_code != 200:
+            error = f"{response.status_code} - {response.text}"
+            retry.failed_response(response.status_code, response.headers.get('Retry-After'))
+            response.close()
+            self._release(model, reserved)
+            return ChatStream(model=model, error=error, queue_wait_ms=queue_wait_ms)
+        retry.succeeded()
+        return ChatStream(response, model=model, queue_wait_ms=queue_wait_ms, on_close=on_close)
     
     def stream_chat_completion(
         self,
@@ -121,42 +500,13 @@ class OpenRouterClient:
         Stream chat completion response
         
         Yields:
-            Content chunks as they arrive
+            Content chunks as they arrive, and "Error: ..." if the request or stream failed
         """
-        data = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-            "stream": True
-        }
-        
-        try:
-            response = self._make_request("chat/completions", data, stream=True)
-            
-            if response.status_code != 200:
-                yield f"Error: {response.status_code} - {response.text}"
-                return
-            
-            for line in response.iter_lines():
-                if line:
-                    line_text = line.decode('utf-8')
-                    if line_text.startswith('data: '):
-                        json_str = line_text[6:]
-                        if json_str == '[DONE]':
-                            break
-                        try:
-                            import json
-                            chunk = json.loads(json_str)
-                            delta = chunk.get('choices', [{}])[0].get('delta', {})
-                            content = delta.get('content', '')
-                            if content:
-                                yield content
-                        except json.JSONDecodeError:
-                            continue
-                            
-        except Exception as e:
-            yield f"Error: {str(e)}"
+        # Closing the generator early (e.g. a cancelled hedge) closes the connection
+        with self.open_stream(messages, model, temperature, max_tokens) as stream:
+            yield from stream
+            if stream.error:
+                yield f"Error: {stream.error}"
     
     def test_connection(self) -> bool:
         """Test API connection"""
@@ -174,7 +524,7 @@ class OpenRouterClient:
     def get_available_models(self) -> List[Dict]:
         """Get list of available models from OpenRouter"""
         try:
-            response = self.session.get(f"{self.base_url}/models", timeout=10)
+            response = self.session.get(f"{self.base_url}/models", timeout=(self.timeout[0], 10))
             if response.status_code == 200:
                 return response.json().get('data', [])
             return []
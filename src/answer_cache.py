@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+💾 Answer Cache - Semantic cache for orchestrator answers
+Returns a stored answer when a new question embeds close enough to an
+earlier one asked against the same model and index version
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheHit:
+    """
+    A cached answer matched to a new question.
+
+    Attributes:
+        result: The stored OrchestratorResult
+        query: The question the answer was generated for
+        similarity: Cosine similarity between the two questions
+        age_s: Seconds since the answer was stored
+    """
+    result: Any
+    query: str
+    similarity: float
+    age_s: float
+
+
+class SemanticAnswerCache:
+    """
+    Size-bounded, TTL-limited cache keyed by question embeddings.
+
+    Embeddings live in one preallocated matrix, so a lookup is a single
+    matrix-vector product masked to live entries with the same key (model,
+    index version and answer-affecting settings). The least recently used
+    entry is overwritten when the cache is full.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_s: float = 3600.0, max_entries: int = 512):
+        """
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            ttl_s: Seconds an answer stays valid
+            max_entries: Maximum number of stored answers
+        """
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max(1, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # (max_entries, d), allocated on first store
+        self._key_ids = np.full(self.max_entries, -1, dtype=np.int64)
+        self._expires = np.zeros(self.max_entries, dtype=np.float64)
+        self._key_numbers: Dict[Hashable, int] = {}
+        # slot -> (query, result, stored_at), least recently used first
+        self._entries: "OrderedDict[int, Tuple[str, Any, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, embedding: np.ndarray, key: Hashable) -> Optional[CacheHit]:
+        """
+        Best live answer for a unit-norm question embedding under a key
+
+        Returns:
+            CacheHit when the most similar entry passes the threshold, else None
+        """
+        with self._lock:
+            key_id = self._key_numbers.get(key)
+            if self._vectors is None or key_id is None or len(embedding) != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+
+            now = time.time()
+            live = (self._key_ids == key_id) & (self._expires > now)
+            if not live.any():
+                self.misses += 1
+                return None
+
+            similarity = np.where(live, self._vectors @ embedding, -np.inf)
+            slot = int(np.argmax(similarity))
+            if similarity[slot] < self.threshold:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(slot)
+            query, result, stored_at = self._entries[slot]
+            self.hits += 1
+            return CacheHit(result=result, query=query, similarity=float(similarity[slot]), age_s=now - stored_at)
+
+    def store(self, embedding: np.ndarray, key: Hashable, query: str, result: Any) -> None:
+        """Store an answer, overwriting the least recently used entry when full"""
+        with self._lock:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            if self._vectors is None or len(embedding) != self._vectors.shape[1]:
+                # First store, or the embedding model changed: start over
+                self._vectors = np.zeros((self.max_entries, len(embedding)), dtype=np.float32)
+                self._key_ids[:] = -1
+                self._entries.clear()
+
+            if len(self._entries) < self.max_entries:
+                slot = len(self._entries)  # Slots fill in order and are only freed all at once
+            else:
+                slot, _ = self._entries.popitem(last=False)
+
+            now = time.time()
+            self._vectors[slot] = embedding
+            self._key_ids[slot] = self._key_numbers.setdefault(key, len(self._key_numbers))
+            self._expires[slot] = now + self.ttl_s
+            self._entries[slot] = (query, result, now)
+
+    def clear(self) -> None:
+        """Drop all stored answers"""
+        with self._lock:
+            self._key_ids[:] = -1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count and hit/miss counters"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "threshold": self.threshold,
+            "ttl_s": self.ttl_s
+        }
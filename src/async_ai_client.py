@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+⚡ Async AI Client - OpenRouter API integration on asyncio
+Same surface as OpenRouterClient, on a pooled keep-alive httpx connection
+pool, so many concurrent generations share one event loop instead of a
+thread each
+"""
+
+import math
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import AsyncGenerator, Dict, Iterator, List, Optional
+
+from .ai_client import (
+    AIResponse,
+    OPENROUTER_BASE_URL,
+    DEFAULT_CONNECT_TIMEOUT_S,
+    DEFAULT_READ_TIMEOUT_S,
+    chat_payload,
+    request_headers
+)
+from .sse import ChatStreamDecoder
+from .rate_limiter import RateLimiter, RateLimitTimeout, reserved_tokens
+from .resilience import CircuitBreakers, RetryBudget, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+HTTPX_AVAILABLE = False
+HTTP2_AVAILABLE = False
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    logger.warning("⚠️ httpx not available, async client disabled")
+
+try:
+    import h2  # noqa: F401  (httpx needs it for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    pass
+
+# Connections per pool lane. httpcore scans every pooled connection on each
+# request and response, so one pool with hundreds of connections spends more
+# time in that scan than on the network; several small lanes avoid it.
+CONNECTIONS_PER_LANE = 32
+
+
+class AsyncOpenRouterClient:
+    """
+    Asyncio OpenRouter client.
+
+    The connection pool allows at most max_connections concurrent
+    connections, of which up to max_keepalive_connections stay open between
+    requests. It is split into lanes of CONNECTIONS_PER_LANE connections
+    (one httpx.AsyncClient each) and every request goes to the lane with the
+    fewest requests in flight. HTTP/2 (when enabled and h2 is installed)
+    multiplexes requests over fewer connections. Connect and read timeouts
+    are separate, so a slow generation is not mistaken for an unreachable
+    host. Use as an async context manager, or call aclose() when done.
+
+    base_url and transport can point the client at a local stub server or an
+    httpx mock transport for testing.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = OPENROUTER_BASE_URL,
+        connect_timeout_s: float = DEFAULT_CONNECT_TIMEOUT_S,
+        read_timeout_s: float = DEFAULT_READ_TIMEOUT_S,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry_s: float = 30.0,
+        http2: bool = False,
+        transport=None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breakers: Optional[CircuitBreakers] = None,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
+        """
+        Args:
+            api_key: OpenRouter API key
+            base_url: API root (override for a stub server)
+            connect_timeout_s: Seconds to establish a connection
+            read_timeout_s: Seconds to wait for each chunk of response data
+            max_connections: Upper bound on concurrent connections
+            max_keepalive_connections: Idle connections kept for reuse
+            keepalive_expiry_s: Seconds an idle connection is kept
+            http2: Use HTTP/2 when the h2 package is installed
+            transport: Optional httpx transport (e.g. httpx.MockTransport)
+            retry_policy: Retry attempts, backoff and deadline per call
+            breakers: Per-model circuit breakers (may be shared with a sync client)
+            rate_limiter: Client-side rate limiter (shared with other clients through its file)
+        """
+        if not HTTPX_AVAILABLE:
+            raise RuntimeError("httpx is required for the async client")
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("⚠️ h2 not available, using HTTP/1.1 with keep-alive")
+            http2 = False
+
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.http2 = http2
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breakers = breakers or CircuitBreakers()
+        self.rate_limiter = rate_limiter
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout_s,
+            read=read_timeout_s,
+            write=connect_timeout_s,
+            # Waiting for a free pooled connection counts as connecting
+            pool=connect_timeout_s
+        )
+        
+        lanes = max(1, math.ceil(max_connections / CONNECTIONS_PER_LANE))
+        self._clients = [
+            httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=request_headers(api_key),
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=math.ceil(max_connections / lanes),
+                    max_keepalive_connections=math.ceil(max_keepalive_connections / lanes),
+                    keepalive_expiry=keepalive_expiry_s
+                ),
+                http2=http2,
+                transport=transport
+            )
+            for _ in range(lanes)
+        ]
+        self._in_flight = [0] * lanes
+
+    @classmethod
+    def from_config(cls, config, **kwargs) -> "AsyncOpenRouterClient":
+        """Client with the API key, timeouts and pool settings of an AppConfig"""
+        options = dict(
+            connect_timeout_s=config.llm_connect_timeout_s,
+            read_timeout_s=config.llm_read_timeout_s,
+            max_connections=config.llm_max_connections,
+            http2=config.llm_http2,
+            retry_policy=RetryPolicy.from_config(config),
+            breakers=CircuitBreakers(config.circuit_failure_threshold, config.circuit_reset_s),
+            rate_limiter=RateLimiter.from_config(config) if config.rate_limit_enabled else None
+        )
+        options.update(kwargs)
+        return cls(config.openrouter_api_key, **options)
+
+    async def __aenter__(self) -> "AsyncOpenRouterClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close all pooled connections"""
+        for client in self._clients:
+            await client.aclose()
+
+    @contextmanager
+    def _lane(self) -> Iterator["httpx.AsyncClient"]:
+        """Least busy pool lane, counted as busy until the block exits"""
+        lane = min(range(len(self._clients)), key=self._in_flight.__getitem__)
+        self._in_flight[lane] += 1
+        try:
+            yield self._clients[lane]
+        finally:
+            self._in_flight[lane] -= 1
+
+    @staticmethod
+    def _describe_error(e: Exception) -> str:
+        """User-facing message for a transport error"""
+        if isinstance(e, httpx.ConnectTimeout):
+            return "Connection timed out. Check your internet connection."
+        if isinstance(e, httpx.PoolTimeout):
+            return "No free connection in the pool. Too many concurrent requests."
+        if isinstance(e, httpx.TimeoutException):
+            return "Request timed out. Try a faster model or shorter query."
+        if isinstance(e, httpx.NetworkError):
+            return "Connection error. Check your internet connection."
+        return str(e) or type(e).__name__
+
+    def is_available(self, model: str) -> bool:
+        """False while the model's circuit breaker is open"""
+        return not self.breakers.is_open(model)
+
+    async def _wait_for_rate_limit(self, model: str, tokens: int) -> Optional[float]:
+        """
+        Queue for the rate limiter on a worker thread, keeping the event loop free
+
+        Returns:
+            Milliseconds waited, or None when the limiter's store failed and nothing was taken
+        """
+        if self.rate_limiter is None:
+            return 0.0
+        return await asyncio.to_thread(self.rate_limiter.acquire_or_skip, model, tokens)
+
+    def _release(self, model: str, reserved: int) -> None:
+        """Return a rate-limiter reservation of a request that got no response (nothing was billed)"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.release(model, reserved)
+
+    async def chat_completion(
+        self,
+        messages: List[Dict],
+        model: str = "anthropic/claude-3.5-sonnet",
+        temperature: float = 0.7,
+        max_tokens: int = 4000
+    ) -> AIResponse:
+        """
+        Generate chat completion
+
+        Retries, circuit breaking and rate limiting work as in
+        OpenRouterClient.chat_completion.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            model: Model identifier
+            temperature: Creativity (0-1)
+            max_tokens: Maximum response length
+
+        Returns:
+            AIResponse object
+        """
+        data = chat_payload(messages, model, temperature, max_tokens, stream=False)
+        retry = RetryBudget(self.retry_policy, self.breakers.get(model))
+        reserved = reserved_tokens(messages, model, max_tokens) if self.rate_limiter else 0
+        held = 0  # Reserved tokens taken from the rate limiter, returned if no response settles them
+        queue_wait_ms = 0.0
+
+        while True:
+            if not retry.start_attempt():
+                self._release(model, held)
+                return AIResponse(content="", model=model, usage={}, success=False,
+                                  error=f"Circuit open for {model}: too many recent failures",
+                                  attempts=retry.attempt, queue_wait_ms=queue_wait_ms)
+            attempt = retry.attempt
+            status_code = None
+
+            try:
+                wait_ms = await self._wait_for_rate_limit(model, reserved if attempt == 1 else 0)
+            except RateLimitTimeout as e:
+                # The attempt never went out: hand back a half-open breaker's trial
+                retry.abandon_attempt()
+                self._release(model, held)
+                return AIResponse(content="", model=model, usage={}, success=False, error=str(e),
+                                  attempts=retry.attempt, queue_wait_ms=queue_wait_ms + e.wait_ms)
+            if wait_ms is None:
+                # Limiter store failed: sent unlimited, without a reservation of this attempt
+                wait_ms = 0.0
+                if attempt == 1:
+                    reserved = 0
+            held = reserved
+            queue_wait_ms += wait_ms
+            retry.extend(wait_ms)
+
+            try:
+                timeout = httpx.Timeout(
+                    self.timeout.connect,
+                    read=retry.read_timeout(self.timeout.read),
+                    write=self.timeout.write,
+                    pool=self.timeout.pool
+                )
+                with self._lane() as client:
+                    response = await client.post("/chat/completions", json=data, timeout=timeout)
+                status_code = response.status_code
+
+                if response.status_code == 200:
+                    result = response.json()
+                    retry.succeeded()
+                    ai_response = AIResponse(
+                        content=result['choices'][0]['message']['content'],
+                        model=result.get('model', model),
+                        usage=result.get('usage', {}),
+                        success=True,
+                        status_code=status_code,
+                        attempts=attempt,
+                        queue_wait_ms=queue_wait_ms
+                    )
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.settle(model, reserved, ai_response.usage)
+                    return ai_response
+
+                error_msg = f"API Error {response.status_code}: {response.text}"
+                delay = retry.failed_response(response.status_code, response.headers.get('Retry-After'))
+            except httpx.TransportError as e:
+                error_msg = self._describe_error(e)
+                delay = retry.failed(retryable=True)
+            except Exception as e:
+                error_msg = self._describe_error(e)
+                delay = retry.failed(retryable=False)
+
+            logger.error(f"Request failed (attempt {attempt}): {error_msg}")
+            if delay is None:
+                self._release(model, held)
+                return AIResponse(content="", model=model, usage={}, success=False, error=error_msg,
+                                  status_code=status_code, attempts=attempt, queue_wait_ms=queue_wait_ms)
+            await asyncio.sleep(delay)
+
+    async def stream_chat_completion(
+        self,
+        messages: List[Dict],
+        model: str = "anthropic/claude-3.5-sonnet",
+        temperature: float = 0.7,
+        max_tokens: int = 4000
+    ) -> AsyncGenerator[str, None]:
+        """
+        Stream chat completion response
+
+        Cancelling the consuming task (or closing the generator) closes the
+        connection.
+
+        Yields:
+            Content chunks as they arrive, and "Error: ..." if the request or stream failed
+        """
+        data = chat_payload(messages, model, temperature, max_tokens, stream=True)
+        decoder = ChatStreamDecoder()
+        reserved = reserved_tokens(messages, model, max_tokens) if self.rate_limiter else 0
+        held = 0
+        connecting = False
+        # Not retried, but the connect/status outcome counts towards the breaker
+        retry = RetryBudget(RetryPolicy(max_attempts=1), self.breakers.get(model))
+        if not retry.start_attempt():
+            yield f"Error: Circuit open for {model}: too many recent failures"
+            return
+
+        try:
+            try:
+                if await self._wait_for_rate_limit(model, reserved) is None:
+                    reserved = 0  # Limiter store failed: sent unlimited, nothing reserved
+            except RateLimitTimeout:
+                retry.abandon_attempt()
+                raise
+            held = reserved
+            connecting = True
+            with self._lane() as client:
+                async with client.stream("POST", "/chat/completions", json=data) as response:
+                    held = 0  # Answered: from here the reservation is refunded or settled below
+                    connecting = False
+                    if response.status_code != 200:
+                        retry.failed_response(response.status_code, response.headers.get('Retry-After'))
+                        self._release(model, reserved)
+                        body = await response.aread()
+                        yield f"Error: {response.status_code} - {body.decode('utf-8', errors='replace')}"
+                        return
+                    retry.succeeded()
+
+                    async for chunk in response.aiter_bytes():
+                        for content in decoder.feed(chunk):
+                            yield content
+                        if decoder.done:
+                            break
+                    else:
+                        for content in decoder.flush():
+                            yield content
+                    if decoder.error:
+                        yield f"Error: {decoder.error}"
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.settle(model, reserved, decoder.usage)
+
+        except Exception as e:
+            if connecting:
+                retry.failed(retryable=isinstance(e, httpx.TransportError))
+            self._release(model, held)
+            yield f"Error: {self._describe_error(e)}"
+
+    async def test_connection(self) -> bool:
+        """Test API connection"""
+        response = await self.chat_completion(
+            messages=[{"role": "user", "content": "Say 'OK'"}],
+            model="meta-llama/llama-3.1-8b-instruct",
+            max_tokens=10
+        )
+        return response.success
+
+    async def get_available_models(self) -> List[Dict]:
+        """Get list of available models from OpenRouter"""
+        try:
+            with self._lane() as client:
+                response = await client.get("/models", timeout=httpx.Timeout(10.0, connect=self.timeout.connect))
+            if response.status_code == 200:
+                return response.json().get('data', [])
+            return []
+        except Exception as e:
+            logger.error(f"Failed to get models: {e}")
+            return []
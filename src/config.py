@@ -4,10 +4,11 @@ Configuration management for RAG Knowledge Assistant
 """
 
 import os
+import re
 import json
 from pathlib import Path
 from dataclasses import dataclass, field, asdict
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,20 +20,79 @@ DEFAULT_CONFIG = {
     "default_model": "anthropic/claude-3.5-sonnet",
     "temperature": 0.7,
     "max_tokens": 4000,
+    "max_context_tokens": 32000,
+    "llm_connect_timeout_s": 5.0,
+    "llm_read_timeout_s": 60.0,
+    "llm_max_connections": 100,
+    "llm_http2": False,
+    "llm_max_retries": 2,
+    "llm_retry_deadline_s": 30.0,
+    "circuit_failure_threshold": 5,
+    "circuit_reset_s": 30.0,
+    "fallback_models": ["openai/gpt-4o-mini", "meta-llama/llama-3.1-8b-instruct"],
+    "hedge_enabled": False,
+    "hedge_percentile": 95.0,
+    "hedge_default_ms": 3000.0,
+    "hedge_max_rate": 0.1,
+    "response_cache_enabled": False,
+    "response_cache_path": "~/.rag_assistant/response_cache.sqlite",
+    "response_cache_ttl_s": 86400.0,
+    "response_cache_size": 10000,
+    "response_cache_all_temperatures": False,
+    "rate_limit_enabled": False,
+    "rate_limit_path": "~/.rag_assistant/rate_limits.sqlite",
+    "rate_limit_rps": 5.0,
+    "rate_limit_tpm": 200000.0,
+    "rate_limit_model_rps": 2.0,
+    "rate_limit_model_tpm": 100000.0,
+    "rate_limit_max_wait_s": 60.0,
+    "route_candidates": [
+        "meta-llama/llama-3.1-8b-instruct",
+        "openai/gpt-4o-mini",
+        "anthropic/claude-3-haiku",
+        "meta-llama/llama-3.1-70b-instruct",
+        "openai/gpt-4o",
+        "anthropic/claude-3.5-sonnet"
+    ],
+    "route_max_cost_usd": 0.05,
+    "route_latency_slo_ms": 15000.0,
+    "route_max_error_rate": 0.2,
     "top_k_results": 5,
     "min_relevance_score": 0.1,
+    "rag_backend": "chroma",
+    "rag_shards": 1,
+    "rag_top_documents": 0,
+    "ivf_nlist": 0,
+    "ivf_nprobe": 8,
+    "pq_subquantizers": 48,
+    "ivf_rescore": 100,
+    "quantized_rescore": 100,
+    "mmr_lambda": 0.7,
+    "rerank_enabled": False,
+    "rerank_candidates": 20,
+    "rerank_budget_ms": 500.0,
+    "compression_enabled": False,
+    "compression_ratio": 0.5,
+    "compression_target_tokens": 0,
+    "answer_cache_enabled": False,
+    "answer_cache_threshold": 0.95,
+    "answer_cache_ttl_s": 3600.0,
+    "answer_cache_size": 512,
+    "knowledge_bases_dir": ".cursor/knowledge_bases",
+    "kb_memory_limit_mb": 1024,
     "theme": "dark",
     "language": "pl"
 }
 
 # Best models for RAG from OpenRouter (researched 2024-2025)
 # Models with large context windows and good instruction following
+# "context" is the context window in tokens
 RAG_OPTIMIZED_MODELS = {
     # Premium tier - best for complex RAG
     "anthropic/claude-3.5-sonnet": {
         "name": "Claude 3.5 Sonnet",
         "provider": "Anthropic",
-        "context": "200K",
+        "context": 200_000,
         "tier": "premium",
         "description": "Best for complex analysis and long context",
         "cost_per_1m_tokens": "$3.00 / $15.00"
@@ -40,7 +100,7 @@ RAG_OPTIMIZED_MODELS = {
     "anthropic/claude-3-haiku": {
         "name": "Claude 3 Haiku",
         "provider": "Anthropic",
-        "context": "200K",
+        "context": 200_000,
         "tier": "fast",
         "description": "Fast and efficient for simple queries",
         "cost_per_1m_tokens": "$0.25 / $1.25"
@@ -48,7 +108,7 @@ RAG_OPTIMIZED_MODELS = {
     "openai/gpt-4o": {
         "name": "GPT-4o",
         "provider": "OpenAI",
-        "context": "128K",
+        "context": 128_000,
         "tier": "premium",
         "description": "Versatile and intelligent",
         "cost_per_1m_tokens": "$2.50 / $10.00"
@@ -56,7 +116,7 @@ RAG_OPTIMIZED_MODELS = {
     "openai/gpt-4o-mini": {
         "name": "GPT-4o Mini",
         "provider": "OpenAI",
-        "context": "128K",
+        "context": 128_000,
         "tier": "fast",
         "description": "Cost-effective for most tasks",
         "cost_per_1m_tokens": "$0.15 / $0.60"
@@ -65,7 +125,7 @@ RAG_OPTIMIZED_MODELS = {
     "google/gemini-2.0-flash-exp:free": {
         "name": "Gemini 2.0 Flash (Free)",
         "provider": "Google",
-        "context": "1M",
+        "context": 1_000_000,
         "tier": "free",
         "description": "Free tier, massive context window",
         "cost_per_1m_tokens": "Free"
@@ -73,7 +133,7 @@ RAG_OPTIMIZED_MODELS = {
     "google/gemini-pro-1.5": {
         "name": "Gemini Pro 1.5",
         "provider": "Google",
-        "context": "2M",
+        "context": 2_000_000,
         "tier": "premium",
         "description": "Largest context window available",
         "cost_per_1m_tokens": "$1.25 / $5.00"
@@ -82,7 +142,7 @@ RAG_OPTIMIZED_MODELS = {
     "meta-llama/llama-3.1-70b-instruct": {
         "name": "Llama 3.1 70B",
         "provider": "Meta",
-        "context": "128K",
+        "context": 128_000,
         "tier": "open",
         "description": "Strong open-source model",
         "cost_per_1m_tokens": "$0.35 / $0.40"
@@ -90,7 +150,7 @@ RAG_OPTIMIZED_MODELS = {
     "meta-llama/llama-3.1-8b-instruct": {
         "name": "Llama 3.1 8B",
         "provider": "Meta",
-        "context": "128K",
+        "context": 128_000,
         "tier": "fast",
         "description": "Fast open-source model",
         "cost_per_1m_tokens": "$0.06 / $0.06"
@@ -99,7 +159,7 @@ RAG_OPTIMIZED_MODELS = {
     "mistralai/mistral-large": {
         "name": "Mistral Large",
         "provider": "Mistral",
-        "context": "128K",
+        "context": 128_000,
         "tier": "premium",
         "description": "European AI, strong reasoning",
         "cost_per_1m_tokens": "$2.00 / $6.00"
@@ -107,7 +167,7 @@ RAG_OPTIMIZED_MODELS = {
     "qwen/qwen-2.5-72b-instruct": {
         "name": "Qwen 2.5 72B",
         "provider": "Alibaba",
-        "context": "128K",
+        "context": 128_000,
         "tier": "premium",
         "description": "Strong multilingual model",
         "cost_per_1m_tokens": "$0.35 / $0.40"
@@ -116,7 +176,7 @@ RAG_OPTIMIZED_MODELS = {
     "deepseek/deepseek-chat": {
         "name": "DeepSeek Chat",
         "provider": "DeepSeek",
-        "context": "64K",
+        "context": 64_000,
         "tier": "budget",
         "description": "Very cost-effective",
         "cost_per_1m_tokens": "$0.14 / $0.28"
@@ -125,7 +185,7 @@ RAG_OPTIMIZED_MODELS = {
     "x-ai/grok-4.1-fast": {
         "name": "Grok 4.1 Fast",
         "provider": "xAI",
-        "context": "2M",
+        "context": 2_000_000,
         "tier": "premium",
         "description": "xAI's best agentic model, 2M context, real-time data",
         "cost_per_1m_tokens": "$3.00 / $15.00"
@@ -133,7 +193,7 @@ RAG_OPTIMIZED_MODELS = {
     "x-ai/grok-3-mini-beta": {
         "name": "Grok 3 Mini",
         "provider": "xAI",
-        "context": "128K",
+        "context": 128_000,
         "tier": "fast",
         "description": "Fast reasoning model from xAI",
         "cost_per_1m_tokens": "$0.30 / $0.50"
@@ -148,8 +208,62 @@ class AppConfig:
     default_model: str = "anthropic/claude-3.5-sonnet"
     temperature: float = 0.7
     max_tokens: int = 4000
+    max_context_tokens: int = 32000  # Cap on retrieved context per request; the model window may lower it
+    llm_connect_timeout_s: float = 5.0
+    llm_read_timeout_s: float = 60.0  # Longest wait for the next chunk of a response
+    llm_max_connections: int = 100  # Connection pool size of the async client
+    llm_http2: bool = False  # Async client only; needs the h2 package
+    llm_max_retries: int = 2  # Retries of 429/5xx/timeouts per model, with jittered backoff
+    llm_retry_deadline_s: float = 30.0  # Time budget for one model's attempts and backoff
+    circuit_failure_threshold: int = 5  # Consecutive failures that open a model's circuit
+    circuit_reset_s: float = 30.0  # Seconds an open circuit refuses calls before a trial call
+    # Tried in order when the selected model fails (ids from RAG_OPTIMIZED_MODELS)
+    fallback_models: List[str] = field(default_factory=lambda: list(DEFAULT_CONFIG["fallback_models"]))
+    hedge_enabled: bool = False  # Send a backup request (first fallback model) on a slow first token
+    # (requests the response cache can answer are not hedged, since hedged streams bypass the cache)
+    hedge_percentile: float = 95.0  # Percentile of recent time-to-first-token that triggers a hedge
+    hedge_default_ms: float = 3000.0  # Hedge threshold until enough latency history exists
+    hedge_max_rate: float = 0.1  # Cap on the share of recent calls that were hedged
+    response_cache_enabled: bool = False  # Exact cache of LLM responses on disk
+    response_cache_path: str = "~/.rag_assistant/response_cache.sqlite"
+    response_cache_ttl_s: float = 86400.0
+    response_cache_size: int = 10000  # Stored responses; least recently used are evicted
+    response_cache_all_temperatures: bool = False  # By default only temperature-0 requests are cached
+    rate_limit_enabled: bool = False  # Client-side token buckets shared by all local processes
+    rate_limit_path: str = "~/.rag_assistant/rate_limits.sqlite"
+    rate_limit_rps: float = 5.0  # Requests per second per API key; 0 = unlimited
+    rate_limit_tpm: float = 200000.0  # Tokens (prompt + max_tokens) per minute per API key
+    rate_limit_model_rps: float = 2.0  # Requests per second per model
+    rate_limit_model_tpm: float = 100000.0  # Tokens per minute per model
+    rate_limit_max_wait_s: float = 60.0  # Longest queue wait before a request fails
+    # Models the "auto" model option routes between (ids from RAG_OPTIMIZED_MODELS)
+    route_candidates: List[str] = field(default_factory=lambda: list(DEFAULT_CONFIG["route_candidates"]))
+    route_max_cost_usd: float = 0.05  # Ceiling on the estimated cost of one auto-routed request
+    route_latency_slo_ms: float = 15000.0  # Models whose observed p95 call latency exceeds this are skipped
+    route_max_error_rate: float = 0.2  # Models failing more often than this recently are skipped
     top_k_results: int = 5
     min_relevance_score: float = 0.1
+    rag_backend: str = "chroma"
+    rag_shards: int = 1
+    rag_top_documents: int = 0  # Two-stage retrieval: documents picked before chunk search; 0 = off
+    ivf_nlist: int = 0  # 0 = about 4 * sqrt(chunks)
+    ivf_nprobe: int = 8
+    pq_subquantizers: int = 48  # Must divide the embedding dimension (384)
+    ivf_rescore: int = 100  # Candidates rescored from full-precision vectors; 0 = off
+    quantized_rescore: int = 100  # Same, for the "int8" and "binary" backends
+    mmr_lambda: float = 0.7
+    rerank_enabled: bool = False
+    rerank_candidates: int = 20
+    rerank_budget_ms: float = 500.0
+    compression_enabled: bool = False
+    compression_ratio: float = 0.5  # Share of the chunk tokens kept by extractive compression
+    compression_target_tokens: int = 0  # Absolute cap on compressed tokens; 0 = ratio only
+    answer_cache_enabled: bool = False
+    answer_cache_threshold: float = 0.95  # Cosine similarity between questions for a cache hit
+    answer_cache_ttl_s: float = 3600.0
+    answer_cache_size: int = 512
+    knowledge_bases_dir: str = ".cursor/knowledge_bases"  # One subdirectory per knowledge-base id
+    kb_memory_limit_mb: int = 1024  # Loaded knowledge bases are evicted (LRU) above this (in-process indexes only)
     theme: str = "dark"
     language: str = "pl"
     
@@ -208,3 +322,58 @@ def get_model_info(model_id: str) -> Optional[Dict]:
     """Get information about a specific model"""
     return RAG_OPTIMIZED_MODELS.get(model_id)
 
+# Context window assumed for models missing from RAG_OPTIMIZED_MODELS
+DEFAULT_CONTEXT_WINDOW = 32_000
+
+def get_model_context_window(model_id: str) -> int:
+    """Context window of a model in tokens"""
+    return RAG_OPTIMIZED_MODELS.get(model_id, {}).get("context", DEFAULT_CONTEXT_WINDOW)
+
+def parse_cost_per_1m(cost: str) -> Tuple[float, float]:
+    """
+    Numeric USD prices per token from a "cost_per_1m_tokens" display string
+    
+    "$3.00 / $15.00" (prompt / completion per 1M tokens) -> (3e-06, 1.5e-05);
+    "Free" -> (0.0, 0.0); a single price applies to both.
+    
+    Raises:
+        ValueError: If the string holds no price
+    """
+    if cost.strip().lower() == "free":
+        return 0.0, 0.0
+    prices = [float(p) for p in re.findall(r"\d+(?:\.\d+)?", cost)]
+    if not prices:
+        raise ValueError(f"No price in {cost!r}")
+    prompt, completion = prices[0], prices[1] if len(prices) > 1 else prices[0]
+    return prompt / 1_000_000, completion / 1_000_000
+
+# Per-token prices assumed for models missing from RAG_OPTIMIZED_MODELS (premium-level, so
+# unknown models are never mistaken for cheap ones)
+DEFAULT_PRICES = (3.0 / 1_000_000, 15.0 / 1_000_000)
+
+def get_model_prices(model_id: str) -> Tuple[float, float]:
+    """(prompt, completion) USD price per token of a model"""
+    cost = RAG_OPTIMIZED_MODELS.get(model_id, {}).get("cost_per_1m_tokens")
+    if cost is None:
+        return DEFAULT_PRICES
+    try:
+        return parse_cost_per_1m(cost)
+    except ValueError:
+        return DEFAULT_PRICES
+
+# Providers that take explicit prompt-cache breakpoints ("cache_control") via
+# OpenRouter; others (OpenAI, DeepSeek, ...) cache matching prefixes automatically
+CACHE_CONTROL_PROVIDERS = ("anthropic/", "google/gemini")
+
+def supports_cache_control(model_id: str) -> bool:
+    """Whether a model accepts cache_control markers on message content"""
+    return model_id.startswith(CACHE_CONTROL_PROVIDERS)
+
+def format_token_count(tokens: int) -> str:
+    """Short display form of a token count, e.g. 128K or 1M"""
+    if tokens >= 1_000_000:
+        return f"{tokens / 1_000_000:g}M"
+    if tokens >= 1_000:
+        return f"{tokens / 1_000:g}K"
+    return str(tokens)
+
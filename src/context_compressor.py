@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+✂️ Context Compressor - Extractive sentence selection
+Keeps the sentences of retrieved chunks most similar to the query, in their
+original order, so the prompt carries less text that cannot help the answer
+"""
+
+import re
+import logging
+from dataclasses import dataclass, field, replace
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Sentence ends: terminal punctuation followed by whitespace, or a line break
+SENTENCE_PATTERN = re.compile(r'[^\n]+?(?:[.!?](?=\s)|$)', re.MULTILINE)
+
+
+@dataclass
+class CompressionResult:
+    """
+    Outcome of a compression pass.
+
+    Attributes:
+        results: Results with their content reduced to the kept sentences
+        original_tokens: Tokens of the chunk contents before compression
+        compressed_tokens: Tokens of the chunk contents after compression
+        sentences_total: Sentences scored
+        sentences_kept: Sentences kept
+        scores: Query similarity of each kept sentence, per result
+    """
+    results: List
+    original_tokens: int
+    compressed_tokens: int
+    sentences_total: int = 0
+    sentences_kept: int = 0
+    scores: List[List[float]] = field(default_factory=list)
+
+    @property
+    def ratio(self) -> float:
+        """Compressed size as a share of the original (1.0 = nothing removed)"""
+        return self.compressed_tokens / self.original_tokens if self.original_tokens else 1.0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.compressed_tokens
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences and lines of a text, stripped, in order"""
+    return [s.strip() for s in SENTENCE_PATTERN.findall(text) if s.strip()]
+
+
+class ExtractiveCompressor:
+    """
+    Query-focused extractive compressor.
+
+    All sentences of all chunks are encoded in one batched pass with the
+    engine's embedding model (together with the query) and ranked by cosine
+    similarity. The best sentence of every chunk is always kept, so no
+    retrieved source disappears; further sentences are added best first
+    until the token target is reached. Kept sentences are joined in their
+    original order.
+    """
+
+    def __init__(self, embedding_model, batch_size: int = 64):
+        """
+        Args:
+            embedding_model: Sentence embedding model (the RAG engine's)
+            batch_size: Sentences per encoding batch
+        """
+        if embedding_model is None:
+            raise RuntimeError("An embedding model is required for context compression")
+        self.embedding_model = embedding_model
+        self.batch_size = batch_size
+
+    def compress(
+        self,
+        query: str,
+        results: List,
+        token_counter,
+        ratio: float = 0.5,
+        target_tokens: Optional[int] = None
+    ) -> CompressionResult:
+        """
+        Reduce each result to its most query-relevant sentences
+
+        Args:
+            query: The user query
+            results: SearchResults to compress, best first
+            token_counter: TokenCounter for the target model
+            ratio: Share of the original tokens to keep
+            target_tokens: Absolute token target; the smaller of the two applies
+
+        Returns:
+            CompressionResult with the compressed results and token counts
+        """
+        sentences = [split_sentences(r.full_content) for r in results]
+        owners = [i for i, chunk in enumerate(sentences) for _ in chunk]
+        flat = [s for chunk in sentences for s in chunk]
+        original_tokens = sum(token_counter.count(r.full_content) for r in results)
+        if not flat:
+            return CompressionResult(results=results, original_tokens=original_tokens,
+                                     compressed_tokens=original_tokens)
+
+        vectors = np.asarray(self.embedding_model.encode(
+            [query] + flat, batch_size=self.batch_size, normalize_embeddings=True
+        ), dtype=np.float32)
+        scores = vectors[1:] @ vectors[0]
+        tokens = [token_counter.count(s) for s in flat]
+
+        target = int(original_tokens * ratio)
+        if target_tokens:
+            target = min(target, target_tokens)
+
+        keep = np.zeros(len(flat), dtype=bool)
+        used = 0
+        # Best sentence of each chunk first, then the rest by score
+        order = np.argsort(-scores, kind="stable")
+        covered = set()
+        for i in order:
+            if owners[i] not in covered:
+                covered.add(owners[i])
+                keep[i] = True
+                used += tokens[i]
+        for i in order:
+            if not keep[i] and used + tokens[i] <= target:
+                keep[i] = True
+                used += tokens[i]
+
+        compressed = []
+        kept_scores: List[List[float]] = []
+        position = 0
+        for result, chunk in zip(results, sentences):
+            kept = [(s, float(scores[position + j])) for j, s in enumerate(chunk) if keep[position + j]]
+            dropped = len(chunk) - len(kept)
+            position += len(chunk)
+            if not dropped:
+                compressed.append(result)
+                kept_scores.append([round(score, 3) for _, score in kept])
+                continue
+            text = " ".join(s for s, _ in kept)
+            # Offsets no longer describe the text, so it is not merged again
+            compressed.append(replace(result, full_content=text, char_count=len(text), start=None, end=None))
+            kept_scores.append([round(score, 3) for _, score in kept])
+
+        return CompressionResult(
+            results=compressed,
+            original_tokens=original_tokens,
+            compressed_tokens=sum(token_counter.count(r.full_content) for r in compressed),
+            sentences_total=len(flat),
+            sentences_kept=int(keep.sum()),
+            scores=kept_scores
+        )
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+⏱️ Hedging - Hedged LLM requests against slow first tokens
+Sends a backup request when the primary model is slower to its first token
+than it usually is, keeps whichever answer completes first and tracks how
+often that happens so hedging cannot multiply the bill
+"""
+
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """
+    Recent time-to-first-token samples per model.
+
+    The hedge threshold is a percentile of the model's last `window` samples;
+    until min_samples have been seen, default_ms is used.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        percentile: float = 95.0,
+        min_samples: int = 20,
+        default_ms: float = 3000.0,
+        min_ms: float = 250.0
+    ):
+        self.window = window
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_ms = default_ms
+        self.min_ms = min_ms
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, ttft_ms: float) -> None:
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(ttft_ms)
+
+    def threshold_ms(self, model: str) -> float:
+        """Time to first token after which a request to this model is hedged"""
+        with self._lock:
+            samples = list(self._samples.get(model, ()))
+        if len(samples) < self.min_samples:
+            return self.default_ms
+        return max(self.min_ms, float(np.percentile(samples, self.percentile)))
+
+    def samples(self, model: str) -> int:
+        with self._lock:
+            return len(self._samples.get(model, ()))
+
+
+class HedgeBudget:
+    """Caps the share of recent calls that were hedged"""
+
+    def __init__(self, max_rate: float = 0.1, window: int = 100):
+        self.max_rate = max_rate
+        self._history: Deque[bool] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        with self._lock:
+            return sum(self._history) / len(self._history) if self._history else 0.0
+
+    def allow(self) -> bool:
+        """Whether one more hedge keeps the recent hedge rate within the cap"""
+        with self._lock:
+            hedged = sum(self._history) + 1
+            return hedged / (len(self._history) + 1) <= self.max_rate
+
+    def record(self, hedged: bool) -> None:
+        with self._lock:
+            self._history.append(hedged)
+
+
+@dataclass
+class HedgeOutcome:
+    """
+    Result of a hedged call.
+
+    Attributes:
+        content: Answer text of the winning request ("" when both failed)
+        model: Model of the winning request
+        usage: Token usage the winning stream reported ({} when it reported none)
+        success: False when every request failed
+        error: Error of the primary request when nothing succeeded
+        hedged: True when the backup request was sent
+        threshold_ms: Time to first token that triggered hedging
+        ttft_ms: Time to first token per model, without time queued by the rate
+            limiter (None when none arrived)
+        latency_ms: Time until the winner completed
+        latency_saved_ms: First-token time saved by the backup, a lower bound when the
+            primary had not answered yet (0 without a backup win)
+        hedge_blocked: True when hedging was due but the rate cap refused it
+        call_ms: Duration per model whose request finished before the outcome was
+            decided (the winner and failed requests), without rate-limiter queue wait
+        failed_models: Models whose request failed
+    """
+    content: str
+    model: str
+    success: bool
+    usage: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    hedged: bool = False
+    threshold_ms: float = 0.0
+    ttft_ms: Dict[str, Optional[float]] = field(default_factory=dict)
+    latency_ms: float = 0.0
+    latency_saved_ms: float = 0.0
+    hedge_blocked: bool = False
+    call_ms: Dict[str, float] = field(default_factory=dict)
+    failed_models: List[str] = field(default_factory=list)
+
+
+class _Leg(threading.Thread):
+    """
+    One streamed request, reporting its first token and completion to a queue.
+
+    A leg cancelled before its first token keeps waiting for that token (and
+    then stops) so the tracker also learns from the slow requests that were
+    hedged, not only from the fast ones.
+    """
+
+    def __init__(self, client, model: str, events: "queue.Queue", kwargs: Dict[str, Any], tracker: LatencyTracker):
+        super().__init__(daemon=True, name=f"hedge-{model}")
+        self.client = client
+        self.model = model
+        self.events = events
+        self.kwargs = kwargs
+        self.tracker = tracker
+        self.cancelled = threading.Event()
+        self.started_at = 0.0
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.queue_wait_ms = 0.0
+        self.chunks: List[str] = []
+        self.usage: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        """Time to first token, not counting time queued by the client's rate limiter"""
+        if self.first_token_at is None:
+            return None
+        return max(0.0, (self.first_token_at - self.started_at) * 1000 - self.queue_wait_ms)
+
+    def run(self) -> None:
+        self.started_at = time.perf_counter()
+        stream = None
+        try:
+            stream = self.client.open_stream(model=self.model, **self.kwargs)
+            self.queue_wait_ms = stream.queue_wait_ms
+            for chunk in stream:
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                    self.tracker.record(self.model, self.ttft_ms)
+                    self.events.put(("first", self))
+                if self.cancelled.is_set():
+                    return
+                self.chunks.append(chunk)
+            self.usage = stream.usage
+            # A stream that failed, even after some content, is a failed leg
+            if stream.error:
+                self.error = stream.error
+            elif not self.chunks:
+                self.error = "Empty response"
+        except Exception as e:
+            # Also when the stream could not be opened: the caller waits for an event
+            self.error = str(e) or type(e).__name__
+        finally:
+            if stream is not None:
+                stream.close()
+        self.finished_at = time.perf_counter()
+        if not self.cancelled.is_set():
+            self.events.put(("error" if self.error else "done", self))
+
+
+def hedged_completion(
+    client,
+    messages: List[Dict],
+    primary: str,
+    backup: Optional[str],
+    tracker: LatencyTracker,
+    budget: HedgeBudget,
+    **kwargs
+) -> HedgeOutcome:
+    """
+    Stream from the primary model, hedging to the backup on a slow first token
+
+    If the primary has produced no token within the tracker's threshold (and
+    the budget allows), the same request is sent to the backup. The first
+    request to complete successfully wins; the other is cancelled (it stops
+    at its next chunk, or after its first token if it had none, and its
+    connection is closed). A failed request leaves the other to finish.
+
+    Args:
+        client: Client with open_stream(messages, model, ...)
+        messages: Chat messages
+        primary: Model tried first
+        backup: Model for the hedge request (None disables hedging)
+        tracker: Time-to-first-token history, updated here
+        budget: Hedge-rate cap, updated here
+        **kwargs: temperature / max_tokens for the requests
+
+    Returns:
+        HedgeOutcome with the winning answer and hedge statistics
+    """
+    start = time.perf_counter()
+    threshold_ms = tracker.threshold_ms(primary)
+    events: "queue.Queue" = queue.Queue()
+    request = dict(messages=messages, **kwargs)
+    legs = [_Leg(client, primary, events, request, tracker)]
+    legs[0].start()
+
+    outcome = HedgeOutcome(content="", model=primary, success=False, threshold_ms=round(threshold_ms, 1))
+    winner: Optional[_Leg] = None
+    failed: List[_Leg] = []
+    got_first_token = False
+
+    while winner is None and len(failed) < len(legs):
+        can_hedge = backup is not None and len(legs) == 1 and not got_first_token
+        timeout = None
+        if can_hedge:
+            timeout = max(0.0, start + threshold_ms / 1000 - time.perf_counter())
+        try:
+            kind, leg = events.get(timeout=timeout)
+        except queue.Empty:
+            # Primary is slower to its first token than usual
+            if budget.allow():
+                logger.info(f"⏱️ No first token from {primary} after {threshold_ms:.0f}ms, hedging to {backup}")
+                legs.append(_Leg(client, backup, events, request, tracker))
+                legs[1].start()
+                outcome.hedged = True
+            else:
+                outcome.hedge_blocked = True
+                got_first_token = True  # Stop waiting for the threshold; just wait for the primary
+            continue
+
+        if kind == "first":
+            got_first_token = got_first_token or leg is legs[0]
+        elif kind == "done":
+            winner = leg
+        else:
+            failed.append(leg)
+            if len(legs) == 1 and backup is not None and budget.allow():
+                # Primary failed before the threshold: hand over to the backup right away
+                legs.append(_Leg(client, backup, events, request, tracker))
+                legs[1].start()
+                outcome.hedged = True
+
+    budget.record(outcome.hedged)
+    for leg in legs:
+        if leg is not winner:
+            leg.cancelled.set()
+        ttft_ms = leg.ttft_ms
+        outcome.ttft_ms[leg.model] = round(ttft_ms, 1) if ttft_ms is not None else None
+        if leg is winner or leg in failed:
+            call_ms = (leg.finished_at - leg.started_at) * 1000 - leg.queue_wait_ms
+            outcome.call_ms[leg.model] = round(max(0.0, call_ms), 1)
+    outcome.failed_models = [leg.model for leg in failed]
+
+    outcome.latency_ms = round((time.perf_counter() - start) * 1000, 1)
+    if winner is None:
+        outcome.error = legs[0].error or "All requests failed"
+        return outcome
+
+    outcome.success = True
+    outcome.model = winner.model
+    outcome.content = "".join(winner.chunks)
+    outcome.usage = winner.usage or {}
+    if winner is not legs[0]:
+        # Primary's first token came later than the winner's (or never): that gap was saved
+        winner_first = winner.first_token_at - start
+        primary_first = (legs[0].first_token_at or time.perf_counter()) - start
+        outcome.latency_saved_ms = round(max(0.0, primary_first - winner_first) * 1000, 1)
+    return outcome
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+🗂️ Knowledge Base Registry - Many RAG engines in one process
+Loads engines per knowledge-base id on first use and evicts the least
+recently used ones under a memory ceiling
+"""
+
+import re
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .rag_engine import RAGEngine, load_embedding_model
+
+logger = logging.getLogger(__name__)
+
+# Knowledge base served when a request names none; uses the engine's default directory
+DEFAULT_KB_ID = "default"
+
+# Ids double as directory and ChromaDB collection names, so keep them to safe characters
+KB_ID_PATTERN = re.compile(r'^[A-Za-z0-9](?:[A-Za-z0-9_-]{0,46}[A-Za-z0-9])?$')
+
+
+class UnknownKnowledgeBaseError(LookupError):
+    """Raised when a knowledge-base id has no directory"""
+
+
+@dataclass
+class LoadedEngine:
+    """A loaded engine and its estimated memory footprint"""
+    engine: RAGEngine
+    memory_bytes: int = 0
+
+
+class EngineRegistry:
+    """
+    RAG engines keyed by knowledge-base id.
+
+    Knowledge base "default" lives in the engine's default directory; any
+    other id maps to a subdirectory of knowledge_bases_dir and its own
+    ChromaDB collection. Engines are created and initialized on first use and
+    share one embedding model. After each load, least recently used engines
+    are evicted until the estimated total is under the memory ceiling; an
+    evicted engine reloads (from its persisted collection when available) the
+    next time it is used.
+
+    The ceiling only covers memory an eviction frees: documents, in-process
+    vector indexes and TF-IDF matrices. ChromaDB keeps the segments of all
+    collections under one database path in a shared cache, so with the
+    chroma backend only the document text is budgeted.
+    """
+
+    def __init__(self, config, embedding_model=None):
+        """
+        Args:
+            config: AppConfig with the backend and knowledge-base settings
+            embedding_model: Shared embedding model (loaded once here when None)
+        """
+        self.config = config
+        self.root = Path(config.knowledge_bases_dir)
+        self.memory_limit_bytes = int(config.kb_memory_limit_mb * 1024 * 1024)
+        self.embedding_model = embedding_model if embedding_model is not None else load_embedding_model()
+
+        self._engines: "OrderedDict[str, LoadedEngine]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per id so a slow load does not block other knowledge bases
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def knowledge_dir(self, kb_id: str) -> Optional[Path]:
+        """
+        Directory of a knowledge base (None means the engine default)
+
+        Raises:
+            ValueError: If the id contains unsupported characters
+            UnknownKnowledgeBaseError: If no such knowledge base exists
+        """
+        if kb_id == DEFAULT_KB_ID:
+            return None
+        if not KB_ID_PATTERN.match(kb_id):
+            raise ValueError(f"Invalid knowledge base id: {kb_id!r} (use letters, digits, '-' and '_')")
+
+        path = self.root / kb_id
+        if not path.is_dir():
+            raise UnknownKnowledgeBaseError(f"Unknown knowledge base: {kb_id}")
+        return path
+
+    def available(self) -> List[str]:
+        """Ids of all knowledge bases that can be loaded"""
+        ids = [DEFAULT_KB_ID]
+        if self.root.is_dir():
+            ids.extend(sorted(
+                p.name for p in self.root.iterdir()
+                if p.is_dir() and p.name != DEFAULT_KB_ID and KB_ID_PATTERN.match(p.name)
+            ))
+        return ids
+
+    def loaded(self) -> Dict[str, int]:
+        """Estimated memory of each loaded engine, least recently used first"""
+        with self._lock:
+            return {kb_id: entry.memory_bytes for kb_id, entry in self._engines.items()}
+
+    def get(self, kb_id: str = DEFAULT_KB_ID) -> RAGEngine:
+        """
+        Engine for a knowledge base, loading it on first use
+
+        Raises:
+            ValueError: If the id contains unsupported characters
+            UnknownKnowledgeBaseError: If no such knowledge base exists
+        """
+        with self._lock:
+            entry = self._engines.get(kb_id)
+            if entry is not None:
+                self._engines.move_to_end(kb_id)
+                return entry.engine
+
+        knowledge_dir = self.knowledge_dir(kb_id)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(kb_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._engines.get(kb_id)
+                if entry is not None:  # Loaded by another request while we waited
+                    self._engines.move_to_end(kb_id)
+                    return entry.engine
+
+            logger.info(f"🔄 Loading knowledge base '{kb_id}'...")
+            engine = self._create_engine(kb_id, knowledge_dir)
+            engine.initialize()
+            memory_bytes = engine.memory_bytes()
+            logger.info(f"✅ Knowledge base '{kb_id}' ready ({len(engine.documents)} documents, "
+                        f"~{memory_bytes / 1e6:.1f} MB)")
+
+            with self._lock:
+                self._engines[kb_id] = LoadedEngine(engine, memory_bytes)
+                self._evict_over_limit(keep=kb_id)
+        return engine
+
+    def rebuild(self, kb_id: str = DEFAULT_KB_ID) -> RAGEngine:
+        """Rebuild a knowledge base's index and refresh its memory estimate"""
+        engine = self.get(kb_id)
+        engine.initialize(force_rebuild=True)
+        with self._lock:
+            entry = self._engines.get(kb_id)
+            if entry is not None and entry.engine is engine:
+                entry.memory_bytes = engine.memory_bytes()
+                self._evict_over_limit(keep=kb_id)
+        return engine
+
+    def evict(self, kb_id: str) -> bool:
+        """Drop a loaded engine; in-flight searches on it still complete"""
+        with self._lock:
+            entry = self._engines.pop(kb_id, None)
+            if entry is None:
+                return False
+            self._close_engine(kb_id, entry.engine)
+            return True
+
+    def _create_engine(self, kb_id: str, knowledge_dir: Optional[Path]) -> RAGEngine:
+        """Engine for one knowledge base, sharing the registry's embedding model"""
+        kwargs = {'embedding_model': self.embedding_model}
+        if knowledge_dir is not None:
+            kwargs['knowledge_dir'] = str(knowledge_dir)
+            kwargs['collection_name'] = f"kb_{kb_id}"
+        return RAGEngine.from_config(self.config, **kwargs)
+
+    def _evict_over_limit(self, keep: str) -> None:
+        """Evict least recently used engines until under the memory ceiling (caller holds the lock)"""
+        total = sum(entry.memory_bytes for entry in self._engines.values())
+        for kb_id in list(self._engines):
+            if total <= self.memory_limit_bytes:
+                break
+            if kb_id == keep:
+                continue
+            entry = self._engines.pop(kb_id)
+            total -= entry.memory_bytes
+            self._close_engine(kb_id, entry.engine)
+            logger.info(f"♻️ Evicted knowledge base '{kb_id}' (memory ceiling "
+                        f"{self.memory_limit_bytes / 1e6:.0f} MB)")
+
+        if total > self.memory_limit_bytes:
+            logger.warning(f"⚠️ Knowledge base '{keep}' alone exceeds the memory ceiling "
+                           f"(~{total / 1e6:.0f} MB)")
+
+    @staticmethod
+    def _close_engine(kb_id: str, engine: RAGEngine) -> None:
+        """Close an evicted engine in the background, after its in-flight searches"""
+        threading.Thread(target=engine.close, name=f"kb-close-{kb_id}", daemon=True).start()
+
+
+# Global registry instance
+_registry_instance: Optional[EngineRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_engine_registry() -> EngineRegistry:
+    """Get or create the global engine registry"""
+    global _registry_instance
+    with _registry_lock:
+        if _registry_instance is None:
+            from .config import AppConfig
+            _registry_instance = EngineRegistry(AppConfig.load())
+    return _registry_instance
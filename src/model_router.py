@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+🧭 Model Router - Cost- and latency-aware choice of model per query
+Scores how hard a question is, estimates what each candidate model would
+cost for the prompt at hand, checks live latency and error rates, and picks
+the cheapest fast model that is good enough
+"""
+
+import re
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import get_model_context_window, get_model_info, get_model_prices
+
+logger = logging.getLogger(__name__)
+
+# Model id that asks the orchestrator to route each query
+AUTO_MODEL = "auto"
+
+# Answer quality expected from each tier, on the scale of required_level()
+TIER_LEVEL = {"free": 1, "budget": 1, "fast": 1, "open": 2, "premium": 3}
+
+# Latency assumed for a model before enough calls have been observed
+TIER_LATENCY_MS = {"free": 4000.0, "budget": 3000.0, "fast": 2000.0, "open": 3500.0, "premium": 6000.0}
+
+# Cues for questions that need reasoning rather than a lookup (English and Polish)
+REASONING_PATTERN = re.compile(
+    r"\b(why|how (?:does|do|should|can|would)|compare|comparison|differen\w*|versus|vs\.?|trade-?offs?|"
+    r"pros and cons|explain|design|architect\w*|analy[sz]\w*|evaluate|optimi[sz]\w*|"
+    r"step[- ]by[- ]step|best way|should i|implications?|"
+    r"dlaczego|porównaj|wyjaśnij|różnic\w*|zaprojektuj|przeanalizuj)\b",
+    re.IGNORECASE
+)
+LOOKUP_PATTERN = re.compile(
+    r"^\s*(what is|what are|who|when|where|which|define|list|name|co to|czym jest|kto|kiedy|gdzie)\b",
+    re.IGNORECASE
+)
+CODE_PATTERN = re.compile(r"`|\b\w+\(\)|\b(def|class|import|function|SELECT|docker(?:file)?|yaml)\b")
+
+
+@dataclass
+class QueryFeatures:
+    """
+    Complexity signals of a question.
+
+    Attributes:
+        tokens: Tokens in the question
+        reasoning_cues: Words asking for explanation, comparison or design
+        lookup: Starts like a definition/fact lookup ("what is", "who", ...)
+        parts: Number of questions asked (question marks, at least 1)
+        code: Mentions code or configuration
+        complexity: Combined score in [0, 1]
+    """
+    tokens: int
+    reasoning_cues: int
+    lookup: bool
+    parts: int
+    code: bool
+    complexity: float
+
+
+def extract_features(query: str, token_counter) -> QueryFeatures:
+    """Complexity features and score of a question"""
+    tokens = token_counter.count(query)
+    cues = len(REASONING_PATTERN.findall(query))
+    lookup = bool(LOOKUP_PATTERN.match(query))
+    parts = max(1, query.count("?"))
+    code = bool(CODE_PATTERN.search(query))
+
+    score = 0.3 * min(tokens / 60, 1.0)
+    score += min(cues, 2) * 0.25
+    score += 0.15 * min(parts - 1, 2)
+    score += 0.1 if code else 0.0
+    score -= 0.15 if lookup else 0.0
+    return QueryFeatures(
+        tokens=tokens,
+        reasoning_cues=cues,
+        lookup=lookup,
+        parts=parts,
+        code=code,
+        complexity=round(min(1.0, max(0.0, score)), 3)
+    )
+
+
+def required_level(complexity: float) -> int:
+    """Lowest tier level (TIER_LEVEL) trusted with a question of this complexity"""
+    if complexity < 0.35:
+        return 1
+    if complexity < 0.65:
+        return 2
+    return 3
+
+
+class ModelStats:
+    """
+    Rolling latency and outcome of recent calls per model.
+
+    Latency is the full call duration of successful calls; the error rate
+    counts failures among the last `window` calls.
+    """
+
+    def __init__(self, window: int = 100, min_samples: int = 10):
+        self.window = window
+        self.min_samples = min_samples
+        self._latency: Dict[str, Deque[float]] = {}
+        self._outcomes: Dict[str, Deque[bool]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency_ms: float, success: bool) -> None:
+        with self._lock:
+            self._outcomes.setdefault(model, deque(maxlen=self.window)).append(success)
+            if success:
+                self._latency.setdefault(model, deque(maxlen=self.window)).append(latency_ms)
+
+    def snapshot(self, model: str) -> Dict[str, Any]:
+        """p50/p95 latency (None until min_samples), error rate and sample count of a model"""
+        with self._lock:
+            latency = list(self._latency.get(model, ()))
+            outcomes = list(self._outcomes.get(model, ()))
+        enough = len(latency) >= self.min_samples
+        return {
+            "p50_ms": round(float(np.percentile(latency, 50)), 1) if enough else None,
+            "p95_ms": round(float(np.percentile(latency, 95)), 1) if enough else None,
+            "error_rate": round(outcomes.count(False) / len(outcomes), 3) if len(outcomes) >= self.min_samples else None,
+            "calls": len(outcomes)
+        }
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            models = list(self._outcomes)
+        return {model: self.snapshot(model) for model in models}
+
+
+@dataclass
+class RoutingDecision:
+    """
+    Model chosen for one query.
+
+    Attributes:
+        model: Selected model id
+        complexity: Complexity score of the query
+        required_level: Tier level the query called for
+        estimated_cost_usd: Expected cost of the request on the selected model
+        expected_latency_ms: p50 (observed or tier default) of the selected model
+        reason: Why this model was picked
+        features: QueryFeatures as a dict
+        candidates: Every candidate with its estimate and, if rejected, why
+    """
+    model: str
+    complexity: float
+    required_level: int
+    estimated_cost_usd: float
+    expected_latency_ms: float
+    reason: str
+    features: Dict[str, Any] = field(default_factory=dict)
+    candidates: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class ModelRouter:
+    """
+    Picks a model per query within a cost ceiling and a latency SLO.
+
+    A candidate is rejected when the prompt plus max output does not fit its
+    context window, its estimated cost exceeds max_cost_usd, its observed
+    p95 latency exceeds latency_slo_ms, its error rate exceeds
+    max_error_rate, or its circuit breaker is open. Of the rest, models whose
+    tier meets the query's required level compete on cost and typical
+    latency, each relative to its budget; when none is good enough the
+    highest tier left wins. If every candidate is rejected, the cheapest one
+    that fits the context is used and the decision says so.
+    """
+
+    def __init__(
+        self,
+        candidates: List[str],
+        max_cost_usd: float = 0.05,
+        latency_slo_ms: float = 15000.0,
+        max_error_rate: float = 0.2,
+        stats: Optional[ModelStats] = None
+    ):
+        """
+        Args:
+            candidates: Model ids auto routing may choose from
+            max_cost_usd: Ceiling on the estimated cost of one request
+            latency_slo_ms: Ceiling on a model's observed p95 call latency
+            max_error_rate: Ceiling on a model's recent error rate
+            stats: Live latency/error statistics (shared with the orchestrator)
+        """
+        if not candidates:
+            raise ValueError("Auto routing needs at least one candidate model")
+        self.candidates = candidates
+        self.max_cost_usd = max_cost_usd
+        self.latency_slo_ms = latency_slo_ms
+        self.max_error_rate = max_error_rate
+        self.stats = stats or ModelStats()
+
+    @staticmethod
+    def expected_output_tokens(complexity: float, max_output_tokens: int) -> int:
+        """Answer length assumed for cost estimates: longer for harder questions"""
+        return min(max_output_tokens, int(300 + 1200 * complexity))
+
+    def estimate_cost(self, model: str, prompt_tokens: int, output_tokens: int) -> float:
+        """Estimated USD cost of a request"""
+        prompt_price, completion_price = get_model_prices(model)
+        return prompt_tokens * prompt_price + output_tokens * completion_price
+
+    def route(
+        self,
+        features: QueryFeatures,
+        prompt_tokens: int,
+        max_output_tokens: int,
+        is_available=None
+    ) -> RoutingDecision:
+        """
+        Choose the model for one request
+
+        Args:
+            features: Complexity features of the question
+            prompt_tokens: Estimated prompt size (instructions, context, question)
+            max_output_tokens: max_tokens of the request
+            is_available: Optional callable(model) -> False while its circuit is open
+
+        Returns:
+            RoutingDecision
+        """
+        level = required_level(features.complexity)
+        output_tokens = self.expected_output_tokens(features.complexity, max_output_tokens)
+
+        rows: List[Dict[str, Any]] = []
+        for model in self.candidates:
+            tier = (get_model_info(model) or {}).get("tier", "standard")
+            live = self.stats.snapshot(model)
+            row = {
+                "model": model,
+                "tier": tier,
+                "level": TIER_LEVEL.get(tier, 2),
+                "cost_usd": round(self.estimate_cost(model, prompt_tokens, output_tokens), 6),
+                "p50_ms": live["p50_ms"] if live["p50_ms"] is not None else TIER_LATENCY_MS.get(tier, 4000.0),
+                "p95_ms": live["p95_ms"],
+                "error_rate": live["error_rate"],
+                "fits_context": prompt_tokens + max_output_tokens <= get_model_context_window(model),
+                "rejected": None
+            }
+            if not row["fits_context"]:
+                row["rejected"] = "context window too small"
+            elif row["cost_usd"] > self.max_cost_usd:
+                row["rejected"] = f"cost ${row['cost_usd']:.4f} over ${self.max_cost_usd:.4f}"
+            elif live["p95_ms"] is not None and live["p95_ms"] > self.latency_slo_ms:
+                row["rejected"] = f"p95 {live['p95_ms']:.0f}ms over {self.latency_slo_ms:.0f}ms SLO"
+            elif live["error_rate"] is not None and live["error_rate"] > self.max_error_rate:
+                row["rejected"] = f"error rate {live['error_rate']:.0%}"
+            elif is_available is not None and not is_available(model):
+                row["rejected"] = "circuit open"
+            rows.append(row)
+
+        eligible = [r for r in rows if r["rejected"] is None]
+        good_enough = [r for r in eligible if r["level"] >= level]
+        if good_enough:
+            chosen = min(good_enough, key=self._cost_latency_score)
+            reason = f"cheapest/fastest model at level {level}+"
+        elif eligible:
+            chosen = min(eligible, key=lambda r: (-r["level"], self._cost_latency_score(r)))
+            reason = f"no level-{level} model within limits, best tier available"
+        else:
+            fitting = [r for r in rows if r["fits_context"]] or rows
+            chosen = min(fitting, key=lambda r: r["cost_usd"])
+            reason = "no model within limits, cheapest that fits the context"
+            logger.warning(f"⚠️ Auto routing: {reason} ({chosen['model']})")
+
+        return RoutingDecision(
+            model=chosen["model"],
+            complexity=features.complexity,
+            required_level=level,
+            estimated_cost_usd=chosen["cost_usd"],
+            expected_latency_ms=chosen["p50_ms"],
+            reason=reason,
+            features=features.__dict__.copy(),
+            candidates=rows
+        )
+
+    def _cost_latency_score(self, row: Dict[str, Any]) -> Tuple[float, float]:
+        """Cost and typical latency as shares of their budgets (lower is better)"""
+        score = row["cost_usd"] / self.max_cost_usd + row["p50_ms"] / self.latency_slo_ms
+        return score, row["cost_usd"]
@@ -11,11 +11,14 @@ This module provides an orchestration layer that:
 
 import logging
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Iterator, Optional, Any
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Failures no other model can fix: bad API key, no credits, forbidden
+NON_FALLBACK_STATUSES = (401, 402, 403)
+
 
 @dataclass
 class OrchestratorResult:
@@ -88,17 +91,18 @@ class KnowledgeOrchestrator:
         print(result.sources)
     """
     
-    # System prompt template for RAG-augmented responses
-    SYSTEM_PROMPT_TEMPLATE = """You are an intelligent knowledge assistant. Answer based on the provided context from the knowledge base.
+    # Static instructions; identical in every request so providers can cache them
+    SYSTEM_PROMPT = """You are an intelligent knowledge assistant. Answer based on the context from the knowledge base provided with the question.
 
 Rules:
 - Answer in the user's language (Polish for Polish questions, English for English)
 - Be concise but comprehensive
 - Use Markdown formatting for readability
 - Cite sources when possible (mention the filename)
-- If context doesn't contain the answer, say so honestly
-
-Context from knowledge base:
+- If context doesn't contain the answer, say so honestly"""
+    
+    # Retrieved context, sent after the instructions and before the question
+    CONTEXT_TEMPLATE = """Context from knowledge base:
 {context}"""
 
     def __init__(self, rag_engine, ai_client, config):
@@ -114,6 +118,23 @@ Context from knowledge base:
         self.ai_client = ai_client
         self.config = config
         
+        # Cross-encoder is loaded on first use when reranking is enabled
+        self._reranker = None
+        
+        # Semantic answer cache, created on first use when enabled
+        self._answer_cache = None
+        # Extractive context compressor, created on first use when enabled
+        self._compressor = None
+        
+        # Time-to-first-token history and hedge-rate cap, created on first hedged call
+        self._latency_tracker = None
+        self._hedge_budget = None
+        
+        # Latency and error rate of every model call, used by "auto" routing
+        from .model_router import ModelStats
+        self._model_stats = ModelStats()
+        self._router = None
+        
         logger.info("🎯 KnowledgeOrchestrator initialized")
     
     def handle_message(
@@ -126,10 +147,11 @@ Context from knowledge base:
         Main orchestration method - processes a user message and returns a response.
         
         This method:
-        1. Runs RAG search to find relevant context
-        2. Builds a system prompt with the context
-        3. Calls the LLM to generate a response
-        4. Returns structured result with answer, sources, and metadata
+        1. Returns a cached answer when a near-identical question was answered before
+        2. Runs RAG search to find relevant context (optionally reranked and compressed)
+        3. Builds a system prompt with the context, packed into the model's token budget
+        4. Calls the LLM to generate a response
+        5. Returns structured result with answer, sources, and metadata
         
         Args:
             user_message: The user's question or message
@@ -139,60 +161,29 @@ Context from knowledge base:
         Returns:
             OrchestratorResult with answer, sources, model info, usage stats, and steps
         """
-        import time
-        
         steps: List[Dict[str, Any]] = []
-        sources: List[Dict[str, Any]] = []
-        context = "No context available."
         
         # Use provided model or fall back to config default
         selected_model = model or self.config.default_model
         
-        # Step 1: RAG Search
-        try:
-            rag_result = self._run_rag_tool(user_message)
-            steps.append(rag_result["step"])
-            sources = rag_result["sources"]
-            context = rag_result["context"]
-        except Exception as e:
-            logger.error(f"❌ RAG search failed: {e}")
-            steps.append(OrchestrationStep(
-                step_type="rag_search",
-                description=f"RAG search failed: {str(e)}",
-                metadata={"error": str(e)}
-            ).to_dict())
-        
-        # Step 2: Build LLM messages
-        start_time = time.time()
-        
-        system_prompt = self.SYSTEM_PROMPT_TEMPLATE.format(context=context)
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
-        ]
-        
-        build_time = (time.time() - start_time) * 1000
-        steps.append(OrchestrationStep(
-            step_type="context_build",
-            description=f"Built system prompt with {len(context)} chars of context",
-            duration_ms=build_time,
-            metadata={
-                "context_length": len(context),
-                "sources_count": len(sources),
-                "model": selected_model
-            }
-        ).to_dict())
+        # Steps 0-2: answer cache, retrieval, model routing, context packing
+        prepared = self._prepare_request(user_message, selected_model, steps)
+        if prepared["cached"] is not None:
+            return prepared["cached"]
+        selected_model = prepared["model"]
+        sources = prepared["sources"]
+        cache_lookup = prepared["cache_lookup"]
         
         # Step 3: Call LLM
         try:
             llm_result = self._run_llm_tool(
-                messages=messages,
+                messages=prepared["messages"],
                 model=selected_model
             )
             steps.append(llm_result["step"])
             
             if llm_result["success"]:
-                return OrchestratorResult(
+                result = OrchestratorResult(
                     answer=llm_result["content"],
                     sources=sources,
                     model=llm_result["model"],
@@ -200,6 +191,9 @@ Context from knowledge base:
                     steps=steps,
                     success=True
                 )
+                if cache_lookup is not None and cache_lookup["embedding"] is not None:
+                    self._answer_cache.store(cache_lookup["embedding"], cache_lookup["key"], user_message, result)
+                return result
             else:
                 return OrchestratorResult(
                     answer=f"❌ **Error:** {llm_result['error']}",
@@ -229,7 +223,305 @@ Context from knowledge base:
                 error=str(e)
             )
     
-    def _run_rag_tool(self, query: str) -> Dict[str, Any]:
+    def handle_message_stream(
+        self, 
+        user_message: str, 
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        model: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming variant of handle_message.
+        
+        Runs the same cache, retrieval and context steps, then streams the
+        answer. Yields event dicts in this order:
+        - {"type": "sources", "sources": [...]} once retrieval is done
+        - {"type": "delta", "content": "..."} for each chunk of the answer
+        - {"type": "done", "result": OrchestratorResult} with usage and all steps
+        
+        Closing the generator early closes the LLM connection.
+        
+        Args:
+            user_message: The user's question or message
+            chat_history: Optional list of previous messages (for context)
+            model: Optional model override (uses config.default_model if not provided)
+            
+        Yields:
+            Event dicts as described above
+        """
+        import time
+        request_start = time.time()
+        
+        steps: List[Dict[str, Any]] = []
+        selected_model = model or self.config.default_model
+        
+        prepared = self._prepare_request(user_message, selected_model, steps)
+        cached = prepared["cached"]
+        if cached is not None:
+            yield {"type": "sources", "sources": cached.sources}
+            yield {"type": "delta", "content": cached.answer}
+            yield {"type": "done", "result": cached}
+            return
+        selected_model = prepared["model"]
+        sources = prepared["sources"]
+        cache_lookup = prepared["cache_lookup"]
+        yield {"type": "sources", "sources": sources}
+        
+        # Step 3: Stream the LLM answer
+        try:
+            llm_result = yield from self._run_llm_stream_tool(
+                messages=prepared["messages"],
+                model=selected_model,
+                prompt_tokens=prepared["prompt_tokens"],
+                counter=prepared["counter"],
+                request_start=request_start
+            )
+        except Exception as e:
+            logger.error(f"❌ LLM stream failed: {e}")
+            llm_result = {
+                "step": OrchestrationStep(
+                    step_type="llm_stream",
+                    description=f"LLM stream failed: {str(e)}",
+                    metadata={"error": str(e)}
+                ).to_dict(),
+                "success": False,
+                "content": "",
+                "error": str(e)
+            }
+        steps.append(llm_result["step"])
+        
+        if llm_result["success"]:
+            result = OrchestratorResult(
+                answer=llm_result["content"],
+                sources=sources,
+                model=llm_result["model"],
+                usage=llm_result["usage"],
+                steps=steps,
+                success=True
+            )
+            if cache_lookup is not None and cache_lookup["embedding"] is not None:
+                self._answer_cache.store(cache_lookup["embedding"], cache_lookup["key"], user_message, result)
+        else:
+            # Keep whatever text already reached the user
+            error_text = f"❌ **Error:** {llm_result['error']}"
+            yield {"type": "delta", "content": f"\n\n{error_text}" if llm_result["content"] else error_text}
+            result = OrchestratorResult(
+                answer=f"{llm_result['content']}\n\n{error_text}" if llm_result["content"] else error_text,
+                sources=sources,
+                model=selected_model,
+                usage={},
+                steps=steps,
+                success=False,
+                error=llm_result["error"]
+            )
+        yield {"type": "done", "result": result}
+    
+    def _prepare_request(self, user_message: str, selected_model: str, steps: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Steps before the LLM call, shared by handle_message and handle_message_stream
+        
+        Appends the answer cache, retrieval and context_build steps to `steps`.
+        
+        Returns:
+            Dict with 'cached' (OrchestratorResult of an answer cache hit, else None),
+            'cache_lookup', 'sources', 'messages', 'prompt_tokens', 'counter' and
+            'model' (the routed model when "auto" was requested)
+        """
+        import time
+        
+        sources: List[Dict[str, Any]] = []
+        results: List[Any] = []
+        context = "No context available."
+        
+        from .tokens import TokenCounter, context_token_budget
+        from .config import get_model_context_window, supports_cache_control
+        from .model_router import AUTO_MODEL
+        counter = TokenCounter(selected_model)
+        
+        # Step 0: Semantic answer cache
+        cache_lookup = None
+        if self.config.answer_cache_enabled:
+            try:
+                cache_lookup = self._run_cache_tool(user_message, selected_model)
+                steps.append(cache_lookup["step"])
+                if cache_lookup["hit"] is not None:
+                    cached = cache_lookup["hit"].result
+                    return {"cached": OrchestratorResult(
+                        answer=cached.answer,
+                        sources=cached.sources,
+                        model=cached.model,
+                        usage={"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached": True},
+                        steps=steps,
+                        success=True
+                    )}
+            except Exception as e:
+                logger.error(f"❌ Answer cache lookup failed: {e}")
+                cache_lookup = None
+        
+        # Step 1: RAG Search (reusing the query embedding of the cache lookup)
+        try:
+            query_embedding = cache_lookup["embedding"] if cache_lookup is not None else None
+            rag_result = self._run_rag_tool(user_message, query_embedding)
+            steps.append(rag_result["step"])
+            results = rag_result["results"]
+            sources = rag_result["sources"]
+            context = rag_result["context"]
+            
+            # Step 1b: Optional cross-encoder rerank of the over-fetched candidates
+            if self.config.rerank_enabled and rag_result["results"]:
+                rerank_result = self._run_rerank_tool(user_message, rag_result["results"])
+                steps.append(rerank_result["step"])
+                results = rerank_result["results"]
+                sources = rerank_result["sources"]
+                context = rerank_result["context"]
+            
+            # Step 1c: Optional extractive compression of the selected chunks
+            if self.config.compression_enabled and results:
+                compression_result = self._run_compression_tool(user_message, results, counter)
+                steps.append(compression_result["step"])
+                results = compression_result["results"]
+        except Exception as e:
+            logger.error(f"❌ RAG search failed: {e}")
+            steps.append(OrchestrationStep(
+                step_type="rag_search",
+                description=f"RAG search failed: {str(e)}",
+                metadata={"error": str(e)}
+            ).to_dict())
+        
+        # Step 1d: "auto" model - route on question complexity, prompt size and live model stats
+        if selected_model == AUTO_MODEL:
+            route_result = self._run_route_tool(user_message, results, counter)
+            steps.append(route_result["step"])
+            selected_model = route_result["model"]
+            counter = TokenCounter(selected_model)
+        
+        # Step 2: Pack context into the model's token budget and build LLM messages
+        start_time = time.time()
+        
+        prompt_tokens = counter.count_messages(self._build_messages("", user_message, selected_model))
+        budget = context_token_budget(
+            selected_model,
+            self.config.max_tokens,
+            prompt_tokens,
+            cap=self.config.max_context_tokens
+        )
+        packing: Dict[str, Any] = {}
+        if results:
+            packed = self.rag.pack_context(results, budget, counter, stable_order=True)
+            context = packed.context
+            sources = self._build_sources(packed.results)
+            packing = {
+                "included": len(packed.results),
+                "dropped": packed.dropped,
+                "truncated": packed.truncated
+            }
+        context_tokens = counter.count(context)
+        
+        messages = self._build_messages(context, user_message, selected_model)
+        
+        build_time = (time.time() - start_time) * 1000
+        steps.append(OrchestrationStep(
+            step_type="context_build",
+            description=f"Built prompt with {context_tokens} of {budget} context tokens",
+            duration_ms=build_time,
+            metadata={
+                "context_length": len(context),
+                "context_tokens": context_tokens,
+                "context_budget_tokens": budget,
+                "prompt_tokens": prompt_tokens + context_tokens,
+                "context_window": get_model_context_window(selected_model),
+                "max_output_tokens": self.config.max_tokens,
+                "tokenizer": counter.name,
+                "sources_count": len(sources),
+                "model": selected_model,
+                "cache_control": supports_cache_control(selected_model),
+                **packing
+            }
+        ).to_dict())
+
+        return {
+            "cached": None,
+            "cache_lookup": cache_lookup,
+            "sources": sources,
+            "messages": messages,
+            "prompt_tokens": prompt_tokens + context_tokens,
+            "counter": counter,
+            "model": selected_model
+        }
+    
+    def _cache_key(self, model: str) -> tuple:
+        """Answers are only reused for the same model, index version and answer-affecting settings"""
+        return (
+            model,
+            getattr(self.rag, "index_version", 0),
+            self.config.temperature,
+            self.config.max_tokens,
+            self.config.top_k_results,
+            self.config.min_relevance_score,
+            self.config.mmr_lambda,
+            self.config.rerank_enabled,
+            self.config.compression_enabled,
+            self.config.compression_ratio,
+            self.config.compression_target_tokens
+        )
+    
+    def _run_cache_tool(self, query: str, model: str) -> Dict[str, Any]:
+        """
+        Execute semantic answer cache lookup tool.
+        
+        Embeds the query and looks for a stored answer to a question at least
+        answer_cache_threshold similar, under the same cache key.
+        
+        Args:
+            query: The user's question
+            model: Model the answer would be generated with
+            
+        Returns:
+            Dict with 'step', 'hit' (CacheHit or None), 'embedding' and 'key' keys
+        """
+        import time
+        start_time = time.time()
+        
+        if self._answer_cache is None:
+            from .answer_cache import SemanticAnswerCache
+            self._answer_cache = SemanticAnswerCache(
+                threshold=self.config.answer_cache_threshold,
+                ttl_s=self.config.answer_cache_ttl_s,
+                max_entries=self.config.answer_cache_size
+            )
+        
+        embedding = self.rag.embed_query(query) if self.rag else None
+        key = self._cache_key(model)
+        hit = self._answer_cache.lookup(embedding, key) if embedding is not None else None
+        
+        if hit is not None:
+            description = f"Cache hit ({hit.similarity:.1%} similar to an answer from {hit.age_s:.0f}s ago)"
+            metadata = {
+                "hit": True,
+                "similarity": round(hit.similarity, 4),
+                "cached_query": hit.query[:100] + "..." if len(hit.query) > 100 else hit.query,
+                "age_s": round(hit.age_s, 1),
+                "original_usage": hit.result.usage
+            }
+        else:
+            description = "Cache miss" if embedding is not None else "Cache skipped (no embedding model)"
+            metadata = {"hit": False}
+        metadata.update({"threshold": self._answer_cache.threshold, "entries": len(self._answer_cache)})
+        
+        step = OrchestrationStep(
+            step_type="answer_cache",
+            description=description,
+            duration_ms=(time.time() - start_time) * 1000,
+            metadata=metadata
+        ).to_dict()
+        
+        return {
+            "step": step,
+            "hit": hit,
+            "embedding": embedding,
+            "key": key
+        }
+    
+    def _run_rag_tool(self, query: str, query_embedding: Any = None) -> Dict[str, Any]:
         """
         Execute RAG search tool.
         
@@ -238,38 +530,41 @@ Context from knowledge base:
         
         Args:
             query: Search query
+            query_embedding: Query embedding already computed for the answer cache, if any
             
         Returns:
             Dict with 'step', 'sources', and 'context' keys
         """
         import time
+        from .rag_engine import NO_CONTEXT_MESSAGE
         start_time = time.time()
         
         top_k = self.config.top_k_results
         min_score = self.config.min_relevance_score
         
-        # Execute search
-        search_results = self.rag.search(
-            query=query,
-            top_k=top_k,
-            min_score=min_score
-        )
-        
-        # Build sources list
-        sources = []
-        if search_results:
-            sources = [
-                {
-                    "filename": r.filename,
-                    "score": r.relevance_score,
-                    "snippet": r.content_preview[:400] + "..." if len(r.content_preview) > 400 else r.content_preview,
-                    "type": r.file_type
-                }
-                for r in search_results
-            ]
-            context = self.rag.get_context_for_query(query, top_k=top_k)
+        if self.config.rerank_enabled:
+            # Over-fetch candidates for the reranker; context is built after reranking
+            top_k = max(self.config.rerank_candidates, top_k)
+            retrieval = self.rag.retrieve(
+                query=query,
+                top_k=top_k,
+                min_score=min_score,
+                distinct_documents=True,
+                query_embedding=query_embedding
+            )
         else:
-            context = "No relevant information found in the knowledge base."
+            # Execute a single retrieval that yields both the ranked results and the context
+            retrieval = self.rag.retrieve_with_context(
+                query=query,
+                top_k=top_k,
+                min_score=min_score,
+                mmr_lambda=self.config.mmr_lambda,
+                query_embedding=query_embedding
+            )
+        search_results = retrieval.results
+        # retrieve() builds no context; with results it is built after reranking
+        context = retrieval.context or NO_CONTEXT_MESSAGE
+        sources = self._build_sources(search_results)
         
         duration_ms = (time.time() - start_time) * 1000
         
@@ -281,17 +576,324 @@ Context from knowledge base:
                 "query": query[:100] + "..." if len(query) > 100 else query,
                 "top_k": top_k,
                 "min_score": min_score,
+                "mmr_lambda": None if self.config.rerank_enabled else self.config.mmr_lambda,
                 "results_count": len(search_results) if search_results else 0,
-                "top_score": round(search_results[0].relevance_score, 3) if search_results else 0
+                "top_score": round(search_results[0].relevance_score, 3) if search_results else 0,
+                "retrieval_passes": 1,
+                "retrieval_rounds": retrieval.rounds,
+                "candidates_scanned": retrieval.candidates_scanned
             }
         ).to_dict()
         
         return {
             "step": step,
+            "results": search_results,
             "sources": sources,
             "context": context
         }
     
+    def _run_rerank_tool(self, query: str, candidates: List[Any]) -> Dict[str, Any]:
+        """
+        Execute cross-encoder rerank tool.
+        
+        Scores the over-fetched candidates and keeps the best top_k. If the
+        cross-encoder is unavailable, fails, or runs over the time budget,
+        the first-stage order is kept.
+        
+        Args:
+            query: Search query
+            candidates: First-stage SearchResult candidates, best first
+            
+        Returns:
+            Dict with 'step', 'results', 'sources', and 'context' keys
+        """
+        import time
+        start_time = time.time()
+        
+        top_k = self.config.top_k_results
+        budget_ms = self.config.rerank_budget_ms
+        metadata: Dict[str, Any] = {
+            "candidates": len(candidates),
+            "top_k": top_k,
+            "budget_ms": budget_ms
+        }
+        
+        try:
+            if self._reranker is None:
+                from .reranker import CrossEncoderReranker
+                self._reranker = CrossEncoderReranker()
+            
+            rerank = self._reranker.rerank(query, candidates, top_k=top_k, budget_ms=budget_ms)
+            results = rerank.results
+            metadata.update({
+                "model": self._reranker.model_name,
+                "reranked": rerank.reranked,
+                "timed_out": rerank.timed_out,
+                "scored_pairs": rerank.scored_pairs,
+                "cache_hits": rerank.cache_hits,
+                "scores": [round(score, 3) for score in rerank.scores if score is not None]
+            })
+            if rerank.reranked:
+                description = f"Reranked {len(candidates)} candidates, kept {len(results)}"
+            else:
+                description = f"Rerank over {budget_ms:.0f}ms budget, kept first-stage order"
+        except Exception as e:
+            logger.error(f"❌ Rerank failed: {e}")
+            results = candidates[:top_k]
+            metadata.update({"reranked": False, "error": str(e)})
+            description = f"Rerank failed, kept first-stage order: {str(e)}"
+        
+        context = self.rag.build_context(results)
+        duration_ms = (time.time() - start_time) * 1000
+        
+        step = OrchestrationStep(
+            step_type="rerank",
+            description=description,
+            duration_ms=duration_ms,
+            metadata=metadata
+        ).to_dict()
+        
+        return {
+            "step": step,
+            "results": results,
+            "sources": self._build_sources(results),
+            "context": context
+        }
+    
+    def _run_compression_tool(self, query: str, results: List[Any], counter: Any) -> Dict[str, Any]:
+        """
+        Execute extractive context compression tool.
+        
+        Merges touching chunks, then keeps the sentences most similar to the
+        query (scored with the RAG engine's embedding model) up to
+        compression_ratio of the tokens, or compression_target_tokens when
+        that is smaller. On failure the results are passed through unchanged.
+        
+        Args:
+            query: The user's question
+            results: Selected SearchResults, best first
+            counter: TokenCounter for the target model
+            
+        Returns:
+            Dict with 'step' and 'results' keys
+        """
+        import time
+        start_time = time.time()
+        
+        metadata: Dict[str, Any] = {
+            "ratio_target": self.config.compression_ratio,
+            "token_target": self.config.compression_target_tokens or None
+        }
+        
+        try:
+            if self._compressor is None:
+                from .context_compressor import ExtractiveCompressor
+                self._compressor = ExtractiveCompressor(self.rag.embedding_model)
+            
+            compression = self._compressor.compress(
+                query,
+                self.rag.merge_adjacent_chunks(results),
+                counter,
+                ratio=self.config.compression_ratio,
+                target_tokens=self.config.compression_target_tokens or None
+            )
+            results = compression.results
+            metadata.update({
+                "original_tokens": compression.original_tokens,
+                "compressed_tokens": compression.compressed_tokens,
+                "tokens_saved": compression.tokens_saved,
+                "compression_ratio": round(compression.ratio, 3),
+                "sentences_kept": compression.sentences_kept,
+                "sentences_total": compression.sentences_total
+            })
+            description = (f"Kept {compression.sentences_kept}/{compression.sentences_total} sentences, "
+                           f"saved {compression.tokens_saved} tokens ({compression.ratio:.0%} of original)")
+        except Exception as e:
+            logger.error(f"❌ Context compression failed: {e}")
+            metadata["error"] = str(e)
+            description = f"Compression failed, kept full chunks: {str(e)}"
+        
+        duration_ms = (time.time() - start_time) * 1000
+        
+        step = OrchestrationStep(
+            step_type="compression",
+            description=description,
+            duration_ms=duration_ms,
+            metadata=metadata
+        ).to_dict()
+        
+        return {
+            "step": step,
+            "results": results
+        }
+    
+    def _run_route_tool(self, query: str, results: List[Any], counter: Any) -> Dict[str, Any]:
+        """
+        Execute model routing tool for the "auto" model.
+        
+        The prompt is estimated from the instructions, the question and the
+        retrieved chunks (up to max_context_tokens), before it is packed for
+        the chosen model.
+        
+        Args:
+            query: The user query
+            results: Retrieved (and possibly compressed) SearchResults
+            counter: Model-independent TokenCounter
+            
+        Returns:
+            Dict with 'step' and 'model'
+        """
+        import time
+        from .config import DEFAULT_CONFIG
+        from .model_router import AUTO_MODEL, ModelRouter, extract_features
+        start_time = time.time()
+        
+        try:
+            if self._router is None:
+                self._router = ModelRouter(
+                    self.config.route_candidates,
+                    max_cost_usd=self.config.route_max_cost_usd,
+                    latency_slo_ms=self.config.route_latency_slo_ms,
+                    max_error_rate=self.config.route_max_error_rate,
+                    stats=self._model_stats
+                )
+            
+            context_tokens = min(
+                sum(counter.count(r.full_content) for r in results),
+                self.config.max_context_tokens
+            )
+            prompt_tokens = counter.count_messages(self._build_messages("", query, AUTO_MODEL)) + context_tokens
+            features = extract_features(query, counter)
+            decision = self._router.route(
+                features,
+                prompt_tokens,
+                self.config.max_tokens,
+                is_available=getattr(self.ai_client, "is_available", None)
+            )
+            model = decision.model
+            description = (f"Routed to {model} (complexity {decision.complexity:.2f}, "
+                           f"~${decision.estimated_cost_usd:.4f}): {decision.reason}")
+            metadata = {
+                "model": model,
+                "complexity": decision.complexity,
+                "required_level": decision.required_level,
+                "estimated_prompt_tokens": prompt_tokens,
+                "estimated_cost_usd": decision.estimated_cost_usd,
+                "expected_latency_ms": decision.expected_latency_ms,
+                "max_cost_usd": self.config.route_max_cost_usd,
+                "latency_slo_ms": self.config.route_latency_slo_ms,
+                "features": decision.features,
+                "candidates": decision.candidates
+            }
+        except Exception as e:
+            logger.error(f"❌ Model routing failed: {e}")
+            model = (self.config.route_candidates or [DEFAULT_CONFIG["default_model"]])[0]
+            description = f"Routing failed, using {model}: {str(e)}"
+            metadata = {"model": model, "error": str(e)}
+        
+        duration_ms = (time.time() - start_time) * 1000
+        
+        step = OrchestrationStep(
+            step_type="route",
+            description=description,
+            duration_ms=duration_ms,
+            metadata=metadata
+        ).to_dict()
+        
+        return {
+            "step": step,
+            "model": model
+        }
+    
+    @staticmethod
+    def _build_sources(results: List[Any]) -> List[Dict[str, Any]]:
+        """Convert search results into the sources list shown in the UI"""
+        return [
+            {
+                "filename": r.filename,
+                "score": r.relevance_score,
+                "snippet": r.content_preview[:400] + "..." if len(r.content_preview) > 400 else r.content_preview,
+                "type": r.file_type
+            }
+            for r in results
+        ]
+    
+    def _run_hedged_call(self, messages: List[Dict[str, Any]], chain: List[str], is_available) -> Any:
+        """
+        Streamed call to the first available model of the chain, hedged to the next one
+        
+        The hedge fires when no first token has arrived within the primary's
+        learned time-to-first-token percentile (hedge_percentile of its recent
+        calls), unless hedges already make up hedge_max_rate of recent calls.
+        
+        Returns:
+            HedgeOutcome (ttft_ms lists the models that were called)
+        """
+        from .hedging import HedgeBudget, LatencyTracker, hedged_completion
+        
+        if self._latency_tracker is None:
+            self._latency_tracker = LatencyTracker(
+                percentile=self.config.hedge_percentile,
+                default_ms=self.config.hedge_default_ms
+            )
+            self._hedge_budget = HedgeBudget(max_rate=self.config.hedge_max_rate)
+        
+        available = [m for m in chain if is_available is None or is_available(m)] or chain[:1]
+        return hedged_completion(
+            self.ai_client,
+            messages,
+            primary=available[0],
+            backup=available[1] if len(available) > 1 else None,
+            tracker=self._latency_tracker,
+            budget=self._hedge_budget,
+            temperature=self.config.temperature,
+            max_tokens=self.config.max_tokens
+        )
+    
+    def _model_chain(self, model: str) -> List[str]:
+        """The requested model followed by the configured fallbacks, without repeats"""
+        chain = [model]
+        for fallback in self.config.fallback_models:
+            if fallback not in chain:
+                chain.append(fallback)
+        return chain
+    
+    def _build_messages(self, context: str, user_message: str, model: str) -> List[Dict[str, Any]]:
+        """
+        LLM messages laid out for provider prompt caching.
+        
+        The longest-lived content comes first: the static system prompt, then
+        the retrieved context (packed in a stable order), then the question.
+        Providers with automatic prefix caching reuse whatever prefix repeats;
+        for providers that need explicit breakpoints, one cache_control marker
+        closes the context block (the system prompt alone is far below the
+        1024-token minimum a breakpoint needs, and is covered by this one).
+        
+        Args:
+            context: Packed context string
+            user_message: The user's question
+            model: Target model id
+            
+        Returns:
+            List of message dicts
+        """
+        from .config import supports_cache_control
+        
+        context_block = self.CONTEXT_TEMPLATE.format(context=context)
+        if not supports_cache_control(model):
+            return [
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": f"{context_block}\n\nQuestion: {user_message}"}
+            ]
+        
+        return [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": [
+                {"type": "text", "text": context_block, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": f"\n\nQuestion: {user_message}"}
+            ]}
+        ]
+    
     def _run_llm_tool(
         self, 
         messages: List[Dict[str, str]], 
@@ -300,8 +902,14 @@ Context from knowledge base:
         """
         Execute LLM call tool.
         
-        This is a dedicated helper method for LLM operations,
-        making it easy to extend or modify LLM behavior.
+        Tries the requested model, then each model of config.fallback_models
+        in turn when a call fails (after the client's own retries). Models
+        whose circuit breaker is open are skipped. Authentication and billing
+        errors are not retried on other models, since they would fail too.
+        
+        With hedge_enabled the call is streamed and hedged instead, except
+        for requests the client's response cache can answer: hedged streams
+        bypass that cache, so those keep the plain (cached) path.
         
         Args:
             messages: List of message dicts for the LLM
@@ -311,28 +919,126 @@ Context from knowledge base:
             Dict with 'step', 'success', 'content', 'model', 'usage', and optionally 'error'
         """
         import time
+        from .ai_client import cached_prompt_tokens, chat_payload
         start_time = time.time()
         
-        response = self.ai_client.chat_completion(
-            messages=messages,
-            model=model,
-            temperature=self.config.temperature,
-            max_tokens=self.config.max_tokens,
-            stream=False
+        is_available = getattr(self.ai_client, "is_available", None)
+        attempts: List[Dict[str, Any]] = []
+        response = None
+        served_by = None  # Chain model that produced the response
+        chain = self._model_chain(model)
+        queue_wait_ms = 0.0  # Time spent queued by the client-side rate limiter
+        
+        response_cache = getattr(self.ai_client, "response_cache", None)
+        cacheable = response_cache is not None and response_cache.cacheable(
+            chat_payload(messages, model, self.config.temperature, self.config.max_tokens, stream=False)
         )
         
+        hedge = None
+        if self.config.hedge_enabled and hasattr(self.ai_client, "open_stream") and not cacheable:
+            hedge = self._run_hedged_call(messages, chain, is_available)
+            # Legs cancelled by the winner did not finish and are not counted
+            for leg_model, leg_ms in hedge.call_ms.items():
+                self._model_stats.record(leg_model, leg_ms, leg_model not in hedge.failed_models)
+            tried = list(hedge.ttft_ms)
+            attempts.extend({"model": m, "hedge_leg": True, "ttft_ms": hedge.ttft_ms[m]} for m in tried)
+            if hedge.success:
+                from .ai_client import AIResponse
+                response = AIResponse(content=hedge.content, model=hedge.model, usage=hedge.usage, success=True)
+                served_by = hedge.model
+                chain = []
+            else:
+                attempts[-1]["error"] = hedge.error
+                chain = [m for m in chain if m not in tried]
+        
+        for candidate in chain:
+            if is_available is not None and not is_available(candidate):
+                attempts.append({"model": candidate, "skipped": "circuit open"})
+                continue
+            
+            call_start = time.time()
+            response = self.ai_client.chat_completion(
+                messages=messages,
+                model=candidate,
+                temperature=self.config.temperature,
+                max_tokens=self.config.max_tokens,
+                stream=False
+            )
+            served_by = candidate
+            if not getattr(response, "cached", False):
+                latency_ms = (time.time() - call_start) * 1000 - getattr(response, "queue_wait_ms", 0.0)
+                self._model_stats.record(candidate, latency_ms, response.success)
+            queue_wait_ms += getattr(response, "queue_wait_ms", 0.0)
+            attempts.append({
+                "model": candidate,
+                "attempts": getattr(response, "attempts", 1),
+                "queue_wait_ms": round(getattr(response, "queue_wait_ms", 0.0), 1),
+                "error": None if response.success else response.error
+            })
+            if response.success or getattr(response, "status_code", None) in NON_FALLBACK_STATUSES:
+                break
+            logger.warning(f"⚠️ {candidate} failed, trying next fallback model")
+        
         duration_ms = (time.time() - start_time) * 1000
+        fallback_used = served_by is not None and served_by != model
+        queue_metadata = {"queue_wait_ms": round(queue_wait_ms, 1)}
+        hedge_metadata = {}
+        if hedge is not None:
+            hedge_metadata = {"hedge": {
+                "hedged": hedge.hedged,
+                "blocked_by_rate_cap": hedge.hedge_blocked,
+                "threshold_ms": hedge.threshold_ms,
+                "ttft_ms": hedge.ttft_ms,
+                "latency_saved_ms": hedge.latency_saved_ms,
+                "hedge_rate": round(self._hedge_budget.rate, 3),
+                "max_hedge_rate": self.config.hedge_max_rate
+            }}
+        
+        if response is None:
+            error = "All models unavailable (circuit breakers open)"
+            step = OrchestrationStep(
+                step_type="llm_call",
+                description=f"LLM call failed: {error}",
+                duration_ms=duration_ms,
+                metadata={"model": model, "error": error, "models_tried": attempts, **queue_metadata, **hedge_metadata}
+            ).to_dict()
+            return {
+                "step": step,
+                "success": False,
+                "content": "",
+                "model": model,
+                "usage": {},
+                "error": error
+            }
         
         if response.success:
+            cached_tokens = cached_prompt_tokens(response.usage)
+            description = f"Generated response using {response.model}"
+            if getattr(response, "cached", False):
+                description += " (from response cache)"
+            if hedge is not None and hedge.hedged and hedge.success:
+                description += f" (hedged, saved {hedge.latency_saved_ms:.0f}ms)" if fallback_used else " (hedged, primary won)"
+            elif fallback_used:
+                description += f" (fallback from {model})"
+            if cached_tokens:
+                description += f" ({cached_tokens} prompt tokens from provider cache)"
+            if queue_wait_ms >= 1:
+                description += f" (queued {queue_wait_ms:.0f}ms by rate limiter)"
             step = OrchestrationStep(
                 step_type="llm_call",
-                description=f"Generated response using {response.model}",
+                description=description,
                 duration_ms=duration_ms,
                 metadata={
                     "model": response.model,
                     "usage": response.usage,
+                    "cached_tokens": cached_tokens,
                     "temperature": self.config.temperature,
-                    "max_tokens": self.config.max_tokens
+                    "max_tokens": self.config.max_tokens,
+                    "fallback_used": fallback_used,
+                    "response_cache_hit": getattr(response, "cached", False),
+                    "models_tried": attempts,
+                    **queue_metadata,
+                    **hedge_metadata
                 }
             ).to_dict()
             
@@ -350,7 +1056,10 @@ Context from knowledge base:
                 duration_ms=duration_ms,
                 metadata={
                     "model": model,
-                    "error": response.error
+                    "error": response.error,
+                    "models_tried": attempts,
+                    **queue_metadata,
+                    **hedge_metadata
                 }
             ).to_dict()
             
@@ -363,6 +1072,173 @@ Context from knowledge base:
                 "error": response.error
             }
     
+    def _run_llm_stream_tool(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str,
+        prompt_tokens: int,
+        counter: Any,
+        request_start: float
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Execute streamed LLM call tool.
+        
+        Yields {"type": "delta"} events as chunks arrive and returns the tool
+        result (use with `yield from`). A model that fails before its first
+        chunk is replaced by the next model of the fallback chain; once text
+        has reached the user there is no fallback. Time to first token is
+        recorded both from the request to the model (ttft_ms) and from the
+        arrival of the user message (ttft_total_ms, the wait the user sees).
+        
+        Args:
+            messages: List of message dicts for the LLM
+            model: Model identifier to use
+            prompt_tokens: Prompt size from the context_build step
+            counter: TokenCounter for the model
+            request_start: time.time() when the user message arrived
+            
+        Returns:
+            Dict with 'step', 'success', 'content', 'model', 'usage', and optionally 'error'
+        """
+        import re
+        import time
+        start_time = time.time()
+        
+        is_available = getattr(self.ai_client, "is_available", None)
+        # Clients with open_stream() report usage and finish reason of the stream
+        open_stream = getattr(self.ai_client, "open_stream", None)
+        attempts: List[Dict[str, Any]] = []
+        chunks: List[str] = []
+        stream = None
+        served_by = None
+        queue_wait_ms = 0.0  # Time spent queued by the client-side rate limiter
+        error = "All models unavailable (circuit breakers open)"
+        ttft_ms = None
+        ttft_total_ms = None
+        
+        for candidate in self._model_chain(model):
+            if is_available is not None and not is_available(candidate):
+                attempts.append({"model": candidate, "skipped": "circuit open"})
+                continue
+            
+            call_start = time.time()
+            stream = (open_stream or self.ai_client.stream_chat_completion)(
+                messages=messages,
+                model=candidate,
+                temperature=self.config.temperature,
+                max_tokens=self.config.max_tokens
+            )
+            error = None
+            try:
+                for chunk in stream:
+                    # Plain generators report failures as a single "Error: ..." chunk
+                    if open_stream is None and not chunks and chunk.startswith("Error: "):
+                        error = chunk[len("Error: "):]
+                        break
+                    if not chunks:
+                        now = time.time()
+                        # Time queued by the rate limiter is not the model's latency
+                        ttft_ms = (now - call_start) * 1000 - getattr(stream, "queue_wait_ms", 0.0)
+                        ttft_total_ms = (now - request_start) * 1000
+                        if self._latency_tracker is not None:
+                            self._latency_tracker.record(candidate, ttft_ms)
+                    chunks.append(chunk)
+                    yield {"type": "delta", "content": chunk}
+                if error is None:
+                    error = getattr(stream, "error", None)
+            finally:
+                stream.close()
+            
+            if error is None and not chunks:
+                error = "Empty response"
+            self._model_stats.record(
+                candidate, (time.time() - call_start) * 1000 - getattr(stream, "queue_wait_ms", 0.0), error is None
+            )
+            queue_wait_ms += getattr(stream, "queue_wait_ms", 0.0)
+            attempts.append({
+                "model": candidate,
+                "ttft_ms": round(ttft_ms, 1) if chunks else None,
+                "queue_wait_ms": round(getattr(stream, "queue_wait_ms", 0.0), 1),
+                "error": error
+            })
+            if error is None:
+                served_by = candidate
+                break
+            status = re.match(r"(\d{3}) - ", error)
+            if chunks or (status and int(status.group(1)) in NON_FALLBACK_STATUSES):
+                break
+            logger.warning(f"⚠️ {candidate} failed, trying next fallback model")
+        
+        duration_ms = (time.time() - start_time) * 1000
+        content = "".join(chunks)
+        
+        if served_by is None:
+            step = OrchestrationStep(
+                step_type="llm_stream",
+                description=f"LLM stream failed: {error}",
+                duration_ms=duration_ms,
+                metadata={
+                    "model": model,
+                    "error": error,
+                    "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+                    "queue_wait_ms": round(queue_wait_ms, 1),
+                    "models_tried": attempts
+                }
+            ).to_dict()
+            return {
+                "step": step,
+                "success": False,
+                "content": content,
+                "model": model,
+                "usage": {},
+                "error": error
+            }
+        
+        usage = getattr(stream, "usage", None)
+        if not usage:
+            # No usage frame in the stream: count completion tokens locally
+            completion_tokens = counter.count(content)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "estimated": True
+            }
+        finish_reason = getattr(stream, "finish_reason", None)
+        description = f"Streamed response using {served_by}, first token after {ttft_ms:.0f}ms"
+        if served_by != model:
+            description += f" (fallback from {model})"
+        if finish_reason == "length":
+            description += " (cut off at max_tokens)"
+        if queue_wait_ms >= 1:
+            description += f" (queued {queue_wait_ms:.0f}ms by rate limiter)"
+        step = OrchestrationStep(
+            step_type="llm_stream",
+            description=description,
+            duration_ms=duration_ms,
+            metadata={
+                "model": served_by,
+                "usage": usage,
+                "ttft_ms": round(ttft_ms, 1),
+                "ttft_total_ms": round(ttft_total_ms, 1),
+                "chunks": len(chunks),
+                "finish_reason": finish_reason,
+                "queue_wait_ms": round(queue_wait_ms, 1),
+                "temperature": self.config.temperature,
+                "max_tokens": self.config.max_tokens,
+                "fallback_used": served_by != model,
+                "models_tried": attempts
+            }
+        ).to_dict()
+        
+        return {
+            "step": step,
+            "success": True,
+            "content": content,
+            "model": served_by,
+            "usage": usage
+        }
+    
     def get_orchestrator_info(self) -> Dict[str, Any]:
         """
         Get information about the orchestrator configuration.
@@ -372,14 +1248,30 @@ Context from knowledge base:
         """
         return {
             "version": "1.0.0",
-            "capabilities": ["rag_search", "llm_call"],
+            "capabilities": ["answer_cache", "rag_search", "rerank", "compression", "route", "llm_call", "llm_stream"],
             "config": {
                 "default_model": self.config.default_model,
                 "temperature": self.config.temperature,
                 "max_tokens": self.config.max_tokens,
                 "top_k_results": self.config.top_k_results,
-                "min_relevance_score": self.config.min_relevance_score
+                "min_relevance_score": self.config.min_relevance_score,
+                "mmr_lambda": self.config.mmr_lambda,
+                "rerank_enabled": self.config.rerank_enabled,
+                "rerank_candidates": self.config.rerank_candidates,
+                "rerank_budget_ms": self.config.rerank_budget_ms,
+                "answer_cache_enabled": self.config.answer_cache_enabled,
+                "answer_cache_threshold": self.config.answer_cache_threshold
             },
+            "answer_cache": self._answer_cache.stats() if self._answer_cache else None,
+            "model_stats": self._model_stats.all(),
+            "rate_limiter": (
+                self.ai_client.rate_limiter.stats()
+                if getattr(self.ai_client, "rate_limiter", None) else None
+            ),
+            "response_cache": (
+                self.ai_client.response_cache.stats()
+                if getattr(self.ai_client, "response_cache", None) else None
+            ),
             "rag_stats": self.rag.get_stats() if self.rag else {}
         }
 
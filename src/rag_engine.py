@@ -7,10 +7,16 @@ Uses sentence-transformers + ChromaDB for high-quality retrieval
 import os
 import json
 import logging
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from typing import List, Dict, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import hashlib
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
 # Configure logging with rich if available
 try:
@@ -56,10 +62,16 @@ except ImportError:
     PyPDF2 = None
     logger.warning("⚠️ PyPDF2 not available, PDF support disabled")
 
+try:
+    import numpy as np
+    from .vector_index import FlatIndex, IVFPQIndex, QuantizedIndex, ShardedIndex, recall_at_k, shard_for, top_k_rows
+except ImportError:
+    np = None
+    logger.warning("⚠️ NumPy not available")
+
 try:
     from sklearn.feature_extraction.text import TfidfVectorizer
     from sklearn.metrics.pairwise import cosine_similarity
-    import numpy as np
     TFIDF_AVAILABLE = True
 except ImportError:
     TFIDF_AVAILABLE = False
@@ -77,6 +89,166 @@ class SearchResult:
     char_count: int
     document_id: str
     chunk_id: Optional[str] = None
+    embedding: Optional["np.ndarray"] = None  # Unit-norm chunk vector, when requested
+    start: Optional[int] = None  # Character span of the chunk in its document
+    end: Optional[int] = None
+
+
+@dataclass
+class RetrievalResult:
+    """
+    Results of an adaptive retrieval pass, with its cost
+    
+    Attributes:
+        results: Ranked results that passed the score threshold
+        rounds: Number of backend queries issued while widening the window
+        candidates_scanned: Total candidates returned by the backend over all rounds
+        exhausted: True when no further qualifying candidates can exist
+        context: Formatted context built from the results (retrieve_with_context only)
+    """
+    results: List[SearchResult]
+    rounds: int = 0
+    candidates_scanned: int = 0
+    exhausted: bool = False
+    context: str = ""
+
+
+@dataclass
+class PackedContext:
+    """
+    Context packed into a token budget
+    
+    Attributes:
+        context: Formatted context string
+        results: Results included, in context order (best first unless stable_order)
+        tokens: Tokens in the context string
+        budget_tokens: Budget the context was packed into
+        dropped: Results left out because they did not fit
+        truncated: True when the last included result was cut to fit
+    """
+    context: str
+    results: List[SearchResult]
+    tokens: int
+    budget_tokens: int
+    dropped: int = 0
+    truncated: bool = False
+
+
+# Context returned when retrieval finds nothing
+NO_CONTEXT_MESSAGE = "No relevant information found in the knowledge base."
+
+# Vector backends that keep their index inside the process
+IN_PROCESS_BACKENDS = ('memory', 'ivfpq', 'int8', 'binary')
+
+# In-process backends that store scalar- or sign-quantized codes
+QUANTIZED_BACKENDS = ('int8', 'binary')
+
+# Display names for search backends
+BACKEND_NAMES = {
+    'chroma': 'ChromaDB',
+    'memory': 'In-Memory',
+    'tfidf': 'TF-IDF'
+}
+
+# Filter fields accepted by search(), mapped to the chunk metadata keys they match
+FILTER_FIELDS = {
+    'file_type': 'type',
+    'type': 'type',
+    'document_id': 'doc_id',
+    'doc_id': 'doc_id',
+    'filename': 'filename'
+}
+
+
+def normalize_filters(filters: Optional[Dict]) -> Dict[str, List[str]]:
+    """
+    Normalize a search filter into {metadata_key: [allowed values]}
+    
+    Accepts SearchResult field names (file_type, document_id, filename) or the
+    raw metadata keys (type, doc_id). Values may be a string or a list of strings;
+    multiple values for one field are OR-ed, multiple fields are AND-ed.
+    
+    Raises:
+        ValueError: If a field is not filterable, has no values or a value of another type
+    """
+    if not filters:
+        return {}
+    
+    normalized: Dict[str, List[str]] = {}
+    for field_name, value in filters.items():
+        key = FILTER_FIELDS.get(field_name)
+        if key is None:
+            raise ValueError(f"Unsupported filter field: {field_name} (allowed: {', '.join(FILTER_FIELDS)})")
+        
+        if isinstance(value, str):
+            values = [value]
+        elif isinstance(value, (list, tuple)) and all(isinstance(v, str) for v in value):
+            values = list(value)
+        else:
+            raise ValueError(f"Filter field '{field_name}' must be a string or a list of strings")
+        if not values:
+            raise ValueError(f"Filter field '{field_name}' needs at least one value")
+        
+        if key == 'type':
+            values = [v.lstrip('.') for v in values]
+        normalized.setdefault(key, []).extend(values)
+    
+    return normalized
+
+
+def mmr_select(embeddings: "np.ndarray", relevance: "np.ndarray", k: int, lambda_mult: float = 0.7) -> List[int]:
+    """
+    Maximal Marginal Relevance selection over candidate embeddings
+    
+    Picks, one at a time, the candidate maximizing
+    lambda * relevance - (1 - lambda) * max similarity to already selected
+    candidates. The candidate similarity matrix is computed once with a
+    single matrix product; each step only updates a running max.
+    
+    Args:
+        embeddings: (n, d) unit-norm candidate vectors
+        relevance: (n,) query relevance of each candidate
+        k: Number of candidates to select
+        lambda_mult: 1.0 ranks purely by relevance, 0.0 purely by diversity
+        
+    Returns:
+        Indices of the selected candidates, in selection order
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    
+    similarity = embeddings @ embeddings.T
+    max_similarity = np.full(n, -np.inf)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+    
+    for _ in range(k):
+        redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        mmr = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    
+    return selected
+
+
+def load_embedding_model():
+    """Load the sentence-transformers embedding model, or None when unavailable"""
+    if not EMBEDDING_AVAILABLE:
+        return None
+    try:
+        logger.info("🔄 Loading embedding model...")
+        # Use a fast, multilingual model
+        model = SentenceTransformer('all-MiniLM-L6-v2')
+        logger.info("✅ Embedding model loaded: all-MiniLM-L6-v2")
+        return model
+    except Exception as e:
+        logger.error(f"❌ Failed to load embedding model: {e}")
+        return None
 
 
 class TextChunker:
@@ -149,53 +321,248 @@ class TextChunker:
         return chunks
 
 
+@dataclass
+class IndexSnapshot:
+    """
+    One version of the searchable index state
+    
+    A rebuild fills a new snapshot while searches keep reading the current
+    one; the engine then swaps its pointer and retires the old snapshot once
+    the searches still reading it have finished.
+    
+    Attributes:
+        version: Index version; names its ChromaDB collections and raw vector files
+        collection_name: Base collection name for this version
+        documents: Whole documents loaded from the knowledge directory
+        collections: ChromaDB collections, one per shard
+        collection: First shard collection
+        index: In-process vector index (flat, quantized, IVF-PQ or sharded)
+        index_recall: Measured recall@10 of an approximate in-process index
+        chunks: Chunk dicts, aligned with in-process index rows and TF-IDF rows
+        row_bitmaps: Per-field row bitmaps for filtered in-process search
+        vectorizer: TF-IDF vectorizer (fallback backend)
+        tfidf_matrix: TF-IDF chunk matrix (fallback backend)
+        doc_index: Document vectors for two-stage retrieval
+        doc_fields: Per-document filter fields aligned with doc_index rows
+        raw_files: Files owned by this version (memory-mapped full-precision
+            vectors, a saved IVF-PQ index), deleted when it is retired
+    """
+    version: int = 0
+    collection_name: str = ""
+    documents: List[Dict] = field(default_factory=list)
+    collections: List = field(default_factory=list)
+    collection: object = None
+    index: object = None
+    index_recall: Optional[float] = None
+    chunks: List[Dict] = field(default_factory=list)
+    row_bitmaps: Dict[str, Dict[str, "np.ndarray"]] = field(default_factory=dict)
+    vectorizer: object = None
+    tfidf_matrix: object = None
+    doc_index: object = None
+    doc_fields: Dict[str, "np.ndarray"] = field(default_factory=dict)
+    raw_files: List[str] = field(default_factory=list)
+    readers: int = field(default=0, repr=False)
+    retired: bool = field(default=False, repr=False)
+    _drained: threading.Condition = field(default_factory=threading.Condition, repr=False)
+    
+    def acquire(self) -> bool:
+        """Register a reader; False once the snapshot has been retired"""
+        with self._drained:
+            if self.retired:
+                return False
+            self.readers += 1
+            return True
+    
+    def release(self) -> None:
+        """Unregister a reader"""
+        with self._drained:
+            self.readers -= 1
+            self._drained.notify_all()
+    
+    def retire(self, timeout: Optional[float] = None) -> bool:
+        """Refuse new readers and wait for current ones; False on timeout"""
+        with self._drained:
+            self.retired = True
+            return self._drained.wait_for(lambda: self.readers == 0, timeout)
+
+
+class _SnapshotAttribute:
+    """Engine attribute stored on the index snapshot the calling thread works with"""
+    
+    def __init__(self, field_name: str):
+        self.field_name = field_name
+    
+    def __get__(self, engine, owner=None):
+        if engine is None:
+            return self
+        return getattr(engine._current_snapshot(), self.field_name)
+    
+    def __set__(self, engine, value) -> None:
+        setattr(engine._current_snapshot(), self.field_name, value)
+
+
 class RAGEngine:
     """
     Retrieval-Augmented Generation Engine
     Uses semantic embeddings for high-quality search
     """
     
+    # Seconds a retired index version waits for in-flight searches before cleanup
+    DRAIN_TIMEOUT_S = 300.0
+    
+    # Searchable state, kept per index version (see IndexSnapshot)
+    documents = _SnapshotAttribute('documents')
+    collections = _SnapshotAttribute('collections')
+    collection = _SnapshotAttribute('collection')
+    index = _SnapshotAttribute('index')
+    _index_recall = _SnapshotAttribute('index_recall')
+    _chunks = _SnapshotAttribute('chunks')
+    _row_bitmaps = _SnapshotAttribute('row_bitmaps')
+    vectorizer = _SnapshotAttribute('vectorizer')
+    tfidf_matrix = _SnapshotAttribute('tfidf_matrix')
+    _doc_index = _SnapshotAttribute('doc_index')
+    _doc_fields = _SnapshotAttribute('doc_fields')
+    
     def __init__(
         self, 
         knowledge_dir: str = ".cursor/knowledge", 
         db_path: str = "./chroma_db",
-        collection_name: str = "knowledge_base"
+        collection_name: str = "knowledge_base",
+        backend: str = "chroma",
+        num_shards: int = 1,
+        index_options: Optional[Dict] = None,
+        top_documents: int = 0,
+        embedding_model=None
     ):
         self.knowledge_dir = Path(knowledge_dir)
         self.db_path = db_path
         self.collection_name = collection_name
+        # Vector store: "chroma" (persistent), "memory" (in-process NumPy matrix)
+        # "ivfpq" (in-process compressed IVF-PQ index) or "int8"/"binary"
+        # (in-process quantized codes rescored with full-precision vectors)
+        self.backend = backend
+        # Chunks are partitioned across shards by document hash when > 1
+        self.num_shards = max(1, int(num_shards))
+        # Backend-specific index parameters (e.g. nlist, nprobe, m, rescore for IVF-PQ)
+        self.index_options = dict(index_options or {})
+        # Two-stage retrieval: pick this many documents first, then search only
+        # their chunks (0 = search all chunks directly)
+        self.top_documents = max(0, int(top_documents))
         
         self.chunker = TextChunker(chunk_size=1000, overlap=200)
-        self.documents: List[Dict] = []
         self._initialized = False
+        self._closed = False
         
-        # Initialize embedding model
-        self.embedding_model = None
-        if EMBEDDING_AVAILABLE:
-            try:
-                logger.info("🔄 Loading embedding model...")
-                # Use a fast, multilingual model
-                self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-                logger.info("✅ Embedding model loaded: all-MiniLM-L6-v2")
-            except Exception as e:
-                logger.error(f"❌ Failed to load embedding model: {e}")
+        # Searches read the snapshot behind self._snapshot; a rebuild fills a
+        # new one (pinned to the building thread) and swaps the pointer
+        self._local = threading.local()
+        self._rebuild_lock = threading.Lock()
+        self._snapshot = self._new_snapshot(self._read_active_version())
         
-        # Initialize ChromaDB
+        # Initialize embedding model (engines of several knowledge bases can share one)
+        self.embedding_model = embedding_model if embedding_model is not None else load_embedding_model()
+        
+        # Initialize ChromaDB (one collection per shard)
         self.chroma_client = None
-        self.collection = None
-        if CHROMA_AVAILABLE:
+        if CHROMA_AVAILABLE and self.backend == "chroma":
             try:
                 self.chroma_client = chromadb.PersistentClient(path=self.db_path)
                 logger.info(f"✅ ChromaDB initialized at {self.db_path}")
             except Exception as e:
                 logger.error(f"❌ Failed to initialize ChromaDB: {e}")
         
-        # Fallback to TF-IDF if needed
-        self.vectorizer = None
-        self.tfidf_matrix = None
+        # Scatter-gather pool for querying shard collections concurrently
+        self._shard_pool = None
+        if self.num_shards > 1 and self.chroma_client is not None:
+            self._shard_pool = ThreadPoolExecutor(max_workers=self.num_shards, thread_name_prefix="rag-shard")
         
         logger.info(f"📁 Knowledge directory: {self.knowledge_dir}")
     
+    @classmethod
+    def from_config(cls, config, **kwargs) -> "RAGEngine":
+        """Create an engine with the backend settings from an AppConfig"""
+        index_options = {}
+        if config.rag_backend == "ivfpq":
+            index_options = {
+                'nlist': config.ivf_nlist,
+                'nprobe': config.ivf_nprobe,
+                'm': config.pq_subquantizers,
+                'rescore': config.ivf_rescore
+            }
+        elif config.rag_backend in QUANTIZED_BACKENDS:
+            index_options = {'rescore': config.quantized_rescore}
+        return cls(
+            backend=config.rag_backend,
+            num_shards=config.rag_shards,
+            index_options=index_options,
+            top_documents=config.rag_top_documents,
+            **kwargs
+        )
+    
+    @property
+    def index_version(self) -> int:
+        """Version of the index currently serving searches"""
+        return self._snapshot.version
+    
+    def _new_snapshot(self, version: int) -> IndexSnapshot:
+        """Empty snapshot for an index version (version 0 keeps the unversioned names)"""
+        name = self.collection_name if version == 0 else f"{self.collection_name}_v{version}"
+        return IndexSnapshot(version=version, collection_name=name)
+    
+    def _current_snapshot(self) -> IndexSnapshot:
+        """Snapshot pinned to this thread (a search or a build in progress), else the live one"""
+        pinned = getattr(self._local, 'snapshot', None)
+        return pinned if pinned is not None else self._snapshot
+    
+    @contextmanager
+    def _pinned(self, snapshot: IndexSnapshot):
+        """Route this thread's reads and writes of engine index state to a snapshot"""
+        previous = getattr(self._local, 'snapshot', None)
+        self._local.snapshot = snapshot
+        try:
+            yield snapshot
+        finally:
+            self._local.snapshot = previous
+    
+    @contextmanager
+    def _reading(self):
+        """Pin the live snapshot for one search so a concurrent swap cannot change it midway"""
+        pinned = getattr(self._local, 'snapshot', None)
+        if pinned is not None:
+            yield pinned
+            return
+        
+        snapshot = self._snapshot
+        while not snapshot.acquire():
+            if self._closed:
+                raise RuntimeError("RAG engine is closed")
+            snapshot = self._snapshot  # Retired after we read the pointer: take the new one
+        try:
+            with self._pinned(snapshot):
+                yield snapshot
+        finally:
+            snapshot.release()
+    
+    def _version_path(self) -> Path:
+        """File recording the live index version for this collection"""
+        return Path(self.db_path) / f"{self.collection_name}.version"
+    
+    def _read_active_version(self) -> int:
+        """Index version to open at startup (0 when none was recorded)"""
+        try:
+            return int(self._version_path().read_text().strip())
+        except (OSError, ValueError):
+            return 0
+    
+    def _write_active_version(self, version: int) -> None:
+        """Atomically record the live index version so a restart reopens it"""
+        if not self.chroma_client and self.backend != "ivfpq":
+            return  # Only ChromaDB collections and saved IVF-PQ indexes outlive the process
+        path = self._version_path()
+        tmp_path = path.parent / f"{path.name}.tmp"
+        tmp_path.write_text(str(version))
+        os.replace(tmp_path, path)
+    
     def _hash_content(self, content: str) -> str:
         """Generate hash for content deduplication"""
         return hashlib.md5(content.encode()).hexdigest()[:12]
@@ -307,58 +674,80 @@ class RAGEngine:
         
         if self.chroma_client and self.embedding_model:
             # Use ChromaDB with embeddings
-            logger.info("🔄 Indexing with ChromaDB + embeddings...")
+            logger.info(f"🔄 Indexing with ChromaDB + embeddings ({self.num_shards} shard(s))...")
             
             try:
-                # Delete existing collection if it exists
-                try:
-                    self.chroma_client.delete_collection(self.collection_name)
-                except:
-                    pass
-                
-                # Create new collection
-                self.collection = self.chroma_client.create_collection(
-                    name=self.collection_name,
-                    metadata={"hnsw:space": "cosine"}
-                )
-                
-                # Prepare data for ChromaDB
-                ids = []
+                # Prepare data for ChromaDB, partitioned by document hash
+                shards = [{'ids': [], 'documents': [], 'metadatas': [], 'rows': []} for _ in range(self.num_shards)]
                 documents = []
-                metadatas = []
                 
                 for i, chunk in enumerate(chunks):
                     chunk_id = f"{chunk.get('doc_id', 'doc')}_{chunk.get('chunk_idx', i)}"
-                    ids.append(chunk_id)
-                    documents.append(chunk['text'])
-                    metadatas.append({
+                    shard = shards[shard_for(chunk.get('doc_id', ''), self.num_shards)]
+                    shard['ids'].append(chunk_id)
+                    shard['documents'].append(chunk['text'])
+                    shard['rows'].append(i)
+                    shard['metadatas'].append({
                         'filename': chunk.get('filename', 'unknown'),
                         'doc_id': chunk.get('doc_id', ''),
                         'chunk_idx': chunk.get('chunk_idx', i),
+                        'start': chunk.get('start', -1),
+                        'end': chunk.get('end', -1),
                         'char_count': chunk.get('char_count', 0),
                         'type': chunk.get('type', 'unknown')
                     })
+                    documents.append(chunk['text'])
                 
                 # Generate embeddings
                 logger.info(f"🧮 Generating embeddings for {len(documents)} chunks...")
                 embeddings = self.embedding_model.encode(documents, show_progress_bar=True)
                 
-                # Add to collection in batches
-                batch_size = 100
-                for i in range(0, len(ids), batch_size):
-                    end = min(i + batch_size, len(ids))
-                    self.collection.add(
-                        ids=ids[i:end],
-                        documents=documents[i:end],
-                        embeddings=embeddings[i:end].tolist(),
-                        metadatas=metadatas[i:end]
-                    )
+                # Build all shard collections in parallel (names resolved here,
+                # on the thread the snapshot being built is pinned to)
+                names = [self._shard_collection_name(shard) for shard in range(self.num_shards)]
+                with ThreadPoolExecutor(max_workers=self.num_shards) as pool:
+                    self.collections = list(pool.map(
+                        lambda args: self._build_collection(names[args[0]], args[1], embeddings),
+                        enumerate(shards)
+                    ))
+                self.collection = self.collections[0]
+                if self.top_documents:
+                    self._build_document_index(embeddings, chunks)
                 
-                logger.info(f"✅ Indexed {len(ids)} chunks in ChromaDB")
+                logger.info(f"✅ Indexed {len(documents)} chunks in ChromaDB")
                 return
                 
             except Exception as e:
                 logger.error(f"❌ ChromaDB indexing failed: {e}")
+                # Shard collections created before the failure would otherwise stay behind
+                self._delete_collections([self._shard_collection_name(shard) for shard in range(self.num_shards)])
+                self.collections = []
+                self.collection = None
+                logger.info("⚠️ Falling back to TF-IDF...")
+        
+        if self.backend in IN_PROCESS_BACKENDS and self.embedding_model:
+            # Use an in-process vector index with embeddings
+            logger.info(f"🔄 Indexing in memory ({self.backend}) + embeddings ({self.num_shards} shard(s))...")
+            
+            try:
+                logger.info(f"🧮 Generating embeddings for {len(chunks)} chunks...")
+                embeddings = self.embedding_model.encode(
+                    [c['text'] for c in chunks], show_progress_bar=True, normalize_embeddings=True
+                )
+                embeddings = np.asarray(embeddings, dtype=np.float32)
+                self.index = self._build_index(embeddings, chunks)
+                self._chunks = chunks  # Store for retrieval
+                self._build_row_bitmaps(chunks)
+                if self.top_documents:
+                    self._build_document_index(embeddings, chunks)
+                
+                logger.info(f"✅ Indexed {len(chunks)} chunks in memory ({self.index.nbytes / 1e6:.1f} MB)")
+                if self.backend != "memory":
+                    self._measure_index_recall(embeddings)
+                return
+                
+            except Exception as e:
+                logger.error(f"❌ In-memory indexing failed: {e}")
                 logger.info("⚠️ Falling back to TF-IDF...")
         
         # Fallback to TF-IDF
@@ -376,35 +765,431 @@ class RAGEngine:
             chunk_texts = [c['text'] for c in chunks]
             self.tfidf_matrix = self.vectorizer.fit_transform(chunk_texts)
             self._chunks = chunks  # Store for retrieval
+            self._build_row_bitmaps(chunks)
             
             logger.info(f"✅ TF-IDF matrix: {self.tfidf_matrix.shape}")
         else:
             logger.error("❌ No indexing method available!")
     
+    def _shard_collection_name(self, shard: int) -> str:
+        """ChromaDB collection name for a shard of the current index version"""
+        base = self._current_snapshot().collection_name
+        if self.num_shards == 1:
+            return base
+        return f"{base}_shard{shard}"
+    
+    def _build_collection(self, name: str, data: Dict, embeddings) -> object:
+        """(Re)create one shard collection and add its chunks in batches"""
+        # Delete existing collection if it exists
+        try:
+            self.chroma_client.delete_collection(name)
+        except:
+            pass
+        
+        # Create new collection
+        # The shard count is stored so a restart with another rag_shards rebuilds
+        collection = self.chroma_client.create_collection(
+            name=name,
+            metadata={"hnsw:space": "cosine", "num_shards": self.num_shards}
+        )
+        
+        # Add to collection in batches
+        batch_size = 100
+        rows = data['rows']
+        for i in range(0, len(rows), batch_size):
+            end = min(i + batch_size, len(rows))
+            collection.add(
+                ids=data['ids'][i:end],
+                documents=data['documents'][i:end],
+                embeddings=embeddings[rows[i:end]].tolist(),
+                metadatas=data['metadatas'][i:end]
+            )
+        return collection
+    
+    def _build_index(self, embeddings: "np.ndarray", chunks: List[Dict]):
+        """Build the in-process vector index, sharded by document hash when configured"""
+        factory = self._index_factory()
+        if self.num_shards == 1:
+            return factory(embeddings, None)
+        return ShardedIndex.build(
+            embeddings,
+            [c.get('doc_id', '') for c in chunks],
+            self.num_shards,
+            index_factory=factory
+        )
+    
+    def _index_factory(self):
+        """Callable building one index (or shard) from (vectors, global ids)"""
+        if self.backend not in ("ivfpq",) + QUANTIZED_BACKENDS:
+            return FlatIndex
+        
+        options = dict(self.index_options)
+        rescore = options.pop('rescore', 100)
+        raw_dir = Path(self.db_path)
+        if rescore:
+            raw_dir.mkdir(parents=True, exist_ok=True)
+        shard_numbers = itertools.count()
+        snapshot = self._current_snapshot()
+        
+        def build_compressed(vectors, ids):
+            # Full-precision vectors go to a memory-mapped file for exact rescoring
+            raw_path = None
+            if rescore:
+                raw_path = str(raw_dir / f"{snapshot.collection_name}_vectors_{next(shard_numbers)}.f32")
+                snapshot.raw_files.append(raw_path)
+            if self.backend in QUANTIZED_BACKENDS:
+                return QuantizedIndex(vectors, ids, mode=self.backend, rescore=rescore, raw_path=raw_path)
+            return IVFPQIndex(vectors, ids, rescore=rescore, raw_path=raw_path, **options)
+        
+        return build_compressed
+    
+    def _measure_index_recall(self, embeddings: "np.ndarray", sample_size: int = 200, k: int = 10) -> None:
+        """Measure recall@k of an approximate index against exact search on sampled chunks"""
+        rng = np.random.default_rng(0)
+        sample = embeddings[rng.choice(len(embeddings), min(sample_size, len(embeddings)), replace=False)]
+        self._index_recall = recall_at_k(self.index, FlatIndex(embeddings), sample, k)
+        compression = embeddings.nbytes / max(self.index.nbytes, 1)
+        logger.info(f"📏 {self.backend} index: recall@{k} = {self._index_recall:.3f}, "
+                    f"{compression:.1f}x smaller than float32")
+    
+    def _build_document_index(self, embeddings, metadatas: List[Dict]) -> None:
+        """
+        Build one vector per document as the normalized mean of its chunk vectors
+        
+        Args:
+            embeddings: (n, d) chunk vectors
+            metadatas: Chunk metadata (doc_id, type, filename) aligned with embeddings
+        """
+        if not len(metadatas):
+            self._doc_index = None
+            return
+        
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        doc_ids = np.array([str(m.get('doc_id', '')) for m in metadatas])
+        keys, first, inverse = np.unique(doc_ids, return_index=True, return_inverse=True)
+        
+        # Sum each document's chunk vectors: sort rows by document, reduce per run
+        order = np.argsort(inverse, kind='stable')
+        starts = np.searchsorted(inverse[order], np.arange(len(keys)))
+        sums = np.add.reduceat(embeddings[order], starts, axis=0)
+        self._doc_index = FlatIndex(sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12))
+        
+        self._doc_fields = {
+            key: np.array([str(metadatas[i].get(key, 'unknown' if key == 'type' else '')) for i in first])
+            for key in set(FILTER_FIELDS.values())
+        }
+        logger.info(f"📑 Document index: {len(keys)} documents for two-stage retrieval")
+    
+    def _load_document_index(self) -> None:
+        """Rebuild the document index from the chunk vectors stored in ChromaDB"""
+        embeddings = []
+        metadatas: List[Dict] = []
+        for collection in self.collections:
+            data = collection.get(include=['embeddings', 'metadatas'])
+            if len(data['embeddings']):
+                embeddings.append(np.asarray(data['embeddings'], dtype=np.float32))
+                metadatas.extend(data['metadatas'])
+        if embeddings:
+            self._build_document_index(np.vstack(embeddings), metadatas)
+    
+    def _build_row_bitmaps(self, chunks: List[Dict]) -> None:
+        """Precompute per-type, per-document and per-file row bitmaps over the chunk list"""
+        bitmaps: Dict[str, Dict[str, "np.ndarray"]] = {}
+        for key in set(FILTER_FIELDS.values()):
+            column = np.array([str(c.get(key, 'unknown' if key == 'type' else '')) for c in chunks])
+            bitmaps[key] = {value: column == value for value in np.unique(column)}
+        self._row_bitmaps = bitmaps
+    
+    def _filter_rows(self, filters: Dict[str, List[str]]):
+        """Row indices matching a normalized filter, or None when unfiltered"""
+        mask = self._filter_mask(filters)
+        return None if mask is None else np.flatnonzero(mask)
+    
+    def _filter_mask(self, filters: Dict[str, List[str]]):
+        """
+        Boolean row mask matching a normalized filter, or None when unfiltered
+        
+        Combines the precomputed bitmaps: OR within a field, AND across fields.
+        """
+        if not filters:
+            return None
+        
+        mask = np.ones(len(self._chunks), dtype=bool)
+        for key, values in filters.items():
+            field_mask = np.zeros(len(self._chunks), dtype=bool)
+            for value in values:
+                bitmap = self._row_bitmaps.get(key, {}).get(value)
+                if bitmap is not None:
+                    field_mask |= bitmap
+            mask &= field_mask
+        return mask
+    
+    @staticmethod
+    def _chroma_where(filters: Dict[str, List[str]]) -> Optional[Dict]:
+        """Translate a normalized filter into a ChromaDB where clause"""
+        if not filters:
+            return None
+        
+        clauses = [
+            {key: values[0]} if len(values) == 1 else {key: {'$in': values}}
+            for key, values in filters.items()
+        ]
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+    
     def initialize(self, force_rebuild: bool = False) -> None:
-        """Initialize the RAG engine"""
+        """
+        Initialize the RAG engine
+        
+        A forced rebuild of a serving engine builds a new index version next to
+        the live one, which keeps answering searches meanwhile. The new version
+        is swapped in only after it passes validation, and the old version is
+        deleted once the searches still reading it have finished.
+        
+        Raises:
+            RuntimeError: If a rebuilt index fails validation (the old one stays live)
+        """
         if self._initialized and not force_rebuild:
             logger.info("✅ RAG engine already initialized")
             return
         
-        # Check if ChromaDB collection exists
-        if self.chroma_client and not force_rebuild:
+        with self._rebuild_lock:
+            if self._initialized and not force_rebuild:
+                return  # Initialized by another thread while we waited
+            
+            # Check if ChromaDB collections exist for every shard
+            if self.chroma_client and not force_rebuild and self._load_existing_collections():
+                self._initialized = True
+                return
+            if self.backend == "ivfpq" and not force_rebuild and self._load_saved_index():
+                self._initialized = True
+                return
+            
+            current = self._snapshot
+            version = current.version + 1 if self._initialized else current.version
+            snapshot = self._new_snapshot(version)
+            
+            logger.info(f"🔄 Building new RAG index (v{version})...")
+            with self._pinned(snapshot):
+                try:
+                    self.load_documents()
+                except Exception:
+                    # Drop whatever the failed build created; the live version is untouched
+                    self._retire_snapshot(snapshot, drain=False)
+                    raise
+                problem = self._validate_snapshot() if self._initialized else None
+                if not problem and self.backend == "ivfpq" and self.index is not None:
+                    try:
+                        self._save_index()
+                    except Exception as e:
+                        logger.warning(f"⚠️ Could not save IVF-PQ index v{version}: {e}")
+            
+            if problem:
+                self._retire_snapshot(snapshot, drain=False)
+                raise RuntimeError(f"Rebuilt index v{version} failed validation ({problem}); "
+                                   f"still serving v{current.version}")
+            
+            # Atomic pointer swap: new searches read the new version from here on
+            self._snapshot = snapshot
+            self._write_active_version(version)
+            self._initialized = True
+        
+        if version != current.version:
+            threading.Thread(
+                target=self._retire_snapshot, args=(current,),
+                name=f"rag-retire-v{current.version}", daemon=True
+            ).start()
+            logger.info(f"🔀 Swapped to index v{version}; v{current.version} retires after in-flight searches")
+        logger.info("✅ RAG engine ready!")
+    
+    def _load_existing_collections(self) -> bool:
+        """Serve the persisted ChromaDB collections of the recorded version, if present"""
+        snapshot = self._new_snapshot(self._snapshot.version)
+        with self._pinned(snapshot):
             try:
-                self.collection = self.chroma_client.get_collection(self.collection_name)
-                count = self.collection.count()
+                self.collections = [
+                    self.chroma_client.get_collection(self._shard_collection_name(shard))
+                    for shard in range(self.num_shards)
+                ]
+                self.collection = self.collections[0]
+                built_shards = (self.collection.metadata or {}).get('num_shards', 1)
+                if built_shards != self.num_shards:
+                    # Chunks of the other shards would silently drop out of search
+                    logger.warning(f"⚠️ Index v{snapshot.version} was built with {built_shards} shard(s), "
+                                   f"{self.num_shards} configured: rebuilding")
+                    self._delete_stale_shards(built_shards)
+                    return False
+                count = sum(c.count() for c in self.collections)
                 if count > 0:
-                    logger.info(f"✅ Loaded existing ChromaDB collection ({count} chunks)")
+                    logger.info(f"✅ Loaded existing ChromaDB collection v{snapshot.version} "
+                                f"({count} chunks, {self.num_shards} shard(s))")
                     # Load document metadata
                     self._load_document_metadata()
-                    self._initialized = True
-                    return
+                    if self.top_documents:
+                        self._load_document_index()
+                    self._snapshot = snapshot
+                    return True
             except:
                 pass
+        return False
+    
+    def _index_manifest_path(self) -> Path:
+        """Manifest of the saved IVF-PQ index of the snapshot pinned to this thread"""
+        return Path(self.db_path) / f"{self._current_snapshot().collection_name}.ivfpq.json"
+    
+    def _saved_index_options(self) -> Dict:
+        """Build settings a saved IVF-PQ index must match to be reused (nprobe applies at query time)"""
+        options = {key: value for key, value in self.index_options.items() if key != 'nprobe'}
+        return {'num_shards': self.num_shards, **options}
+    
+    def _save_index(self) -> None:
+        """
+        Save the IVF-PQ index of the snapshot pinned to this thread
         
-        logger.info("🔄 Building new RAG index...")
-        self.load_documents()
-        self._initialized = True
-        logger.info("✅ RAG engine ready!")
+        Each shard's quantizers and codes go to an .npz file next to its
+        full-precision vector file; a JSON manifest with the build settings,
+        chunks and measured recall is written last, so a restart only finds
+        complete indexes.
+        """
+        snapshot = self._current_snapshot()
+        shards = self.index.shards if isinstance(self.index, ShardedIndex) else [self.index]
+        files = []
+        for number, shard in enumerate(shards):
+            path = Path(self.db_path) / f"{snapshot.collection_name}_ivfpq_{number}.npz"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            shard.save(str(path))
+            snapshot.raw_files.append(str(path))
+            files.append(path.name)
+            if shard.raw_path:
+                files.append(Path(shard.raw_path).name)
+        
+        manifest = {
+            'options': self._saved_index_options(),
+            'shards': [name for name in files if name.endswith('.npz')],
+            'files': files,
+            'index_recall': self._index_recall,
+            'chunks': self._chunks
+        }
+        path = self._index_manifest_path()
+        tmp_path = path.parent / f"{path.name}.tmp"
+        tmp_path.write_text(json.dumps(manifest))
+        os.replace(tmp_path, path)
+        snapshot.raw_files.append(str(path))
+        logger.info(f"💾 Saved IVF-PQ index v{snapshot.version} ({len(shards)} shard(s))")
+    
+    def _load_saved_index(self) -> bool:
+        """Serve the saved IVF-PQ index of the recorded version, if present and built with the current settings"""
+        snapshot = self._new_snapshot(self._snapshot.version)
+        with self._pinned(snapshot):
+            path = self._index_manifest_path()
+            try:
+                manifest = json.loads(path.read_text())
+            except (OSError, ValueError):
+                return False
+            
+            if manifest.get('options') != self._saved_index_options():
+                logger.warning(f"⚠️ Saved index v{snapshot.version} was built with other settings: rebuilding")
+                for name in manifest.get('files', []) + [path.name]:
+                    try:
+                        os.remove(path.parent / name)
+                    except OSError:
+                        pass
+                return False
+            try:
+                shards = [
+                    IVFPQIndex.load(str(path.parent / name), nprobe=self.index_options.get('nprobe'))
+                    for name in manifest['shards']
+                ]
+            except (OSError, KeyError, ValueError) as e:
+                logger.warning(f"⚠️ Could not load saved index v{snapshot.version}: {e}")
+                return False
+            
+            self.index = shards[0] if len(shards) == 1 else ShardedIndex(shards)
+            self._chunks = manifest['chunks']
+            self._index_recall = manifest.get('index_recall')
+            self._build_row_bitmaps(self._chunks)
+            self._load_document_metadata()
+            if self.top_documents:
+                self._build_document_index(self.index.reconstruct(np.arange(len(self._chunks))), self._chunks)
+            snapshot.raw_files.extend(str(path.parent / name) for name in manifest['files'])
+            snapshot.raw_files.append(str(path))
+            self._snapshot = snapshot
+        
+        logger.info(f"✅ Loaded saved IVF-PQ index v{snapshot.version} "
+                    f"({len(self._snapshot.chunks)} chunks, {len(shards)} shard(s))")
+        return True
+    
+    def _delete_stale_shards(self, built_shards: int) -> None:
+        """Delete shard collections of an older layout that a rebuild will not overwrite"""
+        base = self._current_snapshot().collection_name
+        built = [base] if built_shards == 1 else [f"{base}_shard{shard}" for shard in range(built_shards)]
+        current = {self._shard_collection_name(shard) for shard in range(self.num_shards)}
+        self._delete_collections([name for name in built if name not in current])
+    
+    def _delete_collections(self, names: List[str]) -> None:
+        """Delete ChromaDB collections by name, skipping ones that do not exist"""
+        if not self.chroma_client:
+            return
+        # Older ChromaDB versions list names, newer ones collection objects
+        existing = {getattr(collection, 'name', collection) for collection in self.chroma_client.list_collections()}
+        for name in names:
+            if name not in existing:
+                continue
+            try:
+                self.chroma_client.delete_collection(name)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not delete collection {name}: {e}")
+    
+    def _validate_snapshot(self) -> Optional[str]:
+        """Why the snapshot pinned to this thread cannot serve searches, or None if it can"""
+        if not self.documents:
+            return "no documents loaded"
+        backends = self._backends()
+        if not backends:
+            return "no search backend was built"
+        
+        # Smoke query: a document's own opening text must find at least one chunk
+        backend = backends[0]
+        try:
+            probe = self._encode_queries([self.documents[0]['content'][:500]], backend)
+            if not self._query_candidates(probe, 1, {}, backend)[0]:
+                return f"{BACKEND_NAMES[backend]} smoke query returned nothing"
+        except Exception as e:
+            return f"{BACKEND_NAMES[backend]} smoke query failed: {e}"
+        return None
+    
+    def _retire_snapshot(self, snapshot: IndexSnapshot, drain: bool = True) -> None:
+        """Wait for a replaced snapshot's searches to finish, then delete its collections and files"""
+        if drain and not snapshot.retire(self.DRAIN_TIMEOUT_S):
+            logger.warning(f"⚠️ Index v{snapshot.version} still has {snapshot.readers} search(es) "
+                           f"after {self.DRAIN_TIMEOUT_S:.0f}s, removing it anyway")
+        
+        self._delete_collections([collection.name for collection in snapshot.collections])
+        for raw_path in snapshot.raw_files:
+            try:
+                os.remove(raw_path)
+            except OSError as e:
+                logger.warning(f"⚠️ Could not delete {raw_path}: {e}")
+        if isinstance(snapshot.index, ShardedIndex):
+            snapshot.index.close()
+        logger.info(f"🗑️ Removed index v{snapshot.version}")
+    
+    def close(self) -> None:
+        """
+        Release the engine's thread pools once in-flight searches have finished
+        
+        The persisted index is kept; searches started after close() raise
+        RuntimeError.
+        """
+        with self._rebuild_lock:
+            self._closed = True
+            snapshot = self._snapshot
+        if not snapshot.retire(self.DRAIN_TIMEOUT_S):
+            logger.warning(f"⚠️ Closing RAG engine with {snapshot.readers} search(es) still running")
+        if isinstance(snapshot.index, ShardedIndex):
+            snapshot.index.close()
+        if self._shard_pool is not None:
+            self._shard_pool.shutdown(wait=False)
     
     def _load_document_metadata(self) -> None:
         """Load document metadata from files"""
@@ -433,7 +1218,311 @@ class RAGEngine:
                     'char_count': len(text)
                 })
     
-    def search(self, query: str, top_k: int = 5, min_score: float = 0.1) -> List[SearchResult]:
+    def _make_result(
+        self, text: str, metadata: Dict, score: float, chunk_id: Optional[str], embedding=None
+    ) -> SearchResult:
+        """Build a SearchResult from chunk text and its metadata"""
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32).ravel()
+            norm = np.linalg.norm(embedding)
+            if norm > 0:
+                embedding = embedding / norm
+        # Collections built before offsets were stored have none (-1)
+        start = metadata.get('start', -1)
+        end = metadata.get('end', -1)
+        return SearchResult(
+            filename=metadata.get('filename', 'unknown'),
+            content_preview=text[:500] + "..." if len(text) > 500 else text,
+            full_content=text,
+            relevance_score=float(score),
+            file_type=metadata.get('type', 'unknown'),
+            char_count=metadata.get('char_count', len(text)),
+            document_id=metadata.get('doc_id', ''),
+            chunk_id=chunk_id,
+            embedding=embedding,
+            start=start if start >= 0 else None,
+            end=end if end >= 0 else None
+        )
+    
+    def _backends(self) -> List[str]:
+        """Backends able to serve searches, in order of preference"""
+        backends = []
+        if self.collections and self.embedding_model:
+            backends.append('chroma')
+        if self.index is not None and self.embedding_model:
+            backends.append('memory')
+        if self.vectorizer and self.tfidf_matrix is not None:
+            backends.append('tfidf')
+        return backends
+    
+    def embed_query(self, query: str):
+        """Unit-norm embedding of a query, or None without an embedding model"""
+        if self.embedding_model is None:
+            return None
+        return np.asarray(self.embedding_model.encode([query], normalize_embeddings=True)[0], dtype=np.float32)
+    
+    def _encode_queries(self, queries: List[str], backend: str):
+        """Encode all queries for a backend in one batched pass"""
+        if backend == 'tfidf':
+            return self.vectorizer.transform(queries)
+        return self.embedding_model.encode(queries, batch_size=64, normalize_embeddings=True)
+    
+    def _query_candidates(
+        self, 
+        query_vectors, 
+        n: int, 
+        filters: Dict[str, List[str]], 
+        backend: str, 
+        include_embeddings: bool = False
+    ) -> List[List[SearchResult]]:
+        """Top-n candidates per encoded query, best first, without score filtering"""
+        if backend != 'tfidf' and self.top_documents and self._doc_index is not None:
+            return self._query_by_document(query_vectors, n, filters, backend, include_embeddings)
+        return self._query_chunks(query_vectors, n, filters, backend, include_embeddings)
+    
+    def _select_documents(self, query_vectors, n: int, filters: Dict[str, List[str]]) -> List[Dict[str, List[str]]]:
+        """
+        Stage one of two-stage retrieval: the best documents for each query
+        
+        At least n documents are kept, since n chunks may come from n distinct
+        documents. The metadata filter is applied at document level (all
+        filter fields are per-document), and each query gets the filter
+        narrowed to its chosen documents.
+        """
+        mask = None
+        if filters:
+            mask = np.ones(len(self._doc_index), dtype=bool)
+            for key, values in filters.items():
+                mask &= np.isin(self._doc_fields[key], values)
+        
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        _, rows = self._doc_index.search(queries, max(self.top_documents, n), mask)
+        doc_ids = self._doc_fields['doc_id']
+        return [{**filters, 'doc_id': doc_ids[row].tolist()} for row in rows]
+    
+    def _query_by_document(
+        self, 
+        query_vectors, 
+        n: int, 
+        filters: Dict[str, List[str]], 
+        backend: str, 
+        include_embeddings: bool = False
+    ) -> List[List[SearchResult]]:
+        """
+        Stage two of two-stage retrieval: exact search over the chunks of each query's documents
+        
+        The chunks of every document selected for the batch are fetched once
+        and scored against all queries with one matrix product; each query
+        then ranks only the chunks of its own documents. Scoring the few
+        selected chunks exactly also avoids approximate indexes (IVF-PQ)
+        missing them when they fall outside the probed lists.
+        """
+        doc_filters = self._select_documents(query_vectors, n, filters)
+        wanted = sorted({doc_id for doc_filter in doc_filters for doc_id in doc_filter['doc_id']})
+        if not wanted:
+            return [[] for _ in doc_filters]
+        
+        texts, metadatas, chunk_ids, vectors = self._document_chunks(wanted, backend)
+        if not texts:
+            return [[] for _ in doc_filters]
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        
+        scores = np.asarray(query_vectors, dtype=np.float32) @ vectors.T
+        chunk_docs = np.array([str(m.get('doc_id', '')) for m in metadatas])
+        for q, doc_filter in enumerate(doc_filters):
+            scores[q, ~np.isin(chunk_docs, doc_filter['doc_id'])] = -np.inf
+        top = top_k_rows(scores, n)
+        
+        batches = []
+        for q, row in enumerate(top):
+            candidates = []
+            for j in row:
+                if not np.isfinite(scores[q, j]):
+                    break  # The query's documents have fewer than n chunks
+                embedding = vectors[j] if include_embeddings else None
+                candidates.append(self._make_result(texts[j], metadatas[j], scores[q, j], chunk_ids[j], embedding))
+            batches.append(candidates)
+        return batches
+    
+    def _document_chunks(self, doc_ids: List[str], backend: str):
+        """
+        Text, metadata, chunk id and stored vector of every chunk of some documents
+        
+        Returns:
+            (texts, metadatas, chunk_ids, (n, d) float32 vectors)
+        """
+        if backend == 'memory':
+            rows = np.flatnonzero(self._filter_mask({'doc_id': doc_ids}))
+            chunks = [self._chunks[int(row)] for row in rows]
+            return (
+                [chunk['text'] for chunk in chunks],
+                chunks,
+                [f"{chunk.get('doc_id', '')}_{chunk.get('chunk_idx', row)}" for chunk, row in zip(chunks, rows)],
+                np.asarray(self.index.reconstruct(rows), dtype=np.float32)
+            )
+        
+        # Each document lives in one shard collection: only ask the shards that own one
+        texts, metadatas, chunk_ids, vectors = [], [], [], []
+        owners = {shard_for(doc_id, len(self.collections)) for doc_id in doc_ids}
+        for shard in sorted(owners):
+            data = self.collections[shard].get(
+                where=self._chroma_where({'doc_id': doc_ids}),
+                include=['documents', 'metadatas', 'embeddings']
+            )
+            if not len(data['ids']):
+                continue
+            texts.extend(data['documents'])
+            metadatas.extend(data['metadatas'])
+            chunk_ids.extend(data['ids'])
+            vectors.append(np.asarray(data['embeddings'], dtype=np.float32))
+        return texts, metadatas, chunk_ids, np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+    
+    def _query_chunks(
+        self, 
+        query_vectors, 
+        n: int, 
+        filters: Dict[str, List[str]], 
+        backend: str, 
+        include_embeddings: bool = False
+    ) -> List[List[SearchResult]]:
+        """Top-n chunks per encoded query from the backend's chunk index"""
+        if backend == 'tfidf':
+            return self._query_tfidf(query_vectors, n, filters, include_embeddings)
+        if backend == 'memory':
+            return self._query_memory(query_vectors, n, filters, include_embeddings)
+        if len(self.collections) > 1:
+            return self._query_chroma_shards(query_vectors, n, filters, include_embeddings)
+        return self._query_chroma(self.collections[0], query_vectors, n, filters, include_embeddings)
+    
+    def _query_chroma(
+        self, collection, query_embeddings, n: int, filters: Dict[str, List[str]], include_embeddings: bool = False
+    ) -> List[List[SearchResult]]:
+        """Run one batched ChromaDB query for all query embeddings"""
+        include = ['documents', 'metadatas', 'distances']
+        if include_embeddings:
+            include.append('embeddings')
+        
+        search_results = collection.query(
+            query_embeddings=[e.tolist() for e in query_embeddings],
+            n_results=n,
+            where=self._chroma_where(filters),
+            include=include
+        )
+        
+        batches = []
+        for q in range(len(query_embeddings)):
+            candidates = []
+            documents = search_results['documents'][q] if search_results and search_results['documents'] else []
+            for i, doc in enumerate(documents):
+                metadata = search_results['metadatas'][q][i]
+                # Convert distance to similarity score (cosine distance -> similarity)
+                score = 1 - search_results['distances'][q][i]
+                chunk_id = search_results['ids'][q][i] if search_results['ids'] else None
+                embedding = search_results['embeddings'][q][i] if include_embeddings else None
+                candidates.append(self._make_result(doc, metadata, score, chunk_id, embedding))
+            batches.append(candidates)
+        return batches
+    
+    def _query_chroma_shards(
+        self, query_embeddings, n: int, filters: Dict[str, List[str]], include_embeddings: bool = False
+    ) -> List[List[SearchResult]]:
+        """Scatter the query batch to all shard collections and heap-merge their top-n lists"""
+        futures = [
+            self._shard_pool.submit(self._query_chroma, collection, query_embeddings, n, filters, include_embeddings)
+            for collection in self.collections
+        ]
+        shard_batches = [future.result() for future in futures]
+        
+        return [
+            list(islice(heapq.merge(*(batches[q] for batches in shard_batches),
+                                    key=lambda r: -r.relevance_score), n))
+            for q in range(len(query_embeddings))
+        ]
+    
+    def _query_memory(
+        self, query_embeddings, n: int, filters: Dict[str, List[str]], include_embeddings: bool = False
+    ) -> List[List[SearchResult]]:
+        """Search the in-process (optionally sharded) vector index"""
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        scores, ids = self.index.search(queries, n, self._filter_mask(filters))
+        
+        batches = []
+        for q in range(len(queries)):
+            embeddings = self.index.reconstruct(ids[q]) if include_embeddings and ids.shape[1] else None
+            candidates = []
+            for j, idx in enumerate(ids[q]):
+                if idx < 0:
+                    break  # Padding: the approximate index found fewer than n candidates
+                chunk = self._chunks[int(idx)]
+                chunk_id = f"{chunk.get('doc_id', '')}_{chunk.get('chunk_idx', idx)}"
+                embedding = embeddings[j] if embeddings is not None else None
+                candidates.append(self._make_result(chunk['text'], chunk, scores[q, j], chunk_id, embedding))
+            batches.append(candidates)
+        return batches
+    
+    def _query_tfidf(
+        self, query_vectors, n: int, filters: Dict[str, List[str]], include_embeddings: bool = False
+    ) -> List[List[SearchResult]]:
+        """
+        Score all queries against the TF-IDF matrix with one matrix-matrix product
+        
+        With a filter, only the rows selected by the precomputed bitmaps are scored.
+        """
+        rows = self._filter_rows(filters)
+        matrix = self.tfidf_matrix if rows is None else self.tfidf_matrix[rows]
+        if matrix.shape[0] == 0:
+            return [[] for _ in range(query_vectors.shape[0])]
+        
+        similarities = cosine_similarity(query_vectors, matrix)
+        top_indices = top_k_rows(similarities, n)
+        
+        batches = []
+        for q, row in enumerate(top_indices):
+            candidates = []
+            for pos in row:
+                idx = int(pos if rows is None else rows[pos])
+                chunk = self._chunks[idx]
+                chunk_id = f"{chunk.get('doc_id', '')}_{chunk.get('chunk_idx', idx)}"
+                embedding = matrix[pos].toarray() if include_embeddings else None
+                candidates.append(self._make_result(chunk['text'], chunk, similarities[q, pos], chunk_id, embedding))
+            batches.append(candidates)
+        return batches
+    
+    def _search_batch(
+        self, queries: List[str], top_k: int, min_score: float, filters: Optional[Dict] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Run queries through the active backend and apply the score threshold
+        
+        Returns one ranked result list per query, in input order.
+        """
+        if not self._initialized:
+            self.initialize()
+        
+        filters = normalize_filters(filters)
+        
+        if not queries:
+            return []
+        
+        with self._reading():
+            # Try ChromaDB first, then fall back to TF-IDF
+            for backend in self._backends():
+                try:
+                    query_vectors = self._encode_queries(queries, backend)
+                    batches = self._query_candidates(query_vectors, top_k, filters, backend)
+                    return [[r for r in batch if r.relevance_score >= min_score] for batch in batches]
+                except Exception as e:
+                    logger.error(f"❌ {BACKEND_NAMES[backend]} search failed: {e}")
+            
+            return [[] for _ in queries]
+    
+    def search(
+        self, 
+        query: str, 
+        top_k: int = 5, 
+        min_score: float = 0.1, 
+        filters: Optional[Dict] = None
+    ) -> List[SearchResult]:
         """
         Search for relevant chunks using semantic search
         
@@ -441,155 +1530,506 @@ class RAGEngine:
             query: Search query
             top_k: Maximum number of results
             min_score: Minimum relevance score
+            filters: Optional metadata filter, e.g. {"file_type": "pdf"} or
+                {"document_id": ["a1b2", "c3d4"]}; pushed down to the backend
             
         Returns:
             List of SearchResult objects
         """
+        results = self._search_batch([query], top_k, min_score, filters)[0]
+        logger.info(f"🔍 Search '{query[:40]}...' → {len(results)} results ({self._backend_name()})")
+        return results
+    
+    def search_many(
+        self, 
+        queries: List[str], 
+        top_k: int = 5, 
+        min_score: float = 0.1, 
+        filters: Optional[Dict] = None
+    ) -> List[List[SearchResult]]:
+        """
+        Search for many queries in a single pass
+        
+        All queries are encoded in one batched forward pass and scored with
+        one backend query, which is far cheaper than calling search() in a loop.
+        
+        Args:
+            queries: Search queries
+            top_k: Maximum number of results per query
+            min_score: Minimum relevance score
+            filters: Optional metadata filter applied to every query
+            
+        Returns:
+            One list of SearchResult objects per query, in input order
+        """
+        batches = self._search_batch(list(queries), top_k, min_score, filters)
+        logger.info(f"🔍 Batch search of {len(batches)} queries → "
+                    f"{sum(len(b) for b in batches)} results ({self._backend_name()})")
+        return batches
+    
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 5,
+        min_score: float = 0.1,
+        filters: Optional[Dict] = None,
+        distinct_documents: bool = False,
+        overfetch: int = 2,
+        max_candidates: int = 1000,
+        include_embeddings: bool = False,
+        query_embedding: Optional["np.ndarray"] = None
+    ) -> RetrievalResult:
+        """
+        Adaptive retrieval that widens the candidate window until top_k results qualify
+        
+        The query is encoded once. Each round asks the backend for a window of
+        candidates (starting at top_k * overfetch and doubling), drops those below
+        min_score and, if requested, repeated documents. The loop stops as soon as
+        top_k results qualify, or when the backend returns fewer candidates than
+        asked for or the lowest candidate in the window scores below min_score,
+        since candidates arrive best first and nothing further down can qualify.
+        
+        Args:
+            query: Search query
+            top_k: Number of qualifying results wanted
+            min_score: Minimum relevance score
+            filters: Optional metadata filter (see search())
+            distinct_documents: Keep only the best chunk of each document
+            overfetch: Initial window size as a multiple of top_k
+            max_candidates: Upper bound on the window size
+            include_embeddings: Attach unit-norm chunk vectors to the results
+            query_embedding: The query's embedding from embed_query(), if the caller
+                already has it; vector backends then skip encoding the query
+            
+        Returns:
+            RetrievalResult with the ranked results and the rounds/candidates spent
+        """
         if not self._initialized:
             self.initialize()
         
-        results = []
+        filters = normalize_filters(filters)
         
-        # Try ChromaDB first
-        if self.collection and self.embedding_model:
-            try:
-                # Generate query embedding
-                query_embedding = self.embedding_model.encode([query])[0]
-                
-                # Search ChromaDB
-                search_results = self.collection.query(
-                    query_embeddings=[query_embedding.tolist()],
-                    n_results=top_k,
-                    include=['documents', 'metadatas', 'distances']
-                )
-                
-                if search_results and search_results['documents']:
-                    for i, doc in enumerate(search_results['documents'][0]):
-                        metadata = search_results['metadatas'][0][i]
-                        distance = search_results['distances'][0][i]
+        with self._reading():
+            for backend in self._backends():
+                try:
+                    if query_embedding is not None and backend != 'tfidf':
+                        query_vectors = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+                    else:
+                        query_vectors = self._encode_queries([query], backend)
+                    window = max(top_k * overfetch, top_k, 1)
+                    rounds = 0
+                    scanned = 0
+                    exhausted = False
+                    
+                    while True:
+                        candidates = self._query_candidates(
+                            query_vectors, window, filters, backend, include_embeddings
+                        )[0]
+                        rounds += 1
+                        scanned += len(candidates)
                         
-                        # Convert distance to similarity score (cosine distance -> similarity)
-                        score = 1 - distance
+                        results = []
+                        seen_docs = set()
+                        for candidate in candidates:
+                            if candidate.relevance_score < min_score:
+                                break
+                            doc_key = f"{candidate.filename}_{candidate.document_id}"
+                            if distinct_documents and doc_key in seen_docs:
+                                continue
+                            seen_docs.add(doc_key)
+                            results.append(candidate)
                         
-                        if score >= min_score:
-                            results.append(SearchResult(
-                                filename=metadata.get('filename', 'unknown'),
-                                content_preview=doc[:500] + "..." if len(doc) > 500 else doc,
-                                full_content=doc,
-                                relevance_score=float(score),
-                                file_type=metadata.get('type', 'unknown'),
-                                char_count=metadata.get('char_count', len(doc)),
-                                document_id=metadata.get('doc_id', ''),
-                                chunk_id=search_results['ids'][0][i] if search_results['ids'] else None
-                            ))
-                
-                logger.info(f"🔍 Search '{query[:40]}...' → {len(results)} results (ChromaDB)")
-                return results
-                
-            except Exception as e:
-                logger.error(f"❌ ChromaDB search failed: {e}")
-        
-        # Fallback to TF-IDF
-        if self.vectorizer and self.tfidf_matrix is not None:
-            try:
-                query_vector = self.vectorizer.transform([query])
-                similarities = cosine_similarity(query_vector, self.tfidf_matrix)[0]
-                
-                top_indices = np.argsort(similarities)[-top_k:][::-1]
-                
-                for idx in top_indices:
-                    score = float(similarities[idx])
-                    if score >= min_score:
-                        chunk = self._chunks[idx]
-                        content = chunk['text']
-                        
-                        results.append(SearchResult(
-                            filename=chunk.get('filename', 'unknown'),
-                            content_preview=content[:500] + "..." if len(content) > 500 else content,
-                            full_content=content,
-                            relevance_score=score,
-                            file_type=chunk.get('type', 'unknown'),
-                            char_count=chunk.get('char_count', len(content)),
-                            document_id=chunk.get('doc_id', ''),
-                            chunk_id=f"{chunk.get('doc_id', '')}_{chunk.get('chunk_idx', idx)}"
-                        ))
-                
-                logger.info(f"🔍 Search '{query[:40]}...' → {len(results)} results (TF-IDF)")
+                        if len(results) >= top_k:
+                            break
+                        if len(candidates) < window or (candidates and candidates[-1].relevance_score < min_score):
+                            exhausted = True
+                            break
+                        if window >= max_candidates:
+                            break
+                        window = min(window * 2, max_candidates)
+                    
+                    logger.info(f"🔍 Retrieve '{query[:40]}...' → {min(len(results), top_k)} results "
+                                f"in {rounds} round(s), {scanned} candidates ({BACKEND_NAMES[backend]})")
+                    return RetrievalResult(
+                        results=results[:top_k],
+                        rounds=rounds,
+                        candidates_scanned=scanned,
+                        exhausted=exhausted
+                    )
                 
-            except Exception as e:
-                logger.error(f"❌ TF-IDF search failed: {e}")
-        
-        return results
+                except Exception as e:
+                    logger.error(f"❌ {BACKEND_NAMES[backend]} retrieval failed: {e}")
+            
+            return RetrievalResult(results=[], exhausted=True)
+    
+    def _backend_name(self) -> str:
+        """Name of the backend currently serving searches"""
+        backends = self._backends()
+        return BACKEND_NAMES[backends[0]] if backends else "none"
     
-    def get_context_for_query(self, query: str, top_k: int = 5, max_context_chars: int = 8000) -> str:
+    def build_context(self, results: List[SearchResult], max_context_chars: int = 8000) -> str:
         """
-        Get formatted context string for AI model
+        Format already-retrieved results into a context string for the AI model
         
         Args:
-            query: Search query
-            top_k: Number of chunks to include
+            results: Ranked search results
             max_context_chars: Maximum total context length
             
         Returns:
             Formatted context string
         """
-        results = self.search(query, top_k=top_k)
-        
         if not results:
-            return "No relevant information found in the knowledge base."
+            return NO_CONTEXT_MESSAGE
         
+        results = self.merge_adjacent_chunks(results)
         context_parts = []
         total_chars = 0
-        seen_docs = set()
+        seen_chunks = set()
         
         for i, result in enumerate(results, 1):
             available = max_context_chars - total_chars
             if available <= 0:
                 break
             
-            # Deduplicate by document
-            doc_key = f"{result.filename}_{result.document_id}"
-            if doc_key in seen_docs:
+            # Skip exact repeats of a chunk
+            chunk_key = result.chunk_id or f"{result.document_id}_{self._hash_content(result.full_content)}"
+            if chunk_key in seen_chunks:
                 continue
-            seen_docs.add(doc_key)
+            seen_chunks.add(chunk_key)
             
-            content = result.full_content[:available]
-            part = f"""
-📄 Source {i}: {result.filename} (relevance: {result.relevance_score:.2%})
-{content}
-"""
+            part = self._format_source(i, result, result.full_content[:available])
             context_parts.append(part)
             total_chars += len(part)
         
         return "\n".join(context_parts)
     
+    def merge_adjacent_chunks(self, results: List[SearchResult]) -> List[SearchResult]:
+        """
+        Merge overlapping or adjacent chunks of the same document into one passage
+        
+        Chunks overlap by the chunker's overlap, so neighbouring hits of one
+        document would otherwise repeat that text in the prompt. Chunks are
+        grouped by document and sorted by offset; each run of touching spans
+        becomes one result carrying its best score, placed at the rank of
+        its best chunk. Results without offsets are passed through.
+        
+        Args:
+            results: Ranked search results
+            
+        Returns:
+            Ranked results with touching chunks merged
+        """
+        spans: Dict[str, List[int]] = {}
+        for i, result in enumerate(results):
+            if result.start is not None and result.end is not None:
+                spans.setdefault(f"{result.filename}_{result.document_id}", []).append(i)
+        
+        # Rank position -> merged result; positions of absorbed chunks map to None
+        replaced: Dict[int, Optional[SearchResult]] = {}
+        for positions in spans.values():
+            if len(positions) < 2:
+                continue
+            positions.sort(key=lambda i: (results[i].start, results[i].end))
+            run = [positions[0]]
+            for i in positions[1:] + [None]:
+                if i is not None and results[i].start <= max(results[j].end for j in run):
+                    run.append(i)
+                    continue
+                if len(run) > 1:
+                    best = min(run)
+                    replaced.update({j: None for j in run})
+                    replaced[best] = self._merge_run([results[j] for j in run], results[best])
+                if i is not None:
+                    run = [i]
+        
+        if not replaced:
+            return results
+        merged = []
+        for i, result in enumerate(results):
+            if i not in replaced:
+                merged.append(result)
+            elif replaced[i] is not None:
+                merged.append(replaced[i])
+        return merged
+    
+    @staticmethod
+    def _merge_run(run: List[SearchResult], best: SearchResult) -> SearchResult:
+        """One result spanning a run of touching chunks, sorted by offset"""
+        text = run[0].full_content
+        end = run[0].end
+        for chunk in run[1:]:
+            if chunk.end <= end:
+                continue  # Contained in the text so far
+            # Chunk text is stripped, so find the overlap by matching rather than
+            # by offsets: the longest prefix of this chunk that ends the text so far
+            overlap = min(end - chunk.start, len(text), len(chunk.full_content))
+            while overlap > 0 and not text.endswith(chunk.full_content[:overlap]):
+                overlap -= 1
+            text += (chunk.full_content[overlap:] if overlap > 0 else "\n" + chunk.full_content)
+            end = chunk.end
+        
+        return SearchResult(
+            filename=best.filename,
+            content_preview=text[:500] + "..." if len(text) > 500 else text,
+            full_content=text,
+            relevance_score=best.relevance_score,
+            file_type=best.file_type,
+            char_count=len(text),
+            document_id=best.document_id,
+            chunk_id=f"{run[0].chunk_id}..{run[-1].chunk_id}",
+            embedding=best.embedding,
+            start=run[0].start,
+            end=end
+        )
+    
+    @staticmethod
+    def _format_source(number: int, result: SearchResult, content: str, show_score: bool = True) -> str:
+        """One numbered source block of the context string"""
+        if not show_score:
+            return f"""
+📄 Source {number}: {result.filename}
+{content}
+"""
+        return f"""
+📄 Source {number}: {result.filename} (relevance: {result.relevance_score:.2%})
+{content}
+"""
+    
+    def pack_context(
+        self, 
+        results: List[SearchResult], 
+        budget_tokens: int, 
+        token_counter, 
+        min_truncated_tokens: int = 64,
+        stable_order: bool = False
+    ) -> PackedContext:
+        """
+        Greedily fill a token budget with results, highest score first
+        
+        Touching chunks of a document are merged first (see
+        merge_adjacent_chunks). Results that do not fit are skipped so
+        smaller, lower-ranked ones can still use the remaining room; the
+        first one that does not fit is cut to the remaining budget instead
+        when at least min_truncated_tokens of its content would survive.
+        
+        With stable_order the included sources are written in document order
+        without their per-query scores, so the same set of chunks always gives
+        the same context text (a reusable prefix for provider prompt caches).
+        
+        Args:
+            results: Ranked search results
+            budget_tokens: Maximum context tokens
+            token_counter: TokenCounter for the target model
+            min_truncated_tokens: Smallest useful truncated chunk
+            stable_order: Deterministic, score-free layout
+            
+        Returns:
+            PackedContext with the context string and what went into it
+        """
+        parts: List[str] = []
+        contents: List[str] = []
+        included: List[SearchResult] = []
+        used = 0
+        show_score = not stable_order
+        dropped = 0
+        truncated = False
+        seen_chunks = set()
+        
+        results = self.merge_adjacent_chunks(results)
+        for result in sorted(results, key=lambda r: r.relevance_score, reverse=True):
+            # Skip exact repeats of a chunk
+            chunk_key = result.chunk_id or f"{result.document_id}_{self._hash_content(result.full_content)}"
+            if chunk_key in seen_chunks:
+                continue
+            seen_chunks.add(chunk_key)
+            
+            part = self._format_source(len(parts) + 1, result, result.full_content, show_score)
+            # +1 for the newline joining the parts
+            tokens = token_counter.count(part) + 1
+            if used + tokens <= budget_tokens:
+                parts.append(part)
+                contents.append(result.full_content)
+                included.append(result)
+                used += tokens
+                continue
+            
+            header_tokens = token_counter.count(self._format_source(len(parts) + 1, result, "", show_score)) + 1
+            room = budget_tokens - used - header_tokens
+            if not truncated and room >= min_truncated_tokens:
+                content = token_counter.truncate(result.full_content, room)
+                part = self._format_source(len(parts) + 1, result, content, show_score)
+                parts.append(part)
+                contents.append(content)
+                included.append(result)
+                used += token_counter.count(part) + 1
+                truncated = True
+            else:
+                dropped += 1
+        
+        if stable_order and parts:
+            order = sorted(range(len(included)), key=lambda i: (
+                included[i].filename, included[i].document_id,
+                included[i].start if included[i].start is not None else -1, included[i].chunk_id or ""
+            ))
+            included = [included[i] for i in order]
+            parts = [self._format_source(n, included[n - 1], contents[i], show_score) for n, i in enumerate(order, 1)]
+        
+        context = "\n".join(parts) if parts else NO_CONTEXT_MESSAGE
+        return PackedContext(
+            context=context,
+            results=included,
+            tokens=token_counter.count(context),
+            budget_tokens=budget_tokens,
+            dropped=dropped,
+            truncated=truncated
+        )
+    
+    def retrieve_with_context(
+        self,
+        query: str,
+        top_k: int = 5,
+        min_score: float = 0.1,
+        max_context_chars: int = 8000,
+        filters: Optional[Dict] = None,
+        mmr_lambda: Optional[float] = 0.7,
+        mmr_candidates: int = 4,
+        query_embedding: Optional["np.ndarray"] = None
+    ) -> RetrievalResult:
+        """
+        Retrieve ranked results and their packed context from a single search
+        
+        With mmr_lambda set, a pool of top_k * mmr_candidates chunks is retrieved
+        and top_k of them are chosen by Maximal Marginal Relevance, so several
+        strong chunks of one document can be kept while near-duplicates are
+        dropped. With mmr_lambda=None, the best chunk of each document is kept.
+        
+        Args:
+            query: Search query
+            top_k: Number of chunks to include
+            min_score: Minimum relevance score
+            max_context_chars: Maximum total context length
+            filters: Optional metadata filter (see search())
+            mmr_lambda: Relevance/diversity trade-off (1.0 = relevance only), or None
+            mmr_candidates: Candidate pool size as a multiple of top_k
+            query_embedding: The query's embedding from embed_query(), if already computed
+            
+        Returns:
+            RetrievalResult with both results and context filled in
+        """
+        if mmr_lambda is None:
+            retrieval = self.retrieve(
+                query, top_k=top_k, min_score=min_score, filters=filters, distinct_documents=True,
+                query_embedding=query_embedding
+            )
+        else:
+            retrieval = self.retrieve(
+                query, top_k=top_k * mmr_candidates, min_score=min_score, filters=filters,
+                overfetch=1, include_embeddings=True, query_embedding=query_embedding
+            )
+            retrieval.results = self._select_mmr(retrieval.results, top_k, mmr_lambda)
+        
+        retrieval.context = self.build_context(retrieval.results, max_context_chars)
+        return retrieval
+    
+    def _select_mmr(self, candidates: List[SearchResult], top_k: int, mmr_lambda: float) -> List[SearchResult]:
+        """Pick top_k candidates by MMR, falling back to rank order without embeddings"""
+        if len(candidates) <= 1 or any(c.embedding is None for c in candidates):
+            return candidates[:top_k]
+        
+        embeddings = np.vstack([c.embedding for c in candidates])
+        relevance = np.array([c.relevance_score for c in candidates], dtype=np.float32)
+        return [candidates[i] for i in mmr_select(embeddings, relevance, top_k, mmr_lambda)]
+    
+    def get_context_for_query(
+        self, 
+        query: str, 
+        top_k: int = 5, 
+        max_context_chars: int = 8000, 
+        filters: Optional[Dict] = None,
+        mmr_lambda: Optional[float] = 0.7,
+        max_context_tokens: Optional[int] = None,
+        model: str = ""
+    ) -> str:
+        """
+        Get formatted context string for AI model
+        
+        Args:
+            query: Search query
+            top_k: Number of chunks to include
+            max_context_chars: Maximum total context length
+            filters: Optional metadata filter (see search())
+            mmr_lambda: MMR relevance/diversity trade-off, or None for one chunk per document
+            max_context_tokens: Token budget; when set, replaces max_context_chars
+            model: Target model, selecting the tokenizer for max_context_tokens
+            
+        Returns:
+            Formatted context string
+        """
+        retrieval = self.retrieve_with_context(
+            query, top_k=top_k, max_context_chars=max_context_chars, filters=filters,
+            mmr_lambda=mmr_lambda
+        )
+        if max_context_tokens is None:
+            return retrieval.context
+        
+        from .tokens import TokenCounter
+        return self.pack_context(retrieval.results, max_context_tokens, TokenCounter(model)).context
+    
     def get_stats(self) -> Dict:
         """Get knowledge base statistics"""
         if not self._initialized:
             self.initialize()
         
-        file_types = {}
-        for doc in self.documents:
-            ft = doc.get('type', 'unknown').upper()
-            file_types[ft] = file_types.get(ft, 0) + 1
+        with self._reading() as snapshot:
+            file_types = {}
+            for doc in self.documents:
+                ft = doc.get('type', 'unknown').upper()
+                file_types[ft] = file_types.get(ft, 0) + 1
+            
+            chunk_count = 0
+            if self.collections:
+                try:
+                    chunk_count = sum(c.count() for c in self.collections)
+                except:
+                    pass
+            elif self._chunks:
+                chunk_count = len(self._chunks)
+            
+            return {
+                'total_documents': len(self.documents),
+                'total_characters': sum(doc.get('char_count', 0) for doc in self.documents),
+                'total_chunks': chunk_count,
+                'file_types': file_types,
+                'embedding_model': 'all-MiniLM-L6-v2' if self.embedding_model else 'TF-IDF',
+                'storage': 'ChromaDB' if self.collections else 'In-Memory',
+                'shards': self.num_shards,
+                'index': self.index.kind if self.index is not None else None,
+                'index_bytes': self.index.nbytes if self.index is not None else None,
+                'index_recall_at_10': round(self._index_recall, 3) if self._index_recall is not None else None,
+                'top_documents': self.top_documents or None,
+                'index_version': snapshot.version
+            }
+    
+    def memory_bytes(self) -> int:
+        """
+        Rough resident size of the live index that closing the engine frees
         
-        chunk_count = 0
-        if self.collection:
-            try:
-                chunk_count = self.collection.count()
-            except:
-                pass
-        elif hasattr(self, '_chunks'):
-            chunk_count = len(self._chunks)
-        
-        return {
-            'total_documents': len(self.documents),
-            'total_characters': sum(doc.get('char_count', 0) for doc in self.documents),
-            'total_chunks': chunk_count,
-            'file_types': file_types,
-            'embedding_model': 'all-MiniLM-L6-v2' if self.embedding_model else 'TF-IDF',
-            'storage': 'ChromaDB' if self.collection else 'In-Memory'
-        }
+        Counts document and chunk text, in-process vector indexes and the
+        TF-IDF matrix. ChromaDB collections are not counted: the
+        PersistentClient caches its segments per database path, shared by
+        every engine on that path, so they stay loaded after this engine is
+        closed.
+        """
+        with self._reading():
+            total = sum(doc.get('char_count', 0) for doc in self.documents)
+            total += sum(len(chunk.get('text', '')) for chunk in self._chunks)
+            for index in (self.index, self._doc_index):
+                if index is not None:
+                    total += index.nbytes
+            if self.tfidf_matrix is not None:
+                matrix = self.tfidf_matrix
+                total += matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+        return total
     
     def list_files(self) -> List[Dict]:
         """List all indexed files"""
@@ -607,23 +2047,17 @@ class RAGEngine:
         ]
 
 
-# Global singleton instance
-_engine_instance: Optional[RAGEngine] = None
-
-def get_rag_engine() -> RAGEngine:
-    """Get or create the global RAG engine instance"""
-    global _engine_instance
-    if _engine_instance is None:
-        _engine_instance = RAGEngine()
-        _engine_instance.initialize()
-    return _engine_instance
+def get_rag_engine(kb_id: Optional[str] = None) -> RAGEngine:
+    """Get the engine of a knowledge base (the default one when kb_id is None)"""
+    from .kb_registry import DEFAULT_KB_ID, get_engine_registry
+    return get_engine_registry().get(kb_id or DEFAULT_KB_ID)
 
-def search_knowledge(query: str, top_k: int = 5) -> List[SearchResult]:
+def search_knowledge(query: str, top_k: int = 5, filters: Optional[Dict] = None) -> List[SearchResult]:
     """Convenience function for searching"""
     engine = get_rag_engine()
-    return engine.search(query, top_k=top_k)
+    return engine.search(query, top_k=top_k, filters=filters)
 
-def get_context(query: str, top_k: int = 5) -> str:
+def get_context(query: str, top_k: int = 5, filters: Optional[Dict] = None) -> str:
     """Convenience function for getting AI context"""
     engine = get_rag_engine()
-    return engine.get_context_for_query(query, top_k=top_k)
+    return engine.get_context_for_query(query, top_k=top_k, filters=filters)
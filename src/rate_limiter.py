@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+🚦 Rate Limiter - Client-side token buckets shared across threads and processes
+Keeps request/s and token/min budgets per API key and per model in SQLite,
+so every Flask worker and Streamlit session on the machine draws from the
+same buckets, and queues callers first-come first-served instead of letting
+them run into 429s
+"""
+
+import time
+import random
+import sqlite3
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ticket_buckets (
+    ticket INTEGER NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ticket_buckets_name ON ticket_buckets (name, ticket);
+"""
+
+# A waiting ticket not refreshed for this long belongs to a dead process
+TICKET_TTL_S = 5.0
+
+# Upper bound on one sleep while queued, so tickets stay fresh
+MAX_POLL_S = 0.25
+
+
+def reserved_tokens(messages: List[Dict], model: str, max_tokens: int) -> int:
+    """Tokens a request may use at most: its prompt plus max_tokens"""
+    from .tokens import TokenCounter
+    return TokenCounter(model).count_messages(messages) + max_tokens
+
+
+class RateLimitTimeout(Exception):
+    """The request waited longer than max_wait_s for its turn"""
+
+    def __init__(self, message: str, wait_ms: float):
+        super().__init__(message)
+        self.wait_ms = wait_ms
+
+
+@dataclass
+class Bucket:
+    """
+    One token bucket.
+
+    Attributes:
+        name: Storage key
+        capacity: Largest burst (a full bucket)
+        rate: Tokens added per second
+    """
+    name: str
+    capacity: float
+    rate: float
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter backed by a SQLite file.
+
+    Each request needs 1 token from the request buckets and its estimated
+    token count from the token buckets, both for the API key and for the
+    model. Bucket levels live in the database and are refilled lazily from
+    the time of their last update, so any number of processes share them.
+    Waiting requests take a ticket; a ticket may only draw from its buckets
+    when no older live ticket shares one of them, which serves requests in
+    arrival order across processes (a large request at the head of the
+    queue is not starved by small ones behind it). Tickets of crashed
+    processes expire after TICKET_TTL_S.
+
+    A limit of 0 disables that bucket.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        api_key: str = "",
+        requests_per_s: float = 5.0,
+        tokens_per_min: float = 200000.0,
+        model_requests_per_s: float = 2.0,
+        model_tokens_per_min: float = 100000.0,
+        max_wait_s: float = 60.0
+    ):
+        """
+        Args:
+            path: SQLite database file shared by all processes (created if missing)
+            api_key: API key the key-level buckets belong to (only a hash is stored)
+            requests_per_s: Requests per second per API key
+            tokens_per_min: Tokens per minute per API key
+            model_requests_per_s: Requests per second per model
+            model_tokens_per_min: Tokens per minute per model
+            max_wait_s: Longest time a request waits in the queue
+        """
+        self.path = Path(path).expanduser()
+        self.key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+        self.requests_per_s = requests_per_s
+        self.tokens_per_min = tokens_per_min
+        self.model_requests_per_s = model_requests_per_s
+        self.model_tokens_per_min = model_tokens_per_min
+        self.max_wait_s = max_wait_s
+        self.waits = 0
+        self.total_wait_ms = 0.0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, config) -> "RateLimiter":
+        """Limiter with the rate_limit_* settings and API key of an AppConfig"""
+        return cls(
+            config.rate_limit_path,
+            api_key=config.openrouter_api_key,
+            requests_per_s=config.rate_limit_rps,
+            tokens_per_min=config.rate_limit_tpm,
+            model_requests_per_s=config.rate_limit_model_rps,
+            model_tokens_per_min=config.rate_limit_model_tpm,
+            max_wait_s=config.rate_limit_max_wait_s
+        )
+
+    def _buckets(self, model: str, tokens: int) -> List[Tuple[Bucket, float]]:
+        """(bucket, tokens needed) pairs a request draws from; a need is capped at the capacity"""
+        limits = [
+            (f"key:{self.key_id}:rps", self.requests_per_s, 1.0, 1.0),
+            (f"key:{self.key_id}:tpm", self.tokens_per_min, 60.0, tokens),
+            (f"model:{self.key_id}:{model}:rps", self.model_requests_per_s, 1.0, 1.0),
+            (f"model:{self.key_id}:{model}:tpm", self.model_tokens_per_min, 60.0, tokens)
+        ]
+        needs = []
+        for name, limit, period_s, need in limits:
+            if limit <= 0 or need <= 0:
+                continue
+            capacity = max(1.0, float(limit)) if period_s == 1.0 else float(limit)
+            needs.append((Bucket(name, capacity, limit / period_s), min(float(need), capacity)))
+        return needs
+
+    def acquire(self, model: str, tokens: int = 0) -> float:
+        """
+        Wait for this request's turn and take its tokens
+
+        Args:
+            model: Model the request goes to
+            tokens: Estimated prompt + completion tokens (0 for a retry already counted)
+
+        Returns:
+            Milliseconds spent waiting
+
+        Raises:
+            RateLimitTimeout: After max_wait_s without getting through
+        """
+        needs = self._buckets(model, tokens)
+        if not needs:
+            return 0.0
+        start = time.monotonic()
+        ticket = None
+        try:
+            while True:
+                wait_s, ticket = self._try_take(needs, ticket)
+                if wait_s <= 0:
+                    break
+                if time.monotonic() - start >= self.max_wait_s:
+                    raise RateLimitTimeout(
+                        f"Rate limit queue wait exceeded {self.max_wait_s:g}s for {model}",
+                        (time.monotonic() - start) * 1000
+                    )
+                # Small jitter keeps queued processes from polling in lockstep
+                time.sleep(min(wait_s, MAX_POLL_S) * random.uniform(0.9, 1.1))
+        finally:
+            if ticket is not None:
+                self._drop_ticket(ticket)
+
+        wait_ms = (time.monotonic() - start) * 1000
+        if ticket is not None:
+            with self._lock:
+                self.waits += 1
+                self.total_wait_ms += wait_ms
+        return wait_ms
+
+    def acquire_or_skip(self, model: str, tokens: int = 0) -> Optional[float]:
+        """
+        acquire(), failing open when the shared store is unusable
+
+        Returns:
+            Milliseconds spent waiting, or None when the store failed and
+            nothing was taken (the request goes out without limiting)
+
+        Raises:
+            RateLimitTimeout: After max_wait_s without getting through
+        """
+        try:
+            return self.acquire(model, tokens)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Rate limiter store failed, sending without limiting: {e}")
+            return None
+
+    def _try_take(self, needs: List[Tuple[Bucket, float]], ticket: Optional[int]) -> Tuple[float, Optional[int]]:
+        """
+        One attempt, in a single write transaction
+
+        Returns:
+            (seconds to wait before the next attempt, 0 when the tokens were taken; ticket id)
+        """
+        names = [bucket.name for bucket, _ in needs]
+        marks = ",".join("?" * len(names))
+        with self._lock:
+            now = time.time()
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "DELETE FROM ticket_buckets WHERE ticket IN (SELECT id FROM tickets WHERE expires_at < ?)", (now,)
+                )
+                conn.execute("DELETE FROM tickets WHERE expires_at < ?", (now,))
+                if ticket is not None:
+                    updated = conn.execute(
+                        "UPDATE tickets SET expires_at = ? WHERE id = ?", (now + TICKET_TTL_S, ticket)
+                    ).rowcount
+                    if not updated:
+                        # Expired while we slept (e.g. a long GC pause): queue again
+                        ticket = None
+
+                # Someone queued earlier on one of our buckets goes first
+                if ticket is None:
+                    ahead = conn.execute(
+                        f"SELECT 1 FROM ticket_buckets WHERE name IN ({marks}) LIMIT 1", names
+                    ).fetchone()
+                else:
+                    ahead = conn.execute(
+                        f"SELECT 1 FROM ticket_buckets WHERE name IN ({marks}) AND ticket < ? LIMIT 1",
+                        names + [ticket]
+                    ).fetchone()
+
+                wait_s = 0.0
+                levels: Dict[str, float] = {}
+                if ahead is None:
+                    for bucket, need in needs:
+                        row = conn.execute(
+                            "SELECT tokens, updated_at FROM buckets WHERE name = ?", (bucket.name,)
+                        ).fetchone()
+                        level = bucket.capacity if row is None else min(
+                            bucket.capacity, row[0] + max(0.0, now - row[1]) * bucket.rate
+                        )
+                        levels[bucket.name] = level
+                        if level < need:
+                            wait_s = max(wait_s, (need - level) / bucket.rate)
+                else:
+                    wait_s = 0.02
+
+                if ahead is None and wait_s <= 0:
+                    for bucket, need in needs:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                            (bucket.name, levels[bucket.name] - need, now)
+                        )
+                elif ticket is None:
+                    ticket = conn.execute(
+                        "INSERT INTO tickets (expires_at) VALUES (?)", (now + TICKET_TTL_S,)
+                    ).lastrowid
+                    conn.executemany(
+                        "INSERT INTO ticket_buckets (ticket, name) VALUES (?, ?)", [(ticket, n) for n in names]
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return wait_s, ticket
+
+    def _drop_ticket(self, ticket: int) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM ticket_buckets WHERE ticket = ?", (ticket,))
+                self._conn.execute("DELETE FROM tickets WHERE id = ?", (ticket,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def refund(self, model: str, tokens: int) -> None:
+        """Return reserved tokens a request did not use (estimate minus actual usage)"""
+        needs = [(bucket, need) for bucket, need in self._buckets(model, tokens) if bucket.name.endswith(":tpm")]
+        if not needs:
+            return
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for bucket, amount in needs:
+                    row = self._conn.execute(
+                        "SELECT tokens, updated_at FROM buckets WHERE name = ?", (bucket.name,)
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    level = min(bucket.capacity, row[0] + max(0.0, now - row[1]) * bucket.rate + amount)
+                    self._conn.execute(
+                        "UPDATE buckets SET tokens = ?, updated_at = ? WHERE name = ?", (level, now, bucket.name)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def settle(self, model: str, reserved: int, usage: Optional[Dict]) -> None:
+        """Refund the part of a finished request's reservation its usage shows it did not need"""
+        if not usage:
+            return
+        used = usage.get("total_tokens") or usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        self.release(model, reserved - used)
+
+    def release(self, model: str, tokens: int) -> None:
+        """Refund reserved tokens, logging instead of raising (e.g. a whole unanswered reservation)"""
+        if tokens <= 0:
+            return
+        try:
+            self.refund(model, tokens)
+        except Exception as e:
+            logger.warning(f"⚠️ Rate limiter refund failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        """Limits and how often / how long requests of this process waited"""
+        with self._lock:
+            queued = self._conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+            return {
+                "requests_per_s": self.requests_per_s,
+                "tokens_per_min": self.tokens_per_min,
+                "model_requests_per_s": self.model_requests_per_s,
+                "model_tokens_per_min": self.model_tokens_per_min,
+                "queued": queued,
+                "waits": self.waits,
+                "total_wait_ms": round(self.total_wait_ms, 1)
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
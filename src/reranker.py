@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+🎯 Reranker - Cross-encoder second-stage ranking
+Rescores (query, chunk) pairs from first-stage retrieval within a time budget
+"""
+
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CROSS_ENCODER_AVAILABLE = False
+
+try:
+    from sentence_transformers import CrossEncoder
+    CROSS_ENCODER_AVAILABLE = True
+except ImportError:
+    logger.warning("⚠️ sentence-transformers not available, reranking disabled")
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+@dataclass
+class RerankResult:
+    """
+    Outcome of a rerank pass.
+
+    Attributes:
+        results: Results in final order, truncated to top_k
+        scores: Cross-encoder score per returned result (None when not reranked)
+        reranked: False when the first-stage order was kept
+        timed_out: True when the time budget ran out before all pairs were scored
+        scored_pairs: Pairs sent to the cross-encoder
+        cache_hits: Pairs answered from the score cache
+    """
+    results: List
+    scores: List[Optional[float]] = field(default_factory=list)
+    reranked: bool = True
+    timed_out: bool = False
+    scored_pairs: int = 0
+    cache_hits: int = 0
+
+
+class CrossEncoderReranker:
+    """
+    Batched cross-encoder reranker with an LRU score cache.
+
+    Pairs are scored in batches; before each batch the elapsed time is checked
+    against the budget, and if it is exceeded the first-stage order is returned
+    unchanged so a slow rerank never delays the answer by more than one batch.
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_RERANK_MODEL,
+        batch_size: int = 16,
+        cache_size: int = 4096
+    ):
+        if not CROSS_ENCODER_AVAILABLE:
+            raise RuntimeError("sentence-transformers is required for reranking")
+
+        logger.info(f"🔄 Loading cross-encoder {model_name}...")
+        self.model = CrossEncoder(model_name)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        logger.info(f"✅ Cross-encoder loaded: {model_name}")
+
+    @staticmethod
+    def _pair_key(query: str, result) -> Tuple[str, str]:
+        """Cache key for a (query, chunk) pair"""
+        chunk_key = result.chunk_id or hashlib.md5(result.full_content.encode()).hexdigest()
+        return query, chunk_key
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[float]:
+        score = self._cache.get(key)
+        if score is not None:
+            self._cache.move_to_end(key)
+        return score
+
+    def _cache_put(self, key: Tuple[str, str], score: float) -> None:
+        self._cache[key] = score
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def rerank(
+        self,
+        query: str,
+        results: List,
+        top_k: int,
+        budget_ms: Optional[float] = None
+    ) -> RerankResult:
+        """
+        Rerank first-stage results with the cross-encoder
+
+        Args:
+            query: The user query
+            results: First-stage SearchResult candidates, best first
+            top_k: Number of results to keep
+            budget_ms: Time budget; when exceeded the first-stage order is kept
+
+        Returns:
+            RerankResult with the best top_k results
+        """
+        start_time = time.perf_counter()
+
+        scores: List[Optional[float]] = []
+        pending: List[int] = []
+        cache_hits = 0
+        for i, result in enumerate(results):
+            cached = self._cache_get(self._pair_key(query, result))
+            scores.append(cached)
+            if cached is None:
+                pending.append(i)
+            else:
+                cache_hits += 1
+
+        scored_pairs = 0
+        for offset in range(0, len(pending), self.batch_size):
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            if budget_ms is not None and elapsed_ms > budget_ms:
+                logger.warning(f"⏱️ Rerank budget of {budget_ms:.0f}ms exceeded, keeping first-stage order")
+                return RerankResult(
+                    results=results[:top_k],
+                    reranked=False,
+                    timed_out=True,
+                    scored_pairs=scored_pairs,
+                    cache_hits=cache_hits
+                )
+
+            batch = pending[offset:offset + self.batch_size]
+            batch_scores = self.model.predict(
+                [(query, results[i].full_content) for i in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            for i, score in zip(batch, batch_scores):
+                scores[i] = float(score)
+                self._cache_put(self._pair_key(query, results[i]), float(score))
+            scored_pairs += len(batch)
+
+        order = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return RerankResult(
+            results=[results[i] for i in order],
+            scores=[scores[i] for i in order],
+            scored_pairs=scored_pairs,
+            cache_hits=cache_hits
+        )
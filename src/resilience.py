@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+🛡️ Resilience - Retry backoff and per-model circuit breakers for LLM calls
+Retries transient failures (429, 5xx, timeouts) with jittered exponential
+backoff within a deadline, and stops calling a model that keeps failing
+"""
+
+import time
+import random
+import logging
+import threading
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: request timeout, conflict, rate limit, server errors
+RETRYABLE_STATUSES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How often and how long to retry one model.
+
+    Attributes:
+        max_attempts: Attempts per call, including the first
+        base_delay_s: Backoff before the second attempt
+        max_delay_s: Upper bound on one backoff
+        deadline_s: Total time budget for all attempts and waits of one call
+    """
+    max_attempts: int = 3
+    base_delay_s: float = 0.5
+    max_delay_s: float = 8.0
+    deadline_s: float = 30.0
+
+    @classmethod
+    def from_config(cls, config) -> "RetryPolicy":
+        """Policy from the llm_* settings of an AppConfig"""
+        return cls(max_attempts=config.llm_max_retries + 1, deadline_s=config.llm_retry_deadline_s)
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Wait before the next attempt ("full jitter" exponential backoff)
+
+        A Retry-After from the server is honoured as a lower bound.
+
+        Args:
+            attempt: Number of the attempt that just failed (1-based)
+            retry_after: Seconds requested by the server, if any
+        """
+        delay = random.uniform(0, min(self.max_delay_s, self.base_delay_s * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one model.
+
+    Closed: calls pass. After failure_threshold consecutive failures the
+    breaker opens and calls are refused for reset_timeout_s; then one trial
+    call is let through (half-open). Its success closes the breaker, its
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = self.CLOSED
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout_s:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims the single trial call when half-open)"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout_s or self._trial_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def release_trial(self) -> None:
+        """Give back a half-open trial claimed by allow() whose call never went out"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._state = self.CLOSED
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"⚠️ Circuit opened after {self.failures} consecutive failures")
+                self._state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class RetryBudget:
+    """
+    Retry bookkeeping for one call: attempts, deadline and the model's breaker.
+
+    The client performs the requests; this decides whether an attempt may
+    go out, how the outcome counts towards the breaker, and how long to
+    wait before the next attempt or whether to give up.
+    """
+
+    def __init__(self, policy: RetryPolicy, breaker: CircuitBreaker):
+        self.policy = policy
+        self.breaker = breaker
+        self.attempt = 0
+        self.deadline = time.monotonic() + policy.deadline_s
+
+    def start_attempt(self) -> bool:
+        """Whether another attempt may go out (False while the breaker refuses calls)"""
+        if not self.breaker.allow():
+            return False
+        self.attempt += 1
+        return True
+
+    def abandon_attempt(self) -> None:
+        """Undo start_attempt() for an attempt that was never sent (e.g. refused by the rate limiter)"""
+        self.attempt -= 1
+        self.breaker.release_trial()
+
+    def extend(self, wait_ms: float) -> None:
+        """Move the deadline by time spent queued, which does not count against it"""
+        self.deadline += wait_ms / 1000
+
+    def read_timeout(self, timeout_s: float) -> float:
+        """A read timeout cut to the time left before the deadline"""
+        return max(0.1, min(timeout_s, self.deadline - time.monotonic()))
+
+    def succeeded(self) -> None:
+        self.breaker.record_success()
+
+    def failed(self, retryable: bool, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Count a failed attempt
+
+        Retryable failures count towards the breaker; other failures mean the
+        model answered and the request itself is at fault.
+
+        Args:
+            retryable: Whether the failure is transient
+            retry_after: Seconds requested by the server, if any
+
+        Returns:
+            Seconds to wait before the next attempt, or None to give up
+        """
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+        delay = self.policy.delay(self.attempt, retry_after)
+        if (not retryable or self.attempt >= self.policy.max_attempts
+                or self.breaker.state == CircuitBreaker.OPEN
+                or time.monotonic() + delay >= self.deadline):
+            return None
+        return delay
+
+    def failed_response(self, status_code: int, retry_after: Optional[str] = None) -> Optional[float]:
+        """failed() for an HTTP error response, given its status and Retry-After header"""
+        return self.failed(status_code in RETRYABLE_STATUSES, parse_retry_after(retry_after))
+
+
+class CircuitBreakers:
+    """Circuit breakers keyed by model id, created on first use"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout_s)
+            return breaker
+
+    def is_open(self, model: str) -> bool:
+        """True while calls to a model are being refused"""
+        return self.get(model).state == CircuitBreaker.OPEN
+
+    def states(self) -> Dict[str, str]:
+        """State of every model's breaker, for debugging"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {model: breaker.state for model, breaker in breakers.items()}
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+🗄️ Response Cache - Persistent exact-match cache for LLM completions
+Stores chat/completions responses in SQLite, keyed by a hash of the
+canonical request body, so deterministic requests are only billed once
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Request fields that do not change the generated answer
+IGNORED_REQUEST_FIELDS = ("stream", "usage")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    content TEXT NOT NULL,
+    usage TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used_at);
+"""
+
+
+def request_key(data: Dict[str, Any]) -> str:
+    """SHA-256 of the request body in canonical JSON form (sorted keys, no whitespace)"""
+    body = {k: v for k, v in data.items() if k not in IGNORED_REQUEST_FIELDS}
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _total_tokens(usage: Dict[str, Any]) -> int:
+    return int(usage.get("total_tokens") or (usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)))
+
+
+class ResponseCache:
+    """
+    SQLite-backed exact response cache with TTL and LRU eviction.
+
+    Only requests with temperature 0 are cached unless cache_all_temperatures
+    is set, since sampled answers are meant to differ. Entries older than
+    ttl_s are ignored (and purged on eviction); above max_entries the least
+    recently used ones are deleted. Token counters separate usage served
+    from the cache from usage that was billed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_s: float = 86400.0,
+        max_entries: int = 10000,
+        cache_all_temperatures: bool = False
+    ):
+        """
+        Args:
+            path: SQLite database file (created if missing)
+            ttl_s: Seconds a stored response stays valid
+            max_entries: Maximum number of stored responses
+            cache_all_temperatures: Also cache requests with temperature > 0
+        """
+        self.path = Path(path).expanduser()
+        self.ttl_s = ttl_s
+        self.max_entries = max(1, int(max_entries))
+        self.cache_all_temperatures = cache_all_temperatures
+        self.hits = 0
+        self.misses = 0
+        self.cached_tokens = 0  # Tokens answered from the cache (not billed)
+        self.billed_tokens = 0  # Tokens of every response fetched from the API
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def cacheable(self, data: Dict[str, Any]) -> bool:
+        """Whether a request body may be served from / stored in the cache"""
+        if data.get("stream"):
+            return False
+        return self.cache_all_temperatures or not data.get("temperature")
+
+    def get(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Stored response for a request body
+
+        Returns:
+            Dict with 'content', 'model', 'usage' (of the original call) and 'age_s', or None
+        """
+        key = request_key(data)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT model, content, usage, created_at FROM responses WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl_s)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            usage = json.loads(row[2])
+            self.hits += 1
+            self.cached_tokens += _total_tokens(usage)
+        return {"model": row[0], "content": row[1], "usage": usage, "age_s": now - row[3]}
+
+    def record_billed(self, usage: Dict[str, Any]) -> None:
+        """Count the usage of a call answered by the API, cacheable or not"""
+        with self._lock:
+            self.billed_tokens += _total_tokens(usage)
+
+    def put(self, data: Dict[str, Any], model: str, content: str, usage: Dict[str, Any]) -> None:
+        """Store a response, evicting expired and least recently used entries above the cap"""
+        key = request_key(data)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, usage, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, content, json.dumps(usage), now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl_s,))
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY last_used_at ASC LIMIT "
+                    "max(0, (SELECT COUNT(*) FROM responses) - ?))",
+                    (self.max_entries,)
+                )
+
+    def clear(self) -> None:
+        """Delete all stored responses"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count, hit/miss counters and cached vs billed tokens"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached_tokens": self.cached_tokens,
+            "billed_tokens": self.billed_tokens,
+            "ttl_s": self.ttl_s
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -28,22 +28,40 @@ except ImportError:
     logger.error("Flask not installed. Run: pip install flask flask-cors")
     sys.exit(1)
 
-from .rag_engine import get_rag_engine, SearchResult
+from .rag_engine import SearchResult
+from .kb_registry import DEFAULT_KB_ID, UnknownKnowledgeBaseError, get_engine_registry
+from .tokens import TokenCounter
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize RAG engine
-rag_engine = None
+# Engine registry: one lazily loaded RAG engine per knowledge base
+registry = None
 
 def init_rag():
-    """Initialize RAG engine"""
-    global rag_engine
-    if rag_engine is None:
+    """Initialize the engine registry and load the default knowledge base"""
+    global registry
+    if registry is None:
         logger.info("Initializing RAG engine...")
-        rag_engine = get_rag_engine()
-        logger.info(f"RAG engine ready with {len(rag_engine.documents)} documents")
-    return rag_engine
+        registry = get_engine_registry()
+        engine = registry.get(DEFAULT_KB_ID)
+        logger.info(f"RAG engine ready with {len(engine.documents)} documents")
+    return registry
+
+def request_kb_id(data: dict = None) -> str:
+    """Knowledge-base id from the JSON body or the kb_id query parameter"""
+    return str((data or {}).get('kb_id') or request.args.get('kb_id') or DEFAULT_KB_ID)
+
+def result_to_dict(result: SearchResult) -> dict:
+    """Convert a SearchResult into a JSON-serializable dict"""
+    return {
+        'filename': result.filename,
+        'content_preview': result.content_preview,
+        'relevance_score': result.relevance_score,
+        'file_type': result.file_type,
+        'char_count': result.char_count,
+        'document_id': result.document_id
+    }
 
 @app.before_request
 def ensure_rag_initialized():
@@ -68,8 +86,13 @@ def search():
         {
             "query": "search query",
             "top_k": 5,
-            "min_score": 0.05
+            "min_score": 0.05,
+            "filters": {"file_type": "pdf"},
+            "kb_id": "default"
         }
+    
+    Filters may use file_type, document_id or filename with a single value
+    or a list of values. kb_id selects the knowledge base (default: "default").
     """
     try:
         data = request.get_json()
@@ -83,34 +106,93 @@ def search():
         
         top_k = data.get('top_k', 5)
         min_score = data.get('min_score', 0.05)
+        filters = data.get('filters')
         
-        logger.info(f"Search request: '{query[:50]}...' (top_k={top_k})")
+        kb_id = request_kb_id(data)
         
-        results = rag_engine.search(query, top_k=top_k, min_score=min_score)
+        logger.info(f"Search request [{kb_id}]: '{query[:50]}...' (top_k={top_k}, filters={filters})")
+        
+        rag_engine = registry.get(kb_id)
+        results = rag_engine.search(query, top_k=top_k, min_score=min_score, filters=filters)
         
         # Convert SearchResult objects to dicts
-        results_data = [
-            {
-                'filename': r.filename,
-                'content_preview': r.content_preview,
-                'relevance_score': r.relevance_score,
-                'file_type': r.file_type,
-                'char_count': r.char_count,
-                'document_id': r.document_id
-            }
-            for r in results
-        ]
+        results_data = [result_to_dict(r) for r in results]
         
         return jsonify({
             'results': results_data,
             'query': query,
+            'kb_id': kb_id,
             'count': len(results_data)
         })
         
+    except UnknownKnowledgeBaseError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Search error: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """
+    Search the knowledge base for many queries in one pass
+    
+    Request body:
+        {
+            "queries": ["first query", "second query"],
+            "top_k": 5,
+            "min_score": 0.05,
+            "filters": {"document_id": ["a1b2c3d4e5f6"]},
+            "kb_id": "default"
+        }
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'Request body required'}), 400
+        
+        queries = data.get('queries')
+        if not isinstance(queries, list) or not queries:
+            return jsonify({'error': 'Queries parameter required (non-empty list)'}), 400
+        
+        queries = [str(q).strip() for q in queries]
+        if not all(queries):
+            return jsonify({'error': 'Queries must not be empty'}), 400
+        
+        top_k = data.get('top_k', 5)
+        min_score = data.get('min_score', 0.05)
+        filters = data.get('filters')
+        
+        kb_id = request_kb_id(data)
+        
+        logger.info(f"Batch search request [{kb_id}]: {len(queries)} queries (top_k={top_k}, filters={filters})")
+        
+        rag_engine = registry.get(kb_id)
+        batches = rag_engine.search_many(queries, top_k=top_k, min_score=min_score, filters=filters)
+        
+        return jsonify({
+            'results': [
+                {
+                    'query': query,
+                    'results': [result_to_dict(r) for r in results],
+                    'count': len(results)
+                }
+                for query, results in zip(queries, batches)
+            ],
+            'kb_id': kb_id,
+            'count': len(batches)
+        })
+        
+    except UnknownKnowledgeBaseError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Batch search error: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/context', methods=['POST'])
 def get_context():
     """
@@ -120,8 +202,15 @@ def get_context():
         {
             "query": "search query",
             "top_k": 5,
-            "max_chars": 8000
+            "max_chars": 8000,
+            "max_tokens": 4000,
+            "model": "anthropic/claude-3.5-sonnet",
+            "filters": {"file_type": ["md", "txt"]},
+            "kb_id": "default"
         }
+    
+    When max_tokens is given the context is packed into that many tokens
+    (counted with the tokenizer for "model") instead of max_chars.
     """
     try:
         data = request.get_json()
@@ -135,57 +224,102 @@ def get_context():
         
         top_k = data.get('top_k', 5)
         max_chars = data.get('max_chars', 8000)
+        max_tokens = data.get('max_tokens')
+        model = data.get('model', '')
+        filters = data.get('filters')
+        kb_id = request_kb_id(data)
         
-        context = rag_engine.get_context_for_query(query, top_k=top_k, max_context_chars=max_chars)
+        counter = TokenCounter(model)
+        rag_engine = registry.get(kb_id)
+        context = rag_engine.get_context_for_query(
+            query, top_k=top_k, max_context_chars=max_chars, filters=filters,
+            max_context_tokens=int(max_tokens) if max_tokens is not None else None, model=model
+        )
         
         return jsonify({
             'context': context,
-            'query': query
+            'tokens': counter.count(context),
+            'tokenizer': counter.name,
+            'query': query,
+            'kb_id': kb_id
         })
         
+    except UnknownKnowledgeBaseError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Context error: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/files', methods=['GET'])
 def list_files():
-    """List all indexed files"""
+    """List all indexed files of a knowledge base (?kb_id=...)"""
     try:
-        files = rag_engine.list_files()
+        files = registry.get(request_kb_id()).list_files()
         return jsonify({
             'files': files,
             'count': len(files)
         })
+    except UnknownKnowledgeBaseError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Files list error: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/stats', methods=['GET'])
 def get_stats():
-    """Get knowledge base statistics"""
+    """Get knowledge base statistics (?kb_id=...)"""
     try:
-        stats = rag_engine.get_stats()
+        stats = registry.get(request_kb_id()).get_stats()
         return jsonify({
             'stats': stats
         })
+    except UnknownKnowledgeBaseError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Stats error: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/rebuild', methods=['POST'])
 def rebuild_index():
-    """Rebuild the RAG index"""
+    """Rebuild the RAG index; searches keep using the old index until the new one is swapped in"""
     try:
-        logger.info("Rebuilding RAG index...")
-        rag_engine.initialize(force_rebuild=True)
+        kb_id = request_kb_id(request.get_json(silent=True))
+        logger.info(f"Rebuilding RAG index [{kb_id}]...")
+        rag_engine = registry.rebuild(kb_id)
         return jsonify({
             'status': 'success',
-            'documents': len(rag_engine.documents)
+            'kb_id': kb_id,
+            'documents': len(rag_engine.documents),
+            'index_version': rag_engine.index_version
         })
+    except UnknownKnowledgeBaseError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Rebuild error: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/kbs', methods=['GET'])
+def list_knowledge_bases():
+    """List available knowledge bases and the loaded ones with their estimated memory"""
+    try:
+        loaded = registry.loaded()
+        return jsonify({
+            'knowledge_bases': registry.available(),
+            'loaded': [{'kb_id': kb_id, 'memory_bytes': size} for kb_id, size in loaded.items()],
+            'memory_limit_bytes': registry.memory_limit_bytes
+        })
+    except Exception as e:
+        logger.error(f"Knowledge base list error: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({
@@ -193,10 +327,12 @@ def not_found(error):
         'available_endpoints': [
             'GET  /health   - Health check',
             'POST /search   - Search knowledge base',
+            'POST /search/batch - Search many queries at once',
             'POST /context  - Get AI context',
             'GET  /files    - List indexed files',
             'GET  /stats    - Get statistics',
-            'POST /rebuild  - Rebuild index'
+            'POST /rebuild  - Rebuild index',
+            'GET  /kbs      - List knowledge bases'
         ]
     }), 404
 
@@ -219,10 +355,12 @@ def run_server(host: str = '127.0.0.1', port: int = 5001, debug: bool = False):
 ║  Endpoints:                                                  ║
 ║    GET  /health   - Health check                             ║
 ║    POST /search   - Search knowledge base                    ║
+║    POST /search/batch - Search many queries at once          ║
 ║    POST /context  - Get AI context                           ║
 ║    GET  /files    - List indexed files                       ║
 ║    GET  /stats    - Get statistics                           ║
 ║    POST /rebuild  - Rebuild index                            ║
+║    GET  /kbs      - List knowledge bases                     ║
 ║                                                              ║
 ║  Press Ctrl+C to stop                                        ║
 ╚══════════════════════════════════════════════════════════════╝
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+📡 SSE - Incremental server-sent-events decoding for streamed completions
+Parses raw response bytes as they arrive (any chunking, CRLF/CR/LF line
+ends, multi-line data, comments) and turns chat/completions frames into
+content deltas plus the final usage and finish reason
+
+Run `python -m src.sse` for a micro-benchmark on a 10k-event stream.
+"""
+
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ORJSON_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    pass
+
+
+# json.loads() re-detects the encoding and checks its arguments on every
+# call; frames are UTF-8 and never padded, so raw_decode is enough
+_json_decode = json.JSONDecoder().raw_decode
+
+
+def loads(data: bytes) -> Any:
+    """JSON from UTF-8 bytes, with orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return _json_decode(data.decode("utf-8"))[0]
+
+
+@dataclass
+class SSEEvent:
+    """
+    One dispatched server-sent event.
+
+    Attributes:
+        data: Data lines of the event joined by newlines (raw bytes)
+        event: Event type ("message" unless the server set one)
+        id: Last event id seen on the stream
+    """
+    data: bytes
+    event: str = "message"
+    id: Optional[str] = None
+
+
+class SSEParser:
+    """
+    Incremental SSE parser working on raw byte chunks.
+
+    feed() accepts bytes split anywhere (even inside a line ending) and
+    returns the events completed by them. Lines starting with ':' are
+    comments (OpenRouter sends ": OPENROUTER PROCESSING" keep-alives); an
+    event is dispatched at the blank line that ends it.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._data: List[bytes] = []
+        self._event = ""
+        self.last_event_id: Optional[str] = None
+        # Server-requested reconnection delay, if any
+        self.retry_ms: Optional[int] = None
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """
+        Parse the next chunk of the stream
+
+        Returns:
+            Events completed by this chunk, in order
+        """
+        buffer = self._buffer + chunk if self._buffer else chunk
+        if b"\r" in buffer:
+            # A CR at the very end may be the first half of a CRLF
+            held = b"\r" if buffer.endswith(b"\r") else b""
+            if held:
+                buffer = buffer[:-1]
+            buffer = buffer.replace(b"\r\n", b"\n").replace(b"\r", b"\n") + held
+
+        lines = buffer.split(b"\n")
+        self._buffer = lines.pop()
+
+        events: List[SSEEvent] = []
+        data = self._data
+        for line in lines:
+            if not line:
+                if data:
+                    events.append(SSEEvent(
+                        data=data[0] if len(data) == 1 else b"\n".join(data),
+                        event=self._event or "message",
+                        id=self.last_event_id
+                    ))
+                    data = self._data = []
+                self._event = ""
+            elif line[:5] == b"data:":
+                value = line[5:]
+                data.append(value[1:] if value[:1] == b" " else value)
+            elif line[:1] == b":":
+                continue
+            else:
+                self._field(line)
+        return events
+
+    def _field(self, line: bytes) -> None:
+        """Non-data fields: event, id, retry (unknown fields are ignored)"""
+        name, _, value = line.partition(b":")
+        if value[:1] == b" ":
+            value = value[1:]
+        if name == b"event":
+            self._event = value.decode("utf-8", errors="replace")
+        elif name == b"id":
+            if b"\0" not in value:
+                self.last_event_id = value.decode("utf-8", errors="replace")
+        elif name == b"retry" and value.isdigit():
+            self.retry_ms = int(value)
+
+    def flush(self) -> List[SSEEvent]:
+        """Events left when the stream ends without a final blank line"""
+        events = self.feed(b"\n\n") if self._buffer or self._data else []
+        self._buffer = b""
+        return events
+
+
+class ChatStreamDecoder:
+    """
+    Decodes a chat/completions SSE stream into content deltas.
+
+    Besides the text it keeps what the frames report about the whole
+    response: the model that answered, the finish reason, the usage frame
+    sent before [DONE], and an error frame if the provider aborted.
+    """
+
+    def __init__(self):
+        self.parser = SSEParser()
+        self.model: Optional[str] = None
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.done = False
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """
+        Parse the next chunk of response bytes
+
+        Returns:
+            Non-empty content deltas completed by this chunk
+        """
+        return self._decode(self.parser.feed(chunk))
+
+    def flush(self) -> List[str]:
+        """Content of an event left unterminated at the end of the stream"""
+        return self._decode(self.parser.flush())
+
+    def _decode(self, events: List[SSEEvent]) -> List[str]:
+        deltas: List[str] = []
+        for event in events:
+            if self.done:
+                break
+            if event.data == b"[DONE]":
+                self.done = True
+                break
+            try:
+                frame = loads(event.data)
+            except ValueError:
+                logger.warning(f"⚠️ Skipping malformed stream event: {event.data[:80]!r}")
+                continue
+            if not isinstance(frame, dict):
+                continue
+
+            if "error" in frame:
+                error = frame["error"]
+                self.error = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+                self.done = True
+                break
+            if frame.get("model"):
+                self.model = frame["model"]
+            if frame.get("usage"):
+                self.usage = frame["usage"]
+            for choice in frame.get("choices") or ():
+                content = (choice.get("delta") or {}).get("content")
+                if content:
+                    deltas.append(content)
+                if choice.get("finish_reason"):
+                    self.finish_reason = choice["finish_reason"]
+        return deltas
+
+
+def _recorded_stream(events: int = 10000) -> bytes:
+    """An OpenRouter-shaped stream: keep-alive comments, content deltas, finish, usage, [DONE]"""
+    import random
+    rng = random.Random(0)
+    words = "the retrieved context says that docker images should be small and reproducible".split()
+    out = [b": OPENROUTER PROCESSING\n\n"]
+    for i in range(events):
+        if i % 500 == 0:
+            out.append(b": OPENROUTER PROCESSING\n\n")
+        frame = {
+            "id": "gen-123", "provider": "Anthropic", "model": "anthropic/claude-3.5-sonnet",
+            "object": "chat.completion.chunk", "created": 1700000000,
+            "choices": [{"index": 0, "delta": {"role": "assistant", "content": " " + rng.choice(words)},
+                         "finish_reason": None, "native_finish_reason": None, "logprobs": None}]
+        }
+        out.append(b"data: " + json.dumps(frame).encode() + b"\n\n")
+    out.append(b'data: {"model":"anthropic/claude-3.5-sonnet","choices":[{"index":0,"delta":{"content":""},"finish_reason":"stop"}]}\n\n')
+    out.append(b'data: {"model":"anthropic/claude-3.5-sonnet","choices":[],"usage":{"prompt_tokens":1200,"completion_tokens":10000,"total_tokens":11200}}\n\n')
+    out.append(b"data: [DONE]\n\n")
+    return b"".join(out)
+
+
+class _RecordedRaw:
+    """Replays a recorded body like a socket: at most `packet` bytes per read"""
+
+    def __init__(self, body: bytes, packet: int):
+        self.body = body
+        self.packet = packet
+        self.position = 0
+
+    def read(self, amt: Optional[int] = None, **kwargs) -> bytes:
+        size = min(amt or self.packet, self.packet)
+        data = self.body[self.position:self.position + size]
+        self.position += len(data)
+        return data
+
+    read1 = read
+
+    def close(self) -> None:
+        pass
+
+
+def _iter_lines_decoder(response) -> int:
+    """The previous client loop: iter_lines(), then json.loads per data line"""
+    deltas = 0
+    for line in response.iter_lines():
+        if not line:
+            continue
+        text = line.decode("utf-8")
+        if not text.startswith("data: "):
+            continue
+        if text[6:] == "[DONE]":
+            break
+        import json as json_module
+        chunk = json_module.loads(text[6:])
+        if chunk.get("choices", [{}])[0].get("delta", {}).get("content") if chunk.get("choices") else None:
+            deltas += 1
+    return deltas
+
+
+def benchmark(events: int = 10000, packet: int = 1400, repeat: int = 5) -> Dict[str, float]:
+    """
+    Decode a recorded stream of `events` content events, delivered in network-sized packets
+
+    Returns:
+        Best time in ms of the previous iter_lines() loop and of ChatStream
+    """
+    import time
+    import requests
+    from .ai_client import ChatStream
+
+    body = _recorded_stream(events)
+
+    def recorded_response() -> "requests.Response":
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = _RecordedRaw(body, packet)
+        return response
+
+    timings: Dict[str, float] = {}
+    best = float("inf")
+    for _ in range(repeat):
+        response = recorded_response()
+        start = time.perf_counter()
+        _iter_lines_decoder(response)
+        best = min(best, time.perf_counter() - start)
+    timings["iter_lines_ms"] = best * 1000
+
+    best = float("inf")
+    for _ in range(repeat):
+        stream = ChatStream(recorded_response())
+        start = time.perf_counter()
+        deltas = sum(1 for _ in stream)
+        best = min(best, time.perf_counter() - start)
+    assert deltas == events and stream.usage and stream.finish_reason == "stop"
+    timings["chat_stream_ms"] = best * 1000
+    return timings
+
+
+if __name__ == "__main__":
+    result = benchmark()
+    print(f"📡 10k-event stream ({'orjson' if ORJSON_AVAILABLE else 'json'})")
+    print(f"   iter_lines + json per line: {result['iter_lines_ms']:.1f}ms")
+    print(f"   ChatStream:                 {result['chat_stream_ms']:.1f}ms "
+          f"({result['iter_lines_ms'] / result['chat_stream_ms']:.1f}x)")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+🔢 Tokens - Token counting and context budgets per model
+Counts tokens with tiktoken when available (a conservative estimate
+otherwise) and sizes the context budget from the model's context window
+"""
+
+import math
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from .config import get_model_context_window
+
+logger = logging.getLogger(__name__)
+
+TIKTOKEN_AVAILABLE = False
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    logger.warning("⚠️ tiktoken not available, estimating token counts from characters")
+
+# Characters per token assumed without a tokenizer; low on purpose so counts err high
+FALLBACK_CHARS_PER_TOKEN = 3.0
+
+# Tokens added per chat message for role and framing
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Headroom kept free in every request: a fixed part plus a share of the window,
+# since other providers' tokenizers do not match tiktoken exactly
+SAFETY_MARGIN_TOKENS = 256
+SAFETY_MARGIN_RATIO = 0.05
+
+
+@lru_cache(maxsize=8)
+def _encoding(name: str):
+    """Load a tiktoken encoding, or None when it cannot be loaded (e.g. offline)"""
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load tiktoken encoding {name}: {e}")
+        return None
+
+
+def encoding_name(model: str) -> str:
+    """tiktoken encoding used for a model (cl100k_base approximates non-OpenAI models)"""
+    if model.startswith(("openai/gpt-4o", "openai/o1", "openai/o3", "openai/gpt-4.1")):
+        return "o200k_base"
+    return "cl100k_base"
+
+
+class TokenCounter:
+    """
+    Token counter for one target model.
+
+    Uses the model's tiktoken encoding when tiktoken is installed; otherwise
+    counts are estimated from the character length, rounded up.
+    """
+
+    def __init__(self, model: str = ""):
+        self.model = model
+        self.encoding = _encoding(encoding_name(model)) if TIKTOKEN_AVAILABLE else None
+
+    @property
+    def name(self) -> str:
+        """Tokenizer description for debug output"""
+        return f"tiktoken:{self.encoding.name}" if self.encoding is not None else "estimate"
+
+    def count(self, text: str) -> int:
+        """Number of tokens in a text"""
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return math.ceil(len(text) / FALLBACK_CHARS_PER_TOKEN)
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        """Prompt tokens of a chat message list, including per-message framing"""
+        total = 2
+        for message in messages:
+            content = message.get("content", "")
+            if isinstance(content, list):  # Content parts
+                content = "".join(part.get("text", "") for part in content)
+            total += self.count(content) + MESSAGE_OVERHEAD_TOKENS
+        return total
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of a text within max_tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+        return text[:int(max_tokens * FALLBACK_CHARS_PER_TOKEN)]
+
+
+def context_token_budget(
+    model: str,
+    max_output_tokens: int,
+    prompt_tokens: int = 0,
+    cap: Optional[int] = None
+) -> int:
+    """
+    Tokens available for retrieved context in one request
+
+    Args:
+        model: Target model id (its context window sizes the budget)
+        max_output_tokens: Tokens reserved for the completion
+        prompt_tokens: Tokens of the rest of the prompt (system template, user message)
+        cap: Optional upper bound, so large windows are not filled just because they can be
+
+    Returns:
+        Context budget in tokens (never negative)
+    """
+    window = get_model_context_window(model)
+    margin = SAFETY_MARGIN_TOKENS + int(window * SAFETY_MARGIN_RATIO)
+    available = window - max_output_tokens - prompt_tokens - margin
+    if cap:
+        available = min(available, cap)
+    return max(0, available)